@@ -0,0 +1,156 @@
+"""
+Control de admisión por clase de ruta.
+
+Cada solicitud se clasifica en "escritura", "reporte" o "lectura" y ocupa un
+cupo de su clase. Sin cupo libre espera en una cola acotada (FIFO); si la cola
+está llena, o la espera supera `ADMISION_ESPERA`, se responde `503` con
+`Retry-After` sin llegar al endpoint. Así una ráfaga de escrituras o reportes
+no acapara los hilos que necesitan las lecturas baratas.
+
+Límites por clase con variables de entorno, p. ej. `ADMISION_ESCRITURA_LIMITE`
+y `ADMISION_ESCRITURA_COLA`. Los valores son por worker.
+"""
+import asyncio
+import json
+import os
+import re
+import time
+from collections import deque
+
+from . import metricas
+
+ACTIVA = os.getenv("ADMISION_ACTIVA", "1") == "1"
+ESPERA_MAXIMA = float(os.getenv("ADMISION_ESPERA", "10"))   # segundos en cola antes de rechazar
+RETRY_AFTER = os.getenv("ADMISION_RETRY_AFTER", "1")
+
+# clase -> (cupos, largo de cola) por defecto
+LIMITES = {
+    "escritura": (4, 32),
+    "reporte": (2, 8),
+    "lectura": (32, 128),
+}
+
+# Sin control: conexiones de larga duración y observabilidad
+EXENTAS = re.compile(r"^/(cambios|metricas|debug|docs|redoc|openapi\.json)")
+REPORTES = re.compile(
+    r"^/(movimientos/reportes|valorizacion/categorias|sync/catalogo|productos/conciliacion|productos/\d+/kardex|documentos/\d+/pdf|jobs/[^/]+/resultado)"
+)
+
+# POST que solo leen (el cuerpo lleva la lista de ids)
+CONSULTAS_POST = re.compile(r"^/productos/disponibilidad$")
+
+
+def clasificar(metodo: str, ruta: str):
+    if EXENTAS.match(ruta) or metodo == "OPTIONS":
+        return None
+    if metodo not in ("GET", "HEAD") and not CONSULTAS_POST.match(ruta):
+        return "escritura"
+    if REPORTES.match(ruta):
+        return "reporte"
+    return "lectura"
+
+
+class Rechazada(Exception):
+    pass
+
+
+# =========================
+# 📌 Cupos con cola acotada
+# =========================
+class Limitador:
+    def __init__(self, nombre: str, limite: int, max_cola: int):
+        self.nombre = nombre
+        self.limite = limite
+        self.max_cola = max_cola
+        self.en_curso = 0
+        self._cola = deque()
+        metricas.registrar_medidor(f"admision_{nombre}_en_curso", lambda: self.en_curso)
+        metricas.registrar_medidor(f"admision_{nombre}_en_cola", lambda: len(self._cola))
+
+    async def adquirir(self, espera_maxima: float):
+        if self.en_curso < self.limite and not self._cola:
+            self.en_curso += 1
+            return
+        if len(self._cola) >= self.max_cola:
+            raise Rechazada()
+
+        futuro = asyncio.get_running_loop().create_future()
+        self._cola.append(futuro)
+        inicio = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.shield(futuro), timeout=espera_maxima)
+        except asyncio.TimeoutError:
+            if futuro.done():  # el cupo llegó justo al vencer el plazo
+                self.liberar()
+            else:
+                futuro.cancel()
+                self._cola.remove(futuro)
+            raise Rechazada()
+        except asyncio.CancelledError:  # el cliente se desconectó mientras esperaba
+            if futuro.done() and not futuro.cancelled():
+                self.liberar()
+            else:
+                futuro.cancel()
+                if futuro in self._cola:
+                    self._cola.remove(futuro)
+            raise
+        finally:
+            metricas.observar(f"admision_{self.nombre}_espera", time.perf_counter() - inicio)
+
+    def liberar(self):
+        # El cupo pasa directo al primero de la cola (en_curso no cambia)
+        while self._cola:
+            futuro = self._cola.popleft()
+            if not futuro.done():
+                futuro.set_result(None)
+                return
+        self.en_curso -= 1
+
+
+def _limitadores():
+    resultado = {}
+    for nombre, (limite, cola) in LIMITES.items():
+        prefijo = f"ADMISION_{nombre.upper()}"
+        resultado[nombre] = Limitador(
+            nombre,
+            int(os.getenv(f"{prefijo}_LIMITE", limite)),
+            int(os.getenv(f"{prefijo}_COLA", cola)),
+        )
+    return resultado
+
+
+# =========================
+# 📌 Middleware
+# =========================
+class AdmisionMiddleware:
+    def __init__(self, app):
+        self.app = app
+        self.limitadores = _limitadores() if ACTIVA else {}
+
+    async def __call__(self, scope, receive, send):
+        clase = clasificar(scope["method"], scope["path"]) if scope["type"] == "http" else None
+        if clase is None or clase not in self.limitadores:
+            return await self.app(scope, receive, send)
+
+        limitador = self.limitadores[clase]
+        try:
+            await limitador.adquirir(ESPERA_MAXIMA)
+        except Rechazada:
+            metricas.incrementar(f"admision_{clase}_rechazadas")
+            cuerpo = json.dumps({"detail": "Servidor ocupado, intente nuevamente"}).encode()
+            await send({
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [
+                    (b"content-type", b"application/json"),
+                    (b"content-length", str(len(cuerpo)).encode()),
+                    (b"retry-after", RETRY_AFTER.encode()),
+                ],
+            })
+            await send({"type": "http.response.body", "body": cuerpo})
+            return
+
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limitador.liberar()
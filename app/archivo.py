@@ -0,0 +1,201 @@
+"""
+Archivo de movimientos antiguos.
+
+La tabla `movimientos` guarda solo los datos "calientes". Los movimientos
+anteriores a un corte se mueven a tablas mensuales (`movimientos_AAAA_MM`)
+registradas en `movimientos_archivo`. Las lecturas usan `fuente_movimientos`,
+que solo une las tablas de archivo cuyo periodo se cruza con el rango pedido.
+
+Los movimientos archivados conservan su id. `movimientos` es AUTOINCREMENT y
+`sincronizar_archivos` lleva su secuencia por encima del mayor id archivado,
+así la tabla caliente nunca repite un id del archivo (el kardex pagina por
+(producto_id, id) sobre la unión de todas las tablas).
+
+Uso por consola:
+    python -m app.archivo 2025-01-01
+"""
+import argparse
+import json
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import Table, Column, Index, MetaData, select, insert, delete, func, union_all
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import SessionLocal, engine, agregar_columnas_faltantes, sincronizar_esquema
+
+PREFIJO_TABLA = "movimientos_"
+
+# Metadata propia: las tablas de archivo no deben crearse con create_all
+metadata_archivo = MetaData()
+
+
+# =========================
+# 📌 Tablas de archivo
+# =========================
+def _inicio_mes(fecha: datetime) -> datetime:
+    return datetime(fecha.year, fecha.month, 1)
+
+
+def _mes_siguiente(fecha: datetime) -> datetime:
+    if fecha.month == 12:
+        return datetime(fecha.year + 1, 1, 1)
+    return datetime(fecha.year, fecha.month + 1, 1)
+
+
+def nombre_tabla(periodo: datetime) -> str:
+    return f"{PREFIJO_TABLA}{periodo.year:04d}_{periodo.month:02d}"
+
+
+def tabla_archivo(nombre: str) -> Table:
+    """Devuelve la tabla de archivo `nombre` con las mismas columnas que `movimientos`."""
+    if nombre in metadata_archivo.tables:
+        return metadata_archivo.tables[nombre]
+
+    columnas = [
+        Column(c.name, c.type, primary_key=c.primary_key, nullable=c.nullable)
+        for c in models.Movimiento.__table__.columns
+    ]
+    tabla = Table(nombre, metadata_archivo, *columnas)
+    Index(f"ix_{nombre}_producto_id", tabla.c.producto_id)
+    return tabla
+
+
+def sincronizar_archivos():
+    """
+    Agrega a las tablas de archivo ya creadas las columnas nuevas de `movimientos`
+    y deja la secuencia de ids de `movimientos` por encima del mayor id archivado.
+    """
+    with engine.begin() as conn:
+        maximo = 0
+        for nombre in conn.execute(select(models.ArchivoMovimientos.tabla)).scalars().all():
+            tabla = tabla_archivo(nombre)
+            agregar_columnas_faltantes(conn, tabla)
+            maximo = max(maximo, conn.execute(select(func.max(tabla.c.id))).scalar() or 0)
+        if maximo:
+            _reservar_ids(conn, maximo)
+
+
+def _reservar_ids(conn, maximo: int):
+    """Lleva la secuencia AUTOINCREMENT de `movimientos` a `maximo` como mínimo."""
+    nombre = models.Movimiento.__tablename__
+    actualizadas = conn.exec_driver_sql(
+        "UPDATE sqlite_sequence SET seq = max(seq, ?) WHERE name = ?", (maximo, nombre)
+    ).rowcount
+    if not actualizadas:
+        conn.exec_driver_sql("INSERT INTO sqlite_sequence (name, seq) VALUES (?, ?)", (nombre, maximo))
+
+
+def limite_caliente(db: Session) -> Optional[datetime]:
+    """Fecha a partir de la cual todos los movimientos están en la tabla caliente."""
+    return db.query(func.max(models.ArchivoMovimientos.periodo_fin)).scalar()
+
+
+def tablas_para_rango(db: Session, fecha_inicio: datetime = None, fecha_fin: datetime = None) -> List[Table]:
+    """Tablas de archivo cuyo periodo se cruza con [fecha_inicio, fecha_fin]."""
+    query = db.query(models.ArchivoMovimientos)
+    if fecha_inicio:
+        query = query.filter(models.ArchivoMovimientos.periodo_fin > fecha_inicio)
+    if fecha_fin:
+        query = query.filter(models.ArchivoMovimientos.periodo_inicio <= fecha_fin)
+    registros = query.order_by(models.ArchivoMovimientos.periodo_inicio).all()
+    return [tabla_archivo(r.tabla) for r in registros]
+
+
+def fuente_movimientos(db: Session, fecha_inicio: datetime = None, fecha_fin: datetime = None):
+    """
+    Selectable con los movimientos del rango pedido.
+
+    Si el rango cae completo en la tabla caliente se devuelve la propia tabla
+    `movimientos`; en caso contrario un UNION ALL con las tablas de archivo necesarias.
+    """
+    caliente = models.Movimiento.__table__
+    archivos = tablas_para_rango(db, fecha_inicio, fecha_fin)
+    if not archivos:
+        return caliente
+
+    columnas = [c.name for c in caliente.columns]
+    selects = [select(*[caliente.c[n] for n in columnas])]
+    selects += [select(*[t.c[n] for n in columnas]) for t in archivos]
+    return union_all(*selects).subquery("movimientos_todos")
+
+
+# =========================
+# 📌 Proceso de archivado
+# =========================
+def archivar_movimientos(db: Session, antes_de: datetime) -> List[dict]:
+    """
+    Mueve a tablas mensuales los movimientos con fecha anterior al mes de `antes_de`.
+
+    El corte se alinea al inicio de mes para que cada tabla cubra un mes completo.
+    Cada mes se archiva en su propia transacción, que agrega al feed de cambios
+    una fila `archivo` con la tabla, el periodo y la cantidad de movimientos: el
+    DELETE de Core no pasa por el flush, y los movimientos no se eliminaron.
+    """
+    caliente = models.Movimiento.__table__
+    corte = _inicio_mes(antes_de)
+
+    meses = db.execute(
+        select(func.strftime("%Y-%m", caliente.c.fecha).label("mes"))
+        .where(caliente.c.fecha < corte)
+        .distinct()
+    ).scalars().all()
+    db.commit()  # cierra la lectura: cada mes abre su propia transacción de escritura
+
+    resultado = []
+    for mes in sorted(meses):
+        inicio = datetime.strptime(mes, "%Y-%m")
+        fin = _mes_siguiente(inicio)
+        tabla = tabla_archivo(nombre_tabla(inicio))
+        # Una transacción de escritura (BEGIN IMMEDIATE) por mes
+        tabla.create(bind=db.connection(execution_options={"escritura": True}), checkfirst=True)
+
+        rango = (caliente.c.fecha >= inicio) & (caliente.c.fecha < fin)
+        columnas = [c.name for c in caliente.columns]
+        filas = db.execute(
+            insert(tabla).from_select(columnas, select(*[caliente.c[n] for n in columnas]).where(rango))
+        ).rowcount
+        db.execute(delete(caliente).where(rango))
+
+        registro = db.query(models.ArchivoMovimientos).filter(models.ArchivoMovimientos.tabla == tabla.name).first()
+        if registro:
+            registro.filas += filas
+            registro.archivado_en = datetime.utcnow()
+        else:
+            registro = models.ArchivoMovimientos(
+                tabla=tabla.name,
+                periodo_inicio=inicio,
+                periodo_fin=fin,
+                filas=filas,
+            )
+        db.add(registro)
+        db.flush()
+        if filas:
+            db.add(models.Cambio(
+                entidad="archivo",
+                entidad_id=registro.id,
+                operacion="archivo",
+                fecha=datetime.utcnow(),
+                datos=json.dumps({"tabla": tabla.name, "periodo_inicio": inicio.isoformat(),
+                                  "periodo_fin": fin.isoformat(), "filas": filas}),
+            ))
+        db.commit()
+        resultado.append({"tabla": tabla.name, "filas": filas})
+
+    return resultado
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archiva movimientos anteriores a una fecha")
+    parser.add_argument("antes_de", type=datetime.fromisoformat, help="Fecha de corte (AAAA-MM-DD)")
+    args = parser.parse_args()
+
+    sincronizar_esquema()
+    sincronizar_archivos()
+    db = SessionLocal()
+    try:
+        for r in archivar_movimientos(db, args.antes_de):
+            print(f"{r['tabla']}: {r['filas']} movimientos archivados")
+    finally:
+        db.close()
@@ -0,0 +1,158 @@
+"""
+Outbox de cambios para documentos y movimientos.
+
+Cada flush de una sesión agrega a la tabla `cambios` una fila por documento o
+movimiento insertado, modificado o eliminado. Como se escribe en el mismo
+flush, queda en la misma transacción que el cambio: si se hace rollback, el
+registro también desaparece. Un cambio en las líneas de un documento se
+registra como "update" del documento. Las escrituras de Core, que no pasan
+por el flush, registran sus filas con `anotar()`.
+
+`notificador` despierta a los consumidores en espera (long-polling / SSE) de
+este proceso al confirmar la transacción.
+"""
+import asyncio
+import json
+import threading
+from datetime import date, datetime
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from . import models
+
+ENTIDADES = {
+    models.Documento: "documento",
+    models.Movimiento: "movimiento",
+}
+
+
+def _serializar(fila: dict) -> str:
+    return json.dumps(fila, default=lambda v: v.isoformat() if isinstance(v, (date, datetime)) else str(v))
+
+
+def _datos(obj) -> str:
+    return _serializar({c.key: getattr(obj, c.key) for c in inspect(obj).mapper.column_attrs})
+
+
+# =========================
+# 📌 Registro en el flush
+# =========================
+@event.listens_for(Session, "after_flush")
+def _registrar_cambios(session, flush_context):
+    cambios = {}  # (entidad, id) -> (operacion, obj)
+
+    for obj in session.new:
+        if type(obj) in ENTIDADES:
+            cambios[(ENTIDADES[type(obj)], obj.id)] = ("insert", obj)
+    for obj in session.dirty:
+        if type(obj) in ENTIDADES and session.is_modified(obj, include_collections=False):
+            cambios.setdefault((ENTIDADES[type(obj)], obj.id), ("update", obj))
+    for obj in session.deleted:
+        if type(obj) in ENTIDADES:
+            cambios[(ENTIDADES[type(obj)], obj.id)] = ("delete", obj)
+
+    # Las líneas modificadas cuentan como actualización de su documento, salvo que
+    # el documento ya figure en esta transacción (p. ej. recién insertado)
+    registrados = session.info.setdefault("cambios_registrados", set())
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, models.DetalleDocumento) and obj.documento_id is not None:
+            clave = ("documento", obj.documento_id)
+            if clave not in cambios and clave not in registrados:
+                documento = session.get(models.Documento, obj.documento_id)
+                if documento is not None:
+                    cambios[clave] = ("update", documento)
+
+    if not cambios:
+        return
+
+    ahora = datetime.utcnow()
+    filas = [
+        {
+            "entidad": entidad,
+            "entidad_id": entidad_id,
+            "operacion": operacion,
+            "fecha": ahora,
+            "datos": None if operacion == "delete" else _datos(obj),
+        }
+        for (entidad, entidad_id), (operacion, obj) in cambios.items()
+    ]
+    session.connection().execute(models.Cambio.__table__.insert(), filas)
+    registrados.update(cambios)
+    session.info["cambios_pendientes"] = True
+
+
+def anotar(session, entidad: str, operacion: str, filas: list):
+    """
+    Registra en la transacción en curso los cambios de una escritura de Core:
+    una fila del feed por cada dict de columnas (con su "id") de `filas`.
+    """
+    if not filas:
+        return
+    ahora = datetime.utcnow()
+    session.connection().execute(models.Cambio.__table__.insert(), [
+        {"entidad": entidad, "entidad_id": fila["id"], "operacion": operacion, "fecha": ahora,
+         "datos": _serializar(fila)}
+        for fila in filas
+    ])
+    session.info["cambios_pendientes"] = True
+
+
+@event.listens_for(Session, "after_commit")
+def _al_confirmar(session):
+    session.info.pop("cambios_registrados", None)
+    if session.info.pop("cambios_pendientes", False):
+        notificador.notificar()
+
+
+@event.listens_for(Session, "after_rollback")
+def _al_revertir(session):
+    session.info.pop("cambios_registrados", None)
+    session.info.pop("cambios_pendientes", None)
+
+
+# =========================
+# 📌 Notificación en proceso
+# =========================
+class Notificador:
+    """Despierta a las corrutinas que esperan cambios nuevos (desde cualquier hilo)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._esperas = set()
+
+    def notificar(self):
+        with self._lock:
+            esperas = list(self._esperas)
+        for loop, evento in esperas:
+            loop.call_soon_threadsafe(evento.set)
+
+    async def esperar(self, segundos: float) -> bool:
+        """Espera hasta `segundos` un aviso. Devuelve True si hubo aviso."""
+        espera = (asyncio.get_running_loop(), asyncio.Event())
+        with self._lock:
+            self._esperas.add(espera)
+        try:
+            await asyncio.wait_for(espera[1].wait(), timeout=segundos)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            with self._lock:
+                self._esperas.discard(espera)
+
+
+notificador = Notificador()
+
+
+# =========================
+# 📌 Lectura del feed
+# =========================
+def leer_cambios(db: Session, desde: int, limite: int):
+    return (
+        db.query(models.Cambio)
+        .filter(models.Cambio.seq > desde)
+        .order_by(models.Cambio.seq)
+        .limit(limite)
+        .all()
+    )
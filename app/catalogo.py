@@ -0,0 +1,180 @@
+"""
+Versiones del catálogo para la sincronización incremental de las terminales.
+
+Cada flush que inserta o modifica productos o categorías toma una versión nueva
+del contador `catalogo_version` y la guarda en la columna `version` de las
+filas tocadas. Las eliminaciones dejan una baja en `catalogo_bajas` con esa
+misma versión. Un cambio que solo toca `stock_actual` no cambia la versión:
+el stock no viaja en la sincronización del catálogo.
+
+El contador se incrementa con un UPSERT dentro de la transacción de escritura
+(BEGIN IMMEDIATE, ver database.escritura), así que las versiones se confirman
+en orden: una lectura que ve la versión H ve también todas las filas con
+versión <= H. Las versiones de transacciones revertidas quedan como huecos.
+
+`GET /sync/catalogo?since=N` devuelve lo que cambió con versión > N y la
+versión H a usar como `since` en la siguiente sincronización, en páginas de
+`limite` elementos con un cursor (versión, tabla, id).
+"""
+import heapq
+
+from sqlalchemy import and_, event, inspect, or_, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import escritura
+
+CONTADOR = "catalogo"
+TABLAS = {
+    models.Producto: "productos",
+    models.Categoria: "categorias",
+}
+# Columnas cuyo cambio no genera una versión nueva
+IGNORADAS = {"stock_actual", "version"}
+
+
+def siguiente_version(db: Session, contador: str = CONTADOR) -> int:
+    tabla = models.VersionCatalogo.__table__
+    stmt = sqlite_insert(tabla).values(nombre=contador, valor=1)
+    stmt = stmt.on_conflict_do_update(index_elements=["nombre"], set_={"valor": tabla.c.valor + 1})
+    return db.connection().execute(stmt.returning(tabla.c.valor)).scalar_one()
+
+
+def version_actual(db: Session, contador: str = CONTADOR) -> int:
+    tabla = models.VersionCatalogo.__table__
+    return db.execute(select(tabla.c.valor).where(tabla.c.nombre == contador)).scalar() or 0
+
+
+def _modificado(obj) -> bool:
+    estado = inspect(obj)
+    return any(
+        estado.attrs[c.key].history.has_changes()
+        for c in estado.mapper.column_attrs if c.key not in IGNORADAS
+    )
+
+
+# =========================
+# 📌 Versión en el flush
+# =========================
+@event.listens_for(Session, "before_flush")
+def _versionar(session, flush_context, instances):
+    cambiados = [obj for obj in session.new if type(obj) in TABLAS]
+    cambiados += [obj for obj in session.dirty if type(obj) in TABLAS and _modificado(obj)]
+    eliminados = [obj for obj in session.deleted if type(obj) in TABLAS and obj.id is not None]
+    if not cambiados and not eliminados:
+        return
+
+    version = siguiente_version(session)
+    for obj in cambiados:
+        obj.version = version
+    if eliminados:
+        session.connection().execute(models.BajaCatalogo.__table__.insert(), [
+            {"tabla": TABLAS[type(obj)], "registro_id": obj.id, "version": version} for obj in eliminados
+        ])
+
+
+@escritura
+def inicializar(db: Session):
+    """Asigna una versión a las filas anteriores al versionado (version NULL)."""
+    pendientes = [
+        modelo for modelo in TABLAS
+        if db.execute(select(modelo.id).where(modelo.version.is_(None)).limit(1)).first()
+    ]
+    if pendientes:
+        version = siguiente_version(db)
+        for modelo in pendientes:
+            db.execute(
+                update(modelo).where(modelo.version.is_(None)).values(version=version)
+                .execution_options(synchronize_session=False)
+            )
+    db.commit()
+
+
+# =========================
+# 📌 Lectura del delta
+# =========================
+# El stock no viaja: cambia con cada venta y las terminales lo consultan aparte
+COLUMNAS_PRODUCTO = [c for c in models.Producto.__table__.c if c.key != "stock_actual"]
+# Orden dentro de una misma versión (segundo componente del cursor)
+CATEGORIAS, PRODUCTOS, BAJAS = 0, 1, 2
+
+
+def leer_cursor(cursor: str):
+    """Convierte "version.orden.id" en una tupla. Lanza ValueError si no es válido."""
+    try:
+        version, orden, registro_id = (int(parte) for parte in cursor.split("."))
+    except ValueError:
+        raise ValueError(f"Cursor inválido: {cursor}")
+    if orden not in (CATEGORIAS, PRODUCTOS, BAJAS):
+        raise ValueError(f"Cursor inválido: {cursor}")
+    return version, orden, registro_id
+
+
+def _despues(columna_version, columna_id, orden: int, cursor):
+    """Filas cuya clave (version, orden, id) es posterior al cursor."""
+    version, orden_cursor, registro_id = cursor
+    if orden > orden_cursor:
+        return columna_version >= version
+    if orden < orden_cursor:
+        return columna_version > version
+    return or_(columna_version > version, and_(columna_version == version, columna_id > registro_id))
+
+
+def delta(db: Session, desde: int, limite: int = None, cursor: str = None) -> dict:
+    """
+    Filas con versión > `desde` y bajas posteriores, en orden de (versión,
+    tabla, id). Todo se lee en la misma transacción, así que corresponde al
+    estado de la base en `version`.
+
+    Con `limite` se devuelven a lo sumo `limite` elementos entre categorías,
+    productos y bajas; si quedan más, `hay_mas` es True y `siguiente` es el
+    cursor para pedir la página que sigue (con el mismo `desde`). Un cambio
+    hecho entre páginas aparece en una página posterior, con su versión nueva,
+    así que al terminar (`hay_mas` False) el resultado corresponde a la
+    `version` de la última página, que es la que se guarda.
+    """
+    posicion = leer_cursor(cursor) if cursor else None
+    categorias, productos = models.Categoria.__table__, models.Producto.__table__
+    bajas = models.BajaCatalogo.__table__
+    fuentes = [
+        (CATEGORIAS, categorias.c.version, categorias.c.id, select(categorias)),
+        (PRODUCTOS, productos.c.version, productos.c.id, select(*COLUMNAS_PRODUCTO)),
+        (BAJAS, bajas.c.version, bajas.c.id, select(bajas.c.id, bajas.c.tabla, bajas.c.registro_id, bajas.c.version)),
+    ]
+    version = version_actual(db)
+    listas = []
+    for orden, columna_version, columna_id, consulta in fuentes:
+        consulta = consulta.where(columna_version > desde).order_by(columna_version, columna_id)
+        if posicion:
+            consulta = consulta.where(_despues(columna_version, columna_id, orden, posicion))
+        if limite:
+            consulta = consulta.limit(limite + 1)
+        listas.append([((f.version, orden, f.id), f) for f in db.execute(consulta)])
+
+    elementos = list(heapq.merge(*listas, key=lambda elemento: elemento[0]))
+    hay_mas = limite is not None and len(elementos) > limite
+    if hay_mas:
+        elementos = elementos[:limite]
+
+    resultado = {
+        "version": version,
+        "categorias": [], "productos": [], "bajas": {"categorias": [], "productos": []},
+        "hay_mas": hay_mas,
+        "siguiente": ".".join(map(str, elementos[-1][0])) if hay_mas else None,
+    }
+    eliminados = []
+    for (_, orden, _), fila in elementos:
+        if orden == CATEGORIAS:
+            resultado["categorias"].append(dict(fila._mapping))
+        elif orden == PRODUCTOS:
+            resultado["productos"].append(dict(fila._mapping))
+        else:
+            eliminados.append(fila)
+    # Un id eliminado y luego reutilizado (SQLite puede reusar el último) figura
+    # como fila vigente; en otra página, la baja llega siempre antes que la fila
+    vigentes = {tabla: {f["id"] for f in resultado[tabla]} for tabla in ("categorias", "productos")}
+    for fila in eliminados:
+        if fila.registro_id not in vigentes[fila.tabla]:
+            resultado["bajas"][fila.tabla].append(fila.registro_id)
+    return resultado
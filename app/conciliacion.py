@@ -0,0 +1,143 @@
+"""
+Conciliación del stock con el libro de movimientos y conteos físicos.
+
+`stock_actual` es un valor desnormalizado: lo mantienen los movimientos, pero
+también se puede escribir directamente (alta de producto con stock inicial,
+PUT/PATCH de productos, carga masiva). `diferencias()` compara, para todos los
+productos a la vez, el stock con el neto de sus movimientos (entradas menos
+salidas, incluidas las tablas de archivo) con una sola consulta agrupada:
+
+    python -m app.conciliacion
+
+`aplicar_conteo()` recibe las cantidades contadas en un inventario físico y,
+para cada producto con diferencia, registra el movimiento de ajuste
+(crud.registrar_movimiento) en una única transacción.
+"""
+from typing import List
+
+from sqlalchemy import select, func, case
+from sqlalchemy.orm import Session
+
+from . import models, archivo, crud, valorizacion, contadores
+from .database import escritura
+
+LOTE_CONTEO = 5000  # ids por consulta IN al cargar los productos contados
+
+
+# =========================
+# 📌 Diferencias con el libro de movimientos
+# =========================
+def consulta_diferencias(db: Session):
+    fuente = archivo.fuente_movimientos(db)
+    firmada = case((fuente.c.tipo == "entrada", fuente.c.cantidad), else_=-fuente.c.cantidad)
+    neto = (
+        select(fuente.c.producto_id, func.sum(firmada).label("neto"))
+        .group_by(fuente.c.producto_id)
+        .subquery()
+    )
+    p = models.Producto
+    esperado = func.coalesce(neto.c.neto, 0)
+    return (
+        select(p.id.label("producto_id"), p.nombre, p.stock_actual,
+               esperado.label("stock_esperado"), (p.stock_actual - esperado).label("diferencia"))
+        .outerjoin(neto, neto.c.producto_id == p.id)
+        .where(p.stock_actual != esperado)
+        .order_by(p.id)
+    )
+
+
+def diferencias(db: Session, despues_de: int = 0, limite: int = 1000) -> dict:
+    """
+    Productos cuyo stock no coincide con sus movimientos.
+
+    Los totales cubren todo el catálogo; el detalle se pagina por producto_id.
+    """
+    detalle = []
+    con_diferencia = sobrante = faltante = 0
+    for fila in db.execute(consulta_diferencias(db)):
+        con_diferencia += 1
+        if fila.diferencia > 0:
+            sobrante += fila.diferencia
+        else:
+            faltante -= fila.diferencia
+        if fila.producto_id > despues_de and len(detalle) < limite:
+            detalle.append(dict(fila._mapping))
+    return {
+        "con_diferencia": con_diferencia,
+        "unidades_sobrantes": sobrante,   # stock por encima de lo que explican los movimientos
+        "unidades_faltantes": faltante,
+        "productos": detalle,
+        "siguiente": detalle[-1]["producto_id"] if len(detalle) == limite else None,
+    }
+
+
+# =========================
+# 📌 Conteo físico
+# =========================
+@escritura
+def aplicar_conteo(db: Session, conteos: List[dict]) -> dict:
+    """
+    Lleva el stock de cada producto contado a la cantidad contada.
+
+    Todo o nada: un producto inexistente o repetido rechaza el conteo completo
+    con ValueError. Como el conteo es absoluto, reenviarlo no vuelve a ajustar.
+    """
+    cantidades = {}
+    for conteo in conteos:
+        if conteo["producto_id"] in cantidades:
+            raise ValueError(f"Producto ID {conteo['producto_id']} repetido en el conteo")
+        cantidades[conteo["producto_id"]] = conteo["cantidad"]
+
+    ids = list(cantidades)
+    productos = {}
+    for inicio in range(0, len(ids), LOTE_CONTEO):
+        lote = ids[inicio:inicio + LOTE_CONTEO]
+        productos.update((p.id, p) for p in db.query(models.Producto).filter(models.Producto.id.in_(lote)))
+    faltantes = [i for i in ids if i not in productos]
+    if faltantes:
+        raise ValueError(f"Productos no encontrados: {faltantes[:20]}")
+
+    a_ajustar = [productos[i] for i in ids if cantidades[i] != productos[i].stock_actual]
+    costos = valorizacion.precargar_costos(db, a_ajustar)  # noqa: F841 - mantiene los registros en la sesión
+
+    ajustes = []
+    entradas = salidas = 0
+    # Sin autoflush: los movimientos se insertan juntos en el flush del commit
+    with db.no_autoflush, contadores.acumulando(db):
+        for producto in a_ajustar:
+            contado = cantidades[producto.id]
+            diferencia = contado - producto.stock_actual
+            ajustes.append({"producto_id": producto.id, "anterior": producto.stock_actual,
+                            "contado": contado, "diferencia": diferencia})
+            if diferencia > 0:
+                crud.registrar_movimiento(db, producto, "entrada", diferencia)
+                entradas += diferencia
+            else:
+                crud.registrar_movimiento(db, producto, "salida", -diferencia)
+                salidas -= diferencia
+    db.commit()
+    return {
+        "contados": len(cantidades),
+        "ajustados": len(ajustes),
+        "unidades_entrada": entradas,
+        "unidades_salida": salidas,
+        "ajustes": ajustes,
+    }
+
+
+if __name__ == "__main__":
+    from .database import SessionLocal, sincronizar_esquema
+    from .archivo import sincronizar_archivos
+
+    sincronizar_esquema()
+    sincronizar_archivos()
+    db = SessionLocal()
+    try:
+        resultado = diferencias(db, limite=20)
+        print(f"{resultado['con_diferencia']} productos con diferencia "
+              f"(+{resultado['unidades_sobrantes']} / -{resultado['unidades_faltantes']} unidades)")
+        for fila in resultado["productos"]:
+            print(f"{fila['producto_id']:>8} {fila['nombre'][:30]:<30} stock {fila['stock_actual']:>8} "
+                  f"movimientos {fila['stock_esperado']:>8} diferencia {fila['diferencia']:>+8}")
+    finally:
+        db.close()
@@ -0,0 +1,184 @@
+"""
+Contadores del dashboard, mantenidos de forma incremental.
+
+La tabla `contadores` guarda pocos valores por clave:
+  - "unidades", "valor_stock", "bajo_stock": totales de productos
+  - "ventas:AAAA-MM-DD", "compras:AAAA-MM-DD", "documentos:AAAA-MM-DD": importes
+    y cantidad de documentos por día (fecha UTC del documento)
+
+Las funciones de escritura de `crud.py` aplican las diferencias en la misma
+transacción que el cambio (`ajustar_producto`, `ajustar_documento`), así que
+`resumen()` lee unas pocas filas por clave. `reconstruir()` recalcula todo
+desde las tablas de origen:
+
+    python -m app.contadores
+"""
+from contextlib import contextmanager
+from datetime import date, datetime
+
+from sqlalchemy import func, case
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from . import models, valorizacion
+from .database import SessionLocal, escritura
+
+CERO = (0, 0.0, 0)  # (unidades, valor, bajo stock) de un producto inexistente
+
+
+# =========================
+# 📌 Ajustes incrementales
+# =========================
+def ajustar(db: Session, deltas: dict):
+    """Suma cada delta a su contador (crea el contador si no existe). Sin commit."""
+    acumulados = db.info.get("contadores_acumulados")
+    if acumulados is not None:
+        for clave, delta in deltas.items():
+            acumulados[clave] = acumulados.get(clave, 0) + delta
+        return
+    filas = [{"clave": clave, "valor": delta} for clave, delta in deltas.items() if delta]
+    if not filas:
+        return
+    tabla = models.Contador.__table__
+    stmt = sqlite_insert(tabla)
+    stmt = stmt.on_conflict_do_update(index_elements=["clave"], set_={"valor": tabla.c.valor + stmt.excluded.valor})
+    db.execute(stmt, filas)
+
+
+@contextmanager
+def acumulando(db: Session):
+    """Dentro del bloque los ajustes se suman en memoria; al salir se aplican en una sola sentencia."""
+    acumulados = db.info["contadores_acumulados"] = {}
+    try:
+        yield
+    finally:
+        db.info.pop("contadores_acumulados", None)
+    ajustar(db, acumulados)
+
+
+def estado_producto(db: Session, producto: models.Producto):
+    """(unidades, valor, bajo stock) con que el producto aporta a los totales."""
+    costo = valorizacion.costo_promedio(db, producto) if producto.id is not None else producto.precio_compra
+    return (
+        producto.stock_actual,
+        producto.stock_actual * costo,
+        1 if producto.stock_actual <= producto.stock_minimo else 0,
+    )
+
+
+def ajustar_producto(db: Session, antes: tuple, despues: tuple):
+    ajustar(db, {
+        "unidades": despues[0] - antes[0],
+        "valor_stock": despues[1] - antes[1],
+        "bajo_stock": despues[2] - antes[2],
+    })
+
+
+def ajustar_documento(db: Session, documento: models.Documento, signo: int):
+    """Suma (signo=1) o resta (signo=-1) el documento a los contadores de su día."""
+    dia = (documento.fecha or datetime.utcnow()).date().isoformat()
+    importe = documento.subtotal or 0.0  # total de cabecera (crud.aplicar_totales)
+    clave = "ventas" if documento.operacion == "VENTA" else "compras"
+    ajustar(db, {f"{clave}:{dia}": signo * importe, f"documentos:{dia}": signo})
+
+
+# =========================
+# 📌 Lectura
+# =========================
+def resumen(db: Session, dia: date = None) -> dict:
+    dia = (dia or datetime.utcnow().date()).isoformat()
+    claves = ["unidades", "valor_stock", "bajo_stock", f"ventas:{dia}", f"compras:{dia}", f"documentos:{dia}"]
+    valores = dict(
+        db.query(models.Contador.clave, models.Contador.valor).filter(models.Contador.clave.in_(claves)).all()
+    )
+    return {
+        "fecha": dia,
+        "valor_stock": round(valores.get("valor_stock", 0.0), 2),
+        "unidades": int(valores.get("unidades", 0)),
+        "bajo_stock": int(valores.get("bajo_stock", 0)),
+        "ventas_hoy": round(valores.get(f"ventas:{dia}", 0.0), 2),
+        "compras_hoy": round(valores.get(f"compras:{dia}", 0.0), 2),
+        "documentos_hoy": int(valores.get(f"documentos:{dia}", 0)),
+    }
+
+
+# =========================
+# 📌 Reconstrucción
+# =========================
+def recalcular_productos(db: Session):
+    """Recalcula los totales de productos con una sola consulta agregada. Sin commit."""
+    unidades, valor, bajos = (
+        db.query(
+            func.coalesce(func.sum(models.Producto.stock_actual), 0),
+            func.coalesce(func.sum(models.Producto.stock_actual * valorizacion.costo_sql()), 0.0),
+            func.coalesce(func.sum(case((models.Producto.stock_actual <= models.Producto.stock_minimo, 1), else_=0)), 0),
+        )
+        .outerjoin(models.CostoProducto, models.CostoProducto.producto_id == models.Producto.id)
+        .one()
+    )
+    _reemplazar(db, {"unidades": unidades, "valor_stock": valor, "bajo_stock": bajos})
+
+
+def reconstruir(db: Session) -> dict:
+    """Recalcula todos los contadores desde productos y documentos. Sin commit."""
+    recalcular_productos(db)
+
+    dia = func.date(models.Documento.fecha)
+    por_dia = (
+        db.query(dia, models.Documento.operacion, func.count(models.Documento.id),
+                 func.coalesce(func.sum(models.Documento.subtotal), 0.0))
+        .group_by(dia, models.Documento.operacion)
+        .all()
+    )
+    valores = {}
+    for fecha, operacion, documentos, importe in por_dia:
+        clave = "ventas" if operacion == "VENTA" else "compras"
+        valores[f"{clave}:{fecha}"] = valores.get(f"{clave}:{fecha}", 0.0) + importe
+        valores[f"documentos:{fecha}"] = valores.get(f"documentos:{fecha}", 0) + documentos
+
+    for prefijo in ("ventas:", "compras:", "documentos:"):
+        db.query(models.Contador).filter(models.Contador.clave.startswith(prefijo)).delete(synchronize_session=False)
+    _reemplazar(db, valores)
+    return {"claves": len(valores) + 3}
+
+
+@escritura
+def reconciliar(db: Session) -> dict:
+    """Reconstruye y confirma los contadores. Devuelve el resumen de hoy antes y después."""
+    antes = resumen(db)
+    reconstruir(db)
+    db.commit()
+    return {"antes": antes, "despues": resumen(db)}
+
+
+def inicializar():
+    """Al iniciar: si la tabla de contadores está vacía (base existente), la reconstruye."""
+    db = SessionLocal()
+    try:
+        if db.query(models.Contador.clave).first() is None:
+            reconciliar(db)
+    finally:
+        db.close()
+
+
+def _reemplazar(db: Session, valores: dict):
+    if not valores:
+        return
+    tabla = models.Contador.__table__
+    stmt = sqlite_insert(tabla)
+    stmt = stmt.on_conflict_do_update(index_elements=["clave"], set_={"valor": stmt.excluded.valor})
+    db.execute(stmt, [{"clave": clave, "valor": valor} for clave, valor in valores.items()])
+
+
+if __name__ == "__main__":
+    from .database import sincronizar_esquema
+
+    sincronizar_esquema()
+    db = SessionLocal()
+    try:
+        resultado = reconciliar(db)
+        for clave, valor in resultado["despues"].items():
+            anterior = resultado["antes"][clave]
+            print(f"{clave:>15}: {valor}" + ("" if anterior == valor else f"  (antes {anterior})"))
+    finally:
+        db.close()
@@ -1,13 +1,23 @@
+import os
+
+from sqlalchemy import select, update, func, case, and_, or_
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import Session
-from . import models, schemas
+from typing import List
+from . import models, schemas, archivo, valorizacion, contadores, numeracion, cambios, catalogo, disponibilidad  # listeners del flush
+from .database import escritura
 from datetime import datetime
 
+TASA_IMPUESTO = float(os.getenv("IMPUESTO_TASA", "0.18"))  # IGV sobre el subtotal de las líneas
+LOTE_IDS = 5000  # ids por consulta IN
+
 
 # =========================
 # 📌 CRUD CATEGORIA
 # =========================
 
 # Crear Categoria
+@escritura
 def create_categoria(db: Session, categoria: schemas.CategoriaCreate):
     db_categoria = models.Categoria(**categoria.model_dump())
     db.add(db_categoria)
@@ -25,6 +35,7 @@ def get_categoria(db: Session, categoria_id: int):
     return db.query(models.Categoria).filter(models.Categoria.id == categoria_id).first()
 
 # Eliminar Categoria
+@escritura
 def delete_categoria(db: Session, categoria_id: int):
     categoria = db.query(models.Categoria).filter(models.Categoria.id == categoria_id).first()
     if not categoria:
@@ -40,6 +51,7 @@ def delete_categoria(db: Session, categoria_id: int):
     return categoria
 
 # Actualizar Categoria (PUT)
+@escritura
 def update_categoria(db: Session, categoria_id: int, categoria_update: schemas.CategoriaCreate):
     """Actualiza una categoría de manera TOTAL (PUT)"""
     db_categoria = db.query(models.Categoria).filter(models.Categoria.id == categoria_id).first()
@@ -62,6 +74,7 @@ def update_categoria(db: Session, categoria_id: int, categoria_update: schemas.C
     return db_categoria
 
 # Actualizar Categoria (PATCH)
+@escritura
 def patch_categoria(db: Session, categoria_id: int, categoria_patch: dict):
     """Actualiza una categoría de manera PARCIAL (PATCH)"""
     db_categoria = db.query(models.Categoria).filter(models.Categoria.id == categoria_id).first()
@@ -90,9 +103,12 @@ def patch_categoria(db: Session, categoria_id: int, categoria_patch: dict):
 # =========================
 
 # Crear Producto
+@escritura
 def create_producto(db: Session, producto: schemas.ProductoCreate):
     db_producto = models.Producto(**producto.model_dump())
     db.add(db_producto)
+    db.flush()
+    contadores.ajustar_producto(db, contadores.CERO, contadores.estado_producto(db, db_producto))
     db.commit()
     db.refresh(db_producto)
     return db_producto
@@ -101,53 +117,176 @@ def create_producto(db: Session, producto: schemas.ProductoCreate):
 def get_productos(db: Session, skip: int = 0, limit: int = 10):
     return db.query(models.Producto).offset(skip).limit(limit).all()
 
+# Misma página como consulta Core (formatos binarios, sin objetos ORM)
+def consulta_productos(skip: int = 0, limit: int = 10):
+    return select(models.Producto.__table__).offset(skip).limit(limit)
+
 # Obtener un producto por ID
 def get_producto(db: Session, producto_id: int):
     return db.query(models.Producto).filter(models.Producto.id == producto_id).first()
 
 # Eliminar producto
+@escritura
 def delete_producto(db: Session, producto_id: int):
     producto = db.query(models.Producto).filter(models.Producto.id == producto_id).first()
     if not producto:
         return None
 
+    contadores.ajustar_producto(db, contadores.estado_producto(db, producto), contadores.CERO)
     db.delete(producto)
     db.commit()
     return producto
 
 # Actualizar Producto (PUT)
+@escritura
 def update_producto(db: Session, producto_id: int, producto_update: schemas.ProductoCreate):
     """Actualiza un producto de manera TOTAL (PUT)"""
     db_producto = db.query(models.Producto).filter(models.Producto.id == producto_id).first()
     if not db_producto:
         return None
 
+    antes = contadores.estado_producto(db, db_producto)
     for key, value in producto_update.model_dump().items():
         setattr(db_producto, key, value)
+    contadores.ajustar_producto(db, antes, contadores.estado_producto(db, db_producto))
 
     db.commit()
     db.refresh(db_producto)
     return db_producto
 
 # Actualizar Producto (PATCH)
+@escritura
 def patch_producto(db: Session, producto_id: int, producto_patch: dict):
     """Actualiza un producto de manera PARCIAL (PATCH)"""
     db_producto = db.query(models.Producto).filter(models.Producto.id == producto_id).first()
     if not db_producto:
         return None
 
+    antes = contadores.estado_producto(db, db_producto)
     for key, value in producto_patch.items():
         setattr(db_producto, key, value)
+    contadores.ajustar_producto(db, antes, contadores.estado_producto(db, db_producto))
 
     db.commit()
     db.refresh(db_producto)
     return db_producto
 
+# Carga masiva: INSERT ... ON CONFLICT(codigo_barras) DO UPDATE
+@escritura
+def upsert_productos(db: Session, filas: List[dict]):
+    """
+    Inserta o actualiza un lote de productos por `codigo_barras` con INSERT ... ON CONFLICT DO UPDATE.
+
+    El stock de los productos existentes no se modifica: solo cambia por movimientos.
+    Cada `codigo_barras` debe aparecer una sola vez en el lote (ValueError si se repite).
+    Devuelve (insertados, actualizados, sin_cambios).
+    """
+    codigos = [f["codigo_barras"] for f in filas]
+    if len(set(codigos)) != len(codigos):
+        raise ValueError("codigo_barras repetido en el lote")
+    existentes = {
+        codigo for (codigo,) in db.query(models.Producto.codigo_barras)
+        .filter(models.Producto.codigo_barras.in_(codigos))
+    }
+
+    # Una sentencia compilada una sola vez y ejecutada con executemany. Solo se
+    # actualizan (y cambian de versión del catálogo) las filas con algún dato distinto.
+    columnas = ("nombre", "precio_compra", "precio_venta", "stock_minimo", "unidad_medida", "categoria_id")
+    tabla = models.Producto.__table__
+    stmt = sqlite_insert(tabla)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=["codigo_barras"],
+        set_={**{columna: stmt.excluded[columna] for columna in columnas}, "version": stmt.excluded.version},
+        where=or_(*(tabla.c[columna].is_not(stmt.excluded[columna]) for columna in columnas)),
+    )
+    version = catalogo.siguiente_version(db)
+    # RETURNING solo trae las filas insertadas o actualizadas (no las que el WHERE saltó)
+    tocados = set(db.execute(
+        stmt.returning(tabla.c.codigo_barras), [dict(fila, version=version) for fila in filas]
+    ).scalars())
+    if tocados:
+        disponibilidad.anotar(db, select(models.Producto).where(models.Producto.codigo_barras.in_(tocados)))
+        contadores.recalcular_productos(db)
+    db.commit()
+    return len(tocados - existentes), len(tocados & existentes), len(existentes - tocados)
+
+
+# Actualización masiva: un solo UPDATE ... WHERE con el filtro
+def _expresion_masiva(cambio: schemas.ExpresionProducto):
+    columna = getattr(models.Producto, cambio.campo)
+    numerico = cambio.campo in schemas.CAMPOS_NUMERICOS_MASIVOS
+
+    if cambio.operacion != "set" and not numerico:
+        raise ValueError(f"'{cambio.operacion}' solo aplica a {schemas.CAMPOS_NUMERICOS_MASIVOS}")
+    if (numerico or cambio.campo == "categoria_id") and isinstance(cambio.valor, str):
+        raise ValueError(f"{cambio.campo} requiere un valor numérico")
+
+    if cambio.operacion == "add":
+        expresion = columna + cambio.valor
+    elif cambio.operacion == "porcentaje":
+        expresion = columna * (1 + cambio.valor / 100.0)
+    else:
+        expresion = cambio.valor
+
+    if cambio.redondeo is not None and numerico:
+        expresion = func.round(expresion, cambio.redondeo)
+    if cambio.campo == "stock_minimo" and cambio.operacion != "set":
+        expresion = func.round(expresion)  # SQLite lo guarda como entero por la afinidad de la columna
+    return expresion
+
+
+@escritura
+def actualizar_productos_masivo(db: Session, filtro: schemas.FiltroProductos, cambios: List[schemas.ExpresionProducto]) -> int:
+    """
+    Aplica las expresiones a todos los productos que cumplen el filtro en un
+    solo UPDATE. Devuelve la cantidad de filas afectadas.
+    """
+    condiciones = []
+    if filtro.categoria_id is not None:
+        condiciones.append(models.Producto.categoria_id == filtro.categoria_id)
+    if filtro.ids is not None:
+        condiciones.append(models.Producto.id.in_(filtro.ids))
+    if filtro.prefijo_codigo:
+        condiciones.append(models.Producto.codigo_barras.startswith(filtro.prefijo_codigo, autoescape=True))
+    if not condiciones:
+        raise ValueError("Debe indicar al menos un filtro (categoria_id, ids o prefijo_codigo)")
+    if not cambios:
+        raise ValueError("Debe indicar al menos un cambio")
+
+    valores = {}
+    for cambio in cambios:
+        if cambio.campo in valores:
+            raise ValueError(f"El campo {cambio.campo} aparece más de una vez")
+        valores[cambio.campo] = _expresion_masiva(cambio)
+
+    if "categoria_id" in valores and db.get(models.Categoria, valores["categoria_id"]) is None:
+        raise ValueError("Categoría no encontrada")
+    valores["version"] = catalogo.siguiente_version(db)  # el UPDATE masivo no pasa por el flush
+
+    # Los ids salen del propio UPDATE: volver a filtrar después no encuentra las
+    # filas si el cambio toca una columna del filtro (categoria_id)
+    ids = db.execute(
+        update(models.Producto)
+        .where(*condiciones)
+        .values(valores)
+        .returning(models.Producto.id)
+        .execution_options(synchronize_session=False)
+    ).scalars().all()
+    if {"precio_compra", "stock_minimo"} & set(valores):  # afectan el valor y el bajo stock
+        contadores.recalcular_productos(db)
+    if {"precio_venta", "stock_minimo"} & set(valores):
+        for inicio in range(0, len(ids), LOTE_IDS):
+            disponibilidad.anotar(db, select(models.Producto).where(models.Producto.id.in_(ids[inicio:inicio + LOTE_IDS])))
+    db.commit()
+    return len(ids)
+
+
 # =========================
 # 📌 CRUD PROVEEDOR
 # =========================
 
 # Crear
+@escritura
 def create_proveedor(db: Session, proveedor: schemas.ProveedorCreate):
     db_proveedor = models.Proveedor(**proveedor.model_dump())
     db.add(db_proveedor)
@@ -164,6 +303,7 @@ def get_proveedores(db: Session, skip: int = 0, limit: int = 100):
     return db.query(models.Proveedor).offset(skip).limit(limit).all()
 
 # Actualizar
+@escritura
 def update_proveedor(db: Session, proveedor_id: int, proveedor: schemas.ProveedorCreate):
     db_proveedor = get_proveedor(db, proveedor_id)
     if not db_proveedor:
@@ -175,6 +315,7 @@ def update_proveedor(db: Session, proveedor_id: int, proveedor: schemas.Proveedo
     return db_proveedor
 
 # Eliminar
+@escritura
 def delete_proveedor(db: Session, proveedor_id: int):
     db_proveedor = get_proveedor(db, proveedor_id)
     if not db_proveedor:
@@ -187,6 +328,7 @@ def delete_proveedor(db: Session, proveedor_id: int):
 # 📌 CRUD CLIENTE
 # =========================
 # Crear cliente
+@escritura
 def create_cliente(db: Session, cliente: schemas.ClienteCreate):
     db_cliente = models.Cliente(**cliente.model_dump())
     db.add(db_cliente)
@@ -203,6 +345,7 @@ def get_cliente(db: Session, cliente_id: int):
     return db.query(models.Cliente).filter(models.Cliente.id == cliente_id).first()
 
 # Actualizar (PUT/PATCH)
+@escritura
 def update_cliente(db: Session, cliente_id: int, cliente: schemas.ClienteUpdate):
     db_cliente = get_cliente(db, cliente_id)
     if not db_cliente:
@@ -214,6 +357,7 @@ def update_cliente(db: Session, cliente_id: int, cliente: schemas.ClienteUpdate)
     return db_cliente
 
 # Eliminar
+@escritura
 def delete_cliente(db: Session, cliente_id: int):
     db_cliente = get_cliente(db, cliente_id)
     if not db_cliente:
@@ -226,21 +370,189 @@ from sqlalchemy.orm import Session
 from . import models, schemas
 from datetime import datetime
 
+# =========================
+# 📌 Kardex
+# =========================
+def get_kardex(db: Session, producto_id: int, despues_de: int = 0, limite: int = 100):
+    """
+    Kardex de un producto: movimientos con saldo acumulado, costo y documento.
+
+    Paginado por keyset sobre el id del movimiento. El saldo se calcula en SQLite
+    con una función de ventana sobre la página, partiendo del saldo previo:
+    stock_actual menos el neto de los movimientos posteriores a `despues_de`.
+    """
+    producto = get_producto(db, producto_id)
+    if not producto:
+        return None
+
+    fuente = archivo.fuente_movimientos(db)
+    firmada = case((fuente.c.tipo == "entrada", fuente.c.cantidad), else_=-fuente.c.cantidad)
+    posterior = (
+        select(func.coalesce(func.sum(firmada), 0))
+        .where(fuente.c.producto_id == producto_id, fuente.c.id > despues_de)
+        .scalar_subquery()
+    )
+
+    pagina = (
+        select(fuente.c.id, fuente.c.fecha, fuente.c.tipo, fuente.c.cantidad,
+               fuente.c.costo_unitario, fuente.c.documento_id)
+        .where(fuente.c.producto_id == producto_id, fuente.c.id > despues_de)
+        .order_by(fuente.c.id)
+        .limit(limite)
+        .subquery()
+    )
+    firmada_pagina = case((pagina.c.tipo == "entrada", pagina.c.cantidad), else_=-pagina.c.cantidad)
+    saldo = producto.stock_actual - posterior + func.sum(firmada_pagina).over(order_by=pagina.c.id)
+
+    filas = db.execute(
+        select(pagina, saldo.label("saldo"),
+               models.Documento.tipo.label("documento_tipo"),
+               models.Documento.numero.label("documento_numero"),
+               models.Documento.operacion)
+        .outerjoin(models.Documento, models.Documento.id == pagina.c.documento_id)
+        .order_by(pagina.c.id)
+    ).all()
+
+    lineas = [
+        {
+            "movimiento_id": f.id,
+            "fecha": f.fecha,
+            "tipo": f.tipo,
+            "entrada": f.cantidad if f.tipo == "entrada" else 0,
+            "salida": f.cantidad if f.tipo == "salida" else 0,
+            "saldo": f.saldo,
+            "costo_unitario": f.costo_unitario,
+            "costo_total": f.cantidad * f.costo_unitario if f.costo_unitario is not None else None,
+            "documento_id": f.documento_id,
+            "documento_tipo": f.documento_tipo,
+            "documento_numero": f.documento_numero,
+            "operacion": f.operacion,
+        }
+        for f in filas
+    ]
+    return {
+        "producto_id": producto.id,
+        "nombre": producto.nombre,
+        "lineas": lineas,
+        "siguiente": lineas[-1]["movimiento_id"] if len(lineas) == limite else None,
+    }
+
+
+# =========================
+# 📌 Stock y Movimientos
+# =========================
+def registrar_movimiento(db: Session, producto: models.Producto, tipo: str, cantidad: int,
+                         documento_id: int = None, costo_unitario: float = None):
+    """
+    Ajusta el stock del producto y agrega el movimiento correspondiente (sin commit).
+    También actualiza el costo promedio y los contadores del dashboard.
+
+    `costo_unitario` solo se indica en entradas con costo propio (compras); el
+    resto se valoriza al costo promedio vigente.
+    """
+    antes = contadores.estado_producto(db, producto)
+    costo = valorizacion.aplicar_movimiento(db, producto, tipo, cantidad, costo_unitario)
+    if tipo == "entrada":
+        producto.stock_actual += cantidad
+    else:
+        producto.stock_actual -= cantidad
+    db.add(producto)
+    contadores.ajustar_producto(db, antes, contadores.estado_producto(db, producto))
+
+    db_movimiento = models.Movimiento(
+        producto_id=producto.id,
+        tipo=tipo,
+        cantidad=cantidad,
+        fecha=datetime.utcnow(),
+        documento_id=documento_id,
+        costo_unitario=costo,
+        costo_propio=tipo == "entrada" and costo_unitario is not None,
+    )
+    db.add(db_movimiento)
+    return db_movimiento
+
+
+def _signo_operacion(operacion: str) -> int:
+    """Efecto de la operación sobre el stock: la venta descuenta, la compra suma."""
+    return -1 if operacion == "VENTA" else 1
+
+
+def aplicar_totales(db_documento: models.Documento, detalles):
+    """Guarda en la cabecera subtotal, impuesto, total y cantidad de líneas del documento."""
+    subtotal = round(sum(d.subtotal for d in detalles), 2)
+    impuesto = round(subtotal * TASA_IMPUESTO, 2)
+    db_documento.subtotal = subtotal
+    db_documento.impuesto = impuesto
+    db_documento.total = round(subtotal + impuesto, 2)
+    db_documento.lineas = len(detalles)
+
+
+@escritura
+def completar_totales(db: Session) -> int:
+    """Calcula los totales de los documentos que aún no los tienen (bases anteriores a las columnas)."""
+    d, det = models.Documento, models.DetalleDocumento
+    suma = select(func.coalesce(func.sum(det.subtotal), 0.0)).where(det.documento_id == d.id).scalar_subquery()
+    cuenta = select(func.count(det.id)).where(det.documento_id == d.id).scalar_subquery()
+    actualizados = db.execute(
+        update(d)
+        .where(d.lineas.is_(None))
+        .values(subtotal=func.round(suma, 2), lineas=cuenta)
+        .execution_options(synchronize_session=False)
+    ).rowcount
+    if actualizados:
+        # En un UPDATE de SQLite el SET ve los valores anteriores: impuesto y total van en otra sentencia
+        impuesto = func.round(d.subtotal * TASA_IMPUESTO, 2)
+        db.execute(
+            update(d)
+            .where(d.impuesto.is_(None))
+            .values(impuesto=impuesto, total=func.round(d.subtotal + impuesto, 2))
+            .execution_options(synchronize_session=False)
+        )
+    db.commit()
+    return actualizados
+
+
 # =========================
 # 📌 Crear Documento
 # =========================
 def create_documento(db: Session, documento: schemas.DocumentoCreate):
+    """
+    Crea el documento con sus movimientos. Si no trae número, se asigna de su
+    serie: en series por bloques antes de abrir la transacción, en series sin
+    huecos dentro de ella (ver numeracion.py).
+    """
+    if documento.numero is not None:
+        return _insertar_documento(db, documento, documento.numero, documento.serie)
+    serie = documento.serie or numeracion.serie_por_defecto(db, documento.tipo)
+    while True:
+        numero = numeracion.reservar(db, documento.tipo, serie)
+        try:
+            return _insertar_documento(db, documento, numero, serie)
+        except numeracion.NumeroDuplicado:
+            # Un cliente envió ese mismo número después de reservarlo: se toma el siguiente
+            if numero is None:
+                raise
+
+
+@escritura
+def _insertar_documento(db: Session, documento: schemas.DocumentoCreate, numero: str, serie: str):
+    if numero is None:
+        numero = numeracion.siguiente_sin_huecos(db, documento.tipo, serie)
+    elif db.query(models.Documento.id).filter(models.Documento.numero == numero).first():
+        # Antes de tocar el stock: el índice único fallaría recién en el flush
+        raise numeracion.NumeroDuplicado(f"Ya existe un documento con número {numero}")
+
     db_documento = models.Documento(
         tipo=documento.tipo,
-        numero=documento.numero,
+        numero=numero,
         cliente_id=documento.cliente_id,
         proveedor_id=documento.proveedor_id,
         operacion=documento.operacion
     )
     db.add(db_documento)
-    db.commit()
-    db.refresh(db_documento)
+    db.flush()  # obtiene el id sin cerrar la transacción
 
+    detalles = []
     for det in documento.detalles:
         producto = db.query(models.Producto).filter(models.Producto.id == det.producto_id).first()
         if not producto:
@@ -257,24 +569,18 @@ def create_documento(db: Session, documento: schemas.DocumentoCreate):
             subtotal=subtotal
         )
         db.add(db_detalle)
+        detalles.append(db_detalle)
 
-        # Ajustar stock
+        # Ajustar stock (las compras entran a su precio de compra)
         if documento.operacion == "VENTA":
-            producto.stock_actual -= det.cantidad
-            movimiento_tipo = "salida"
+            registrar_movimiento(db, producto, "salida", det.cantidad, documento_id=db_documento.id)
         else:
-            producto.stock_actual += det.cantidad
-            movimiento_tipo = "entrada"
-        db.add(producto)
-
-        db_movimiento = models.Movimiento(
-            producto_id=det.producto_id,
-            tipo=movimiento_tipo,
-            cantidad=det.cantidad,
-            fecha=datetime.utcnow()
-        )
-        db.add(db_movimiento)
+            registrar_movimiento(db, producto, "entrada", det.cantidad, documento_id=db_documento.id,
+                                 costo_unitario=precio_unitario)
 
+    aplicar_totales(db_documento, detalles)
+    db.flush()
+    contadores.ajustar_documento(db, db_documento, 1)
     db.commit()
     db.refresh(db_documento)
     return db_documento
@@ -287,6 +593,70 @@ def get_documentos(db: Session, skip: int = 0, limit: int = 100):
     return db.query(models.Documento).offset(skip).limit(limit).all()
 
 
+def consulta_documentos_lineas(skip: int = 0, limit: int = 100):
+    """Página de documentos como filas planas: una por línea de detalle (formatos binarios)."""
+    pagina = select(models.Documento.id).order_by(models.Documento.id).offset(skip).limit(limit).subquery()
+    d, det = models.Documento, models.DetalleDocumento
+    return (
+        select(d.id.label("documento_id"), d.tipo, d.operacion, d.numero, d.fecha, d.cliente_id, d.proveedor_id,
+               det.producto_id, det.cantidad, det.precio_unitario, det.subtotal)
+        .join(pagina, pagina.c.id == d.id)
+        .outerjoin(det, det.documento_id == d.id)
+        .order_by(d.id, det.id)
+    )
+
+
+# =========================
+# 📌 Buscar documentos
+# =========================
+def _cursor_documentos(despues_de: str):
+    """"AAAA-MM-DDTHH:MM:SS.ffffff,id" -> (fecha, id)."""
+    try:
+        fecha, documento_id = despues_de.rsplit(",", 1)
+        return datetime.fromisoformat(fecha), int(documento_id)
+    except ValueError:
+        raise ValueError("despues_de inválido: use el valor de `siguiente` de la página anterior")
+
+
+def buscar_documentos(db: Session, fecha_inicio: datetime = None, fecha_fin: datetime = None,
+                      operacion: str = None, cliente_id: int = None, proveedor_id: int = None,
+                      total_min: float = None, total_max: float = None,
+                      despues_de: str = None, limite: int = 50):
+    """
+    Cabeceras de documentos filtradas, de la más reciente a la más antigua.
+
+    Paginado por keyset sobre (fecha, id): cada página continúa desde la última
+    fila de la anterior, sin OFFSET. Los filtros por igualdad + rango de fecha
+    usan los índices compuestos de `documentos`.
+    """
+    d = models.Documento
+    consulta = db.query(d)
+    if fecha_inicio is not None:
+        consulta = consulta.filter(d.fecha >= fecha_inicio)
+    if fecha_fin is not None:
+        consulta = consulta.filter(d.fecha < fecha_fin)
+    if operacion is not None:
+        consulta = consulta.filter(d.operacion == operacion.upper())
+    if cliente_id is not None:
+        consulta = consulta.filter(d.cliente_id == cliente_id)
+    if proveedor_id is not None:
+        consulta = consulta.filter(d.proveedor_id == proveedor_id)
+    if total_min is not None:
+        consulta = consulta.filter(d.total >= total_min)
+    if total_max is not None:
+        consulta = consulta.filter(d.total <= total_max)
+    if despues_de:
+        fecha, documento_id = _cursor_documentos(despues_de)
+        consulta = consulta.filter(or_(d.fecha < fecha, and_(d.fecha == fecha, d.id < documento_id)))
+
+    documentos = consulta.order_by(d.fecha.desc(), d.id.desc()).limit(limite).all()
+    ultimo = documentos[-1] if len(documentos) == limite else None
+    return {
+        "documentos": documentos,
+        "siguiente": f"{ultimo.fecha.isoformat()},{ultimo.id}" if ultimo else None,
+    }
+
+
 # =========================
 # 📌 Obtener documento por ID
 # =========================
@@ -297,69 +667,101 @@ def get_documento(db: Session, documento_id: int):
 # =========================
 # 📌 Actualizar Documento (PUT)
 # =========================
+@escritura
 def update_documento(db: Session, documento_id: int, documento_update: schemas.DocumentoUpdateFull):
+    """
+    Actualiza un documento aplicando solo la diferencia por producto.
+
+    Las líneas sin cambios no se tocan; por cada producto con cambio neto en
+    el stock se emite un único movimiento con esa diferencia. Si cambia la
+    operación, cada producto revierte su cantidad anterior y registra la nueva
+    por separado, para que cada parte se valorice a su propio costo.
+    """
     db_documento = db.query(models.Documento).filter(models.Documento.id == documento_id).first()
     if not db_documento:
         return None
 
-    # Revertir stock de detalles existentes
-    detalles_existentes = db.query(models.DetalleDocumento).filter(models.DetalleDocumento.documento_id == documento_id).all()
-    for det in detalles_existentes:
-        producto = db.query(models.Producto).filter(models.Producto.id == det.producto_id).first()
-        if producto:
-            if db_documento.operacion == "VENTA":
-                producto.stock_actual += det.cantidad
-            else:
-                producto.stock_actual -= det.cantidad
-            db.add(producto)
+    # Cantidades por producto antes y después (líneas repetidas se agrupan)
+    lineas_actuales = {}
+    for det in db_documento.detalles:
+        lineas_actuales.setdefault(det.producto_id, []).append(det)
+    anteriores = {pid: sum(d.cantidad for d in lineas) for pid, lineas in lineas_actuales.items()}
+
+    nuevas = {}
+    for det in documento_update.detalles:
+        nuevas[det.producto_id] = nuevas.get(det.producto_id, 0) + det.cantidad
+
+    ids = set(anteriores) | set(nuevas)
+    productos = {p.id: p for p in db.query(models.Producto).filter(models.Producto.id.in_(ids)).all()}
+    for producto_id in nuevas:
+        if producto_id not in productos:
+            raise ValueError(f"Producto ID {producto_id} no existe")
 
-    # Eliminar detalles antiguos
-    db.query(models.DetalleDocumento).filter(models.DetalleDocumento.documento_id == documento_id).delete()
+    operacion_anterior = db_documento.operacion
+    operacion_nueva = documento_update.operacion
+    cambia_operacion = operacion_anterior != operacion_nueva
+    contadores.ajustar_documento(db, db_documento, -1)
 
     # Actualizar cabecera
     db_documento.tipo = documento_update.tipo
-    db_documento.numero = documento_update.numero
+    if documento_update.numero is not None:  # sin número se conserva el asignado
+        db_documento.numero = documento_update.numero
     db_documento.cliente_id = documento_update.cliente_id
     db_documento.proveedor_id = documento_update.proveedor_id
-    db_documento.operacion = documento_update.operacion
-    db.add(db_documento)
-    db.commit()
-    db.refresh(db_documento)
+    db_documento.operacion = operacion_nueva
+
+    for producto_id in ids:
+        cantidad_anterior = anteriores.get(producto_id, 0)
+        cantidad_nueva = nuevas.get(producto_id, 0)
+        if cantidad_anterior == cantidad_nueva and not cambia_operacion:
+            continue
+
+        producto = productos.get(producto_id)
+        lineas = lineas_actuales.get(producto_id, [])
+
+        # Detalle: se conserva una sola línea por producto
+        sobrantes = lineas[1:] if cantidad_nueva else lineas
+        for linea in sobrantes:
+            db_documento.detalles.remove(linea)
+        if cantidad_nueva:
+            if lineas:
+                linea = lineas[0]
+            else:
+                linea = models.DetalleDocumento(producto_id=producto_id)
+                db_documento.detalles.append(linea)
+            # Las líneas existentes mantienen su precio salvo que cambie la operación
+            if not lineas or cambia_operacion:
+                linea.precio_unitario = producto.precio_venta if operacion_nueva == "VENTA" else producto.precio_compra
+            linea.cantidad = cantidad_nueva
+            linea.subtotal = cantidad_nueva * linea.precio_unitario
 
-    # Insertar nuevos detalles y ajustar stock/movimientos
-    for det in documento_update.detalles:
-        producto = db.query(models.Producto).filter(models.Producto.id == det.producto_id).first()
         if not producto:
-            raise ValueError(f"Producto ID {det.producto_id} no existe")
-
-        precio_unitario = producto.precio_venta if documento_update.operacion == "VENTA" else producto.precio_compra
-        subtotal = det.cantidad * precio_unitario
-
-        db_detalle = models.DetalleDocumento(
-            documento_id=db_documento.id,
-            producto_id=det.producto_id,
-            cantidad=det.cantidad,
-            precio_unitario=precio_unitario,
-            subtotal=subtotal
-        )
-        db.add(db_detalle)
-
-        if documento_update.operacion == "VENTA":
-            producto.stock_actual -= det.cantidad
-            movimiento_tipo = "salida"
-        else:
-            producto.stock_actual += det.cantidad
-            movimiento_tipo = "entrada"
-        db.add(producto)
-
-        db_movimiento = models.Movimiento(
-            producto_id=det.producto_id,
-            tipo=movimiento_tipo,
-            cantidad=det.cantidad,
-            fecha=datetime.utcnow()
-        )
-        db.add(db_movimiento)
-
+            continue
+        if cambia_operacion:
+            # Dos movimientos: la reversión vuelve al costo promedio vigente y la
+            # compra nueva entra a su propio precio (no se netean entre sí)
+            if cantidad_anterior:
+                registrar_movimiento(db, producto, "entrada" if operacion_anterior == "VENTA" else "salida",
+                                     cantidad_anterior, documento_id=db_documento.id)
+            if cantidad_nueva:
+                registrar_movimiento(db, producto, "entrada" if operacion_nueva == "COMPRA" else "salida",
+                                     cantidad_nueva, documento_id=db_documento.id,
+                                     costo_unitario=linea.precio_unitario if operacion_nueva == "COMPRA" else None)
+            continue
+
+        # Stock: solo la diferencia neta
+        delta = _signo_operacion(operacion_nueva) * (cantidad_nueva - cantidad_anterior)
+        if delta:
+            movimiento_tipo = "entrada" if delta > 0 else "salida"
+            costo = None
+            if movimiento_tipo == "entrada" and operacion_nueva == "COMPRA":
+                costo = linea.precio_unitario  # la compra entra a su precio
+            registrar_movimiento(db, producto, movimiento_tipo, abs(delta), documento_id=db_documento.id,
+                                 costo_unitario=costo)
+
+    aplicar_totales(db_documento, db_documento.detalles)
+    db.add(db_documento)
+    contadores.ajustar_documento(db, db_documento, 1)
     db.commit()
     db.refresh(db_documento)
     return db_documento
@@ -368,11 +770,23 @@ def update_documento(db: Session, documento_id: int, documento_update: schemas.D
 # =========================
 # 📌 Eliminar documento
 # =========================
+@escritura
 def delete_documento(db: Session, documento_id: int):
     documento = db.query(models.Documento).filter(models.Documento.id == documento_id).first()
     if not documento:
         return None
 
+    # Revertir el efecto del documento en el stock
+    cantidades = {}
+    for det in documento.detalles:
+        cantidades[det.producto_id] = cantidades.get(det.producto_id, 0) + det.cantidad
+    productos = db.query(models.Producto).filter(models.Producto.id.in_(cantidades)).all()
+    movimiento_tipo = "entrada" if documento.operacion == "VENTA" else "salida"
+    for producto in productos:
+        if cantidades[producto.id]:
+            registrar_movimiento(db, producto, movimiento_tipo, cantidades[producto.id], documento_id=documento.id)
+
+    contadores.ajustar_documento(db, documento, -1)
     db.delete(documento)
     db.commit()
     return documento
@@ -1,20 +1,207 @@
-from sqlalchemy import create_engine
+import functools
+import os
+import random
+import time
+
+from sqlalchemy import create_engine, event, inspect
+from sqlalchemy.exc import OperationalError, TimeoutError as PoolAgotado
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import QueuePool
+from sqlalchemy.schema import CreateTable
+
+from . import metricas
+
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./inventario.db")  # Simple para desarrollo local
+
+# Escrituras concurrentes (varios workers sobre el mismo archivo SQLite)
+SQLITE_BUSY_TIMEOUT = float(os.getenv("SQLITE_BUSY_TIMEOUT", "5"))       # espera interna de SQLite, en segundos
+ESCRITURA_PLAZO = float(os.getenv("ESCRITURA_PLAZO", "15"))              # plazo total con reintentos
+ESCRITURA_BACKOFF_BASE = 0.01
+ESCRITURA_BACKOFF_MAX = 0.5
+
+# Pool de conexiones (por worker)
+POOL_TAMANO = int(os.getenv("POOL_TAMANO", "5"))
+POOL_DESBORDE = int(os.getenv("POOL_DESBORDE", "10"))     # conexiones extra sobre POOL_TAMANO
+POOL_ESPERA = float(os.getenv("POOL_ESPERA", "30"))       # segundos esperando una conexión libre
+
+
+class PoolMedido(QueuePool):
+    """QueuePool que registra cuánto espera cada checkout (y si se agota)."""
+
+    def _do_get(self):
+        inicio = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolAgotado:
+            metricas.incrementar("pool_agotado")
+            raise
+        finally:
+            metricas.observar("pool_espera", time.perf_counter() - inicio)
 
-DATABASE_URL = "sqlite:///./inventario.db"  # Simple para desarrollo local
 
+# SQLite en memoria necesita su pool por defecto (una sola conexión por hilo)
+_en_memoria = DATABASE_URL in ("sqlite://", "sqlite:///:memory:")
 engine = create_engine(
     DATABASE_URL,
-    connect_args={"check_same_thread": False}  # necesario para SQLite en modo single-thread
+    connect_args={
+        "check_same_thread": False,  # necesario para SQLite en modo single-thread
+        "timeout": SQLITE_BUSY_TIMEOUT,
+    } if DATABASE_URL.startswith("sqlite") else {},
+    **({} if _en_memoria else {
+        "poolclass": PoolMedido,
+        "pool_size": POOL_TAMANO,
+        "max_overflow": POOL_DESBORDE,
+        "pool_timeout": POOL_ESPERA,
+    })
 )
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
+
+# =========================
+# 📌 Métricas del pool
+# =========================
+@event.listens_for(engine, "checkout")
+def _al_tomar_conexion(dbapi_connection, connection_record, connection_proxy):
+    metricas.incrementar("pool_checkouts")
+
+
+if isinstance(engine.pool, QueuePool):
+    # engine.pool se lee en cada consulta: sigue valiendo si el pool se recrea
+    metricas.registrar_medidor("pool_tamano", lambda: engine.pool.size())
+    metricas.registrar_medidor("pool_en_uso", lambda: engine.pool.checkedout())
+    metricas.registrar_medidor("pool_libres", lambda: engine.pool.checkedin())
+    metricas.registrar_medidor("pool_desborde", lambda: max(engine.pool.overflow(), 0))
+
+
+# =========================
+# 📌 Transacciones SQLite
+# =========================
+if engine.dialect.name == "sqlite":
+    @event.listens_for(engine, "connect")
+    def _al_conectar(dbapi_connection, connection_record):
+        # SQLAlchemy emite el BEGIN (ver _al_iniciar) en lugar del driver sqlite3
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.close()
+
+    @event.listens_for(engine, "begin")
+    def _al_iniciar(conn):
+        if not conn.get_execution_options().get("escritura"):
+            conn.exec_driver_sql("BEGIN")
+            return
+        # BEGIN IMMEDIATE toma el bloqueo de escritura al inicio: la espera ocurre
+        # aquí (busy_timeout) y no al pasar de lectura a escritura, donde SQLite
+        # devuelve SQLITE_BUSY sin esperar.
+        inicio = time.perf_counter()
+        try:
+            conn.exec_driver_sql("BEGIN IMMEDIATE")
+        finally:
+            metricas.observar("sqlite_espera_bloqueo", time.perf_counter() - inicio)
+
+
+def _es_bloqueo(error: OperationalError) -> bool:
+    codigo = getattr(error.orig, "sqlite_errorcode", None)
+    if codigo is not None:
+        return codigo & 0xFF in (5, 6)  # SQLITE_BUSY, SQLITE_LOCKED
+    return "database is locked" in str(error.orig) or "database is busy" in str(error.orig)
+
+
+def escritura(funcion):
+    """
+    Ejecuta una función de escritura en una transacción BEGIN IMMEDIATE.
+
+    Si SQLite responde "database is locked" se hace rollback y se reintenta la
+    función completa con backoff exponencial con jitter hasta ESCRITURA_PLAZO.
+    La función recibe la sesión como argumento `db` (o como primer argumento).
+    """
+    @functools.wraps(funcion)
+    def envoltura(*args, **kwargs):
+        db = kwargs["db"] if "db" in kwargs else args[0]
+        limite = time.monotonic() + ESCRITURA_PLAZO
+        intento = 0
+        while True:
+            try:
+                if not db.in_transaction():
+                    db.connection(execution_options={"escritura": True})
+                return funcion(*args, **kwargs)
+            except OperationalError as e:
+                if not _es_bloqueo(e):
+                    raise
+                db.rollback()
+                intento += 1
+                espera = random.uniform(0, min(ESCRITURA_BACKOFF_MAX, ESCRITURA_BACKOFF_BASE * 2 ** intento))
+                if time.monotonic() + espera > limite:
+                    metricas.incrementar("sqlite_escrituras_fallidas")
+                    raise
+                metricas.incrementar("sqlite_reintentos")
+                time.sleep(espera)
+                metricas.observar("sqlite_espera_bloqueo", espera)
+
+    return envoltura
+
+
+# =========================
+# 📌 Esquema
+# =========================
+def agregar_columnas_faltantes(conn, tabla):
+    """Agrega a una tabla existente las columnas e índices del modelo que aún no tiene."""
+    existentes = {c["name"] for c in inspect(conn).get_columns(tabla.name)}
+    for columna in tabla.columns:
+        if columna.name not in existentes:
+            tipo = columna.type.compile(dialect=conn.dialect)
+            conn.exec_driver_sql(f'ALTER TABLE "{tabla.name}" ADD COLUMN "{columna.name}" {tipo}')
+    for indice in tabla.indexes:
+        indice.create(conn, checkfirst=True)
+
+
+def agregar_autoincremento(conn, tabla):
+    """
+    Reconstruye una tabla SQLite existente cuyo modelo pide AUTOINCREMENT
+    (`sqlite_autoincrement`) y que se creó sin él: SQLite no lo agrega con ALTER TABLE.
+    """
+    if conn.dialect.name != "sqlite" or not tabla.dialect_options["sqlite"]["autoincrement"]:
+        return
+    sql = conn.exec_driver_sql(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (tabla.name,)
+    ).scalar()
+    if sql is None or "AUTOINCREMENT" in sql.upper():
+        return
+    nombre = conn.dialect.identifier_preparer.format_table(tabla)
+    nueva = f'"{tabla.name}_reconstruida"'
+    ddl = str(CreateTable(tabla).compile(dialect=conn.dialect)).replace(f"TABLE {nombre} ", f"TABLE {nueva} ", 1)
+    columnas = ", ".join(f'"{c.name}"' for c in tabla.columns)
+    conn.exec_driver_sql(ddl)
+    # Copia los ids tal cual: sqlite_sequence queda en el mayor
+    conn.exec_driver_sql(f"INSERT INTO {nueva} ({columnas}) SELECT {columnas} FROM {nombre}")
+    conn.exec_driver_sql(f"DROP TABLE {nombre}")
+    conn.exec_driver_sql(f"ALTER TABLE {nueva} RENAME TO {nombre}")
+    for indice in tabla.indexes:
+        indice.create(conn, checkfirst=True)
+
+
+def sincronizar_esquema():
+    """Crea las tablas nuevas y completa las existentes (no hay migraciones en el proyecto)."""
+    Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        for tabla in Base.metadata.sorted_tables:
+            agregar_columnas_faltantes(conn, tabla)
+            agregar_autoincremento(conn, tabla)
+
+
 # Dependencia para inyectar sesión en endpoints
 def get_db():
+    """
+    Una sesión por solicitud (FastAPI reutiliza la dependencia dentro de la misma solicitud).
+
+    La sesión toma la conexión del pool recién en su primera consulta y la
+    devuelve al cerrarse: un endpoint que responde sin consultar la base no
+    ocupa conexión.
+    """
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
@@ -0,0 +1,209 @@
+"""
+Tabla de stock en memoria para consultas de disponibilidad.
+
+Stock, stock mínimo y precio de venta de todos los productos en arreglos
+planos (`array`) indexados por id de producto: unos 25 bytes por producto,
+sin objetos por fila. Se carga al iniciar con una sola consulta y responde
+`POST /productos/disponibilidad` sin tocar la base.
+
+Se mantiene al día con las escrituras de este proceso: un listener de la
+sesión anota en cada flush los productos insertados, modificados o eliminados
+(movimientos, documentos, conteos, PUT/PATCH...) y los aplica al confirmarse
+la transacción; un rollback los descarta. Las escrituras masivas con UPDATE /
+INSERT de Core, que no pasan por el flush, anotan sus filas con `anotar()`.
+
+Con varios workers, cada uno ve de inmediato solo sus propias escrituras: un
+hilo recarga la tabla completa cada `DISPONIBILIDAD_RECARGA` segundos
+(0 = nunca).
+
+Cada transacción que anota productos toma un número del contador "stock"
+(`catalogo_version`). Como las escrituras se serializan (BEGIN IMMEDIATE), la
+recarga lee el contador junto con las filas: los cambios locales confirmados
+mientras leía se vuelven a aplicar solo si su número es mayor, es decir, si la
+lectura no los incluía. Así no pisan filas más nuevas escritas por otro worker.
+"""
+import logging
+import os
+import threading
+import time
+from array import array
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from . import models, metricas, catalogo
+from .database import SessionLocal
+
+logger = logging.getLogger(__name__)
+
+RECARGA = float(os.getenv("DISPONIBILIDAD_RECARGA", "60"))   # segundos entre recargas completas
+
+PENDIENTES = "disponibilidad_pendientes"
+VERSION = "disponibilidad_version"
+CONTADOR = "stock"
+
+
+def _columnas():
+    p = models.Producto
+    return p.id, p.stock_actual, p.stock_minimo, p.precio_venta
+
+
+class TablaStock:
+    """Stock, mínimo y precio por id de producto (posición del arreglo = id)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._arreglos(0)
+        self._durante_carga = None
+        self.cargada = None   # time.monotonic() de la última carga completa
+
+    def _arreglos(self, largo: int):
+        self.presente = bytearray(largo)
+        self.stock = array("q", bytes(8 * largo))
+        self.minimo = array("q", bytes(8 * largo))
+        self.precio = array("d", bytes(8 * largo))
+
+    def _crecer(self, producto_id: int):
+        extra = max(producto_id + 1, len(self.presente) * 3 // 2) - len(self.presente)
+        self.presente.extend(bytes(extra))
+        for arreglo in (self.stock, self.minimo, self.precio):
+            arreglo.frombytes(bytes(8 * extra))
+
+    def _poner(self, producto_id: int, valores):
+        if valores is None:
+            if producto_id < len(self.presente):
+                self.presente[producto_id] = 0
+            return
+        if producto_id >= len(self.presente):
+            self._crecer(producto_id)
+        self.presente[producto_id] = 1
+        self.stock[producto_id], self.minimo[producto_id], self.precio[producto_id] = valores
+
+    def aplicar(self, cambios: dict, version: int = None):
+        """
+        Aplica {producto_id: (stock, mínimo, precio) o None si se eliminó},
+        confirmados con el número `version` del contador de stock.
+        """
+        with self._lock:
+            for producto_id, valores in cambios.items():
+                self._poner(producto_id, valores)
+            if self._durante_carga is not None:
+                for producto_id, valores in cambios.items():
+                    self._durante_carga[producto_id] = (valores, version)
+
+    def cargar(self, db: Session):
+        """Reemplaza la tabla con el contenido de `productos` (una consulta)."""
+        inicio = time.perf_counter()
+        with self._lock:
+            self._durante_carga = {}
+        try:
+            # Misma transacción: las filas leídas incluyen todo cambio con número <= leida
+            leida = catalogo.version_actual(db, CONTADOR)
+            filas = db.execute(select(*_columnas())).all()
+            nueva = TablaStock()
+            nueva._arreglos(max((f[0] for f in filas), default=0) + 1)
+            for producto_id, stock, minimo, precio in filas:
+                nueva.presente[producto_id] = 1
+                nueva.stock[producto_id], nueva.minimo[producto_id], nueva.precio[producto_id] = stock, minimo, precio
+        except Exception:
+            with self._lock:
+                self._durante_carga = None
+            raise
+        with self._lock:
+            self.presente, self.stock, self.minimo, self.precio = nueva.presente, nueva.stock, nueva.minimo, nueva.precio
+            # Lo confirmado mientras se leía, solo si la lectura no lo incluía
+            for producto_id, (valores, version) in self._durante_carga.items():
+                if version is None or version > leida:
+                    self._poner(producto_id, valores)
+            self._durante_carga = None
+            self.cargada = time.monotonic()
+        metricas.observar("disponibilidad_carga", time.perf_counter() - inicio)
+        return len(filas)
+
+    def consultar(self, ids) -> dict:
+        """{producto_id: (stock, mínimo, precio)} de los ids presentes."""
+        encontrados = {}
+        with self._lock:
+            largo = len(self.presente)
+            for producto_id in ids:
+                if 0 <= producto_id < largo and self.presente[producto_id]:
+                    encontrados[producto_id] = (self.stock[producto_id], self.minimo[producto_id], self.precio[producto_id])
+        return encontrados
+
+    def __len__(self):
+        return self.presente.count(1)
+
+
+tabla = TablaStock()
+
+
+# =========================
+# 📌 Cambios de las escrituras
+# =========================
+def _versionar(db: Session):
+    """Número del contador de stock para la transacción en curso (uno por transacción)."""
+    if VERSION not in db.info:
+        db.info[VERSION] = catalogo.siguiente_version(db, CONTADOR)
+
+
+def anotar(db: Session, consulta):
+    """Anota para después del commit las filas de productos que devuelve `consulta` (escrituras de Core)."""
+    _versionar(db)
+    pendientes = db.info.setdefault(PENDIENTES, {})
+    for producto_id, stock, minimo, precio in db.execute(consulta.with_only_columns(*_columnas())):
+        pendientes[producto_id] = (stock, minimo, precio)
+
+
+@event.listens_for(Session, "after_flush")
+def _registrar(session, flush_context):
+    productos = [obj for obj in list(session.new) + list(session.dirty) if isinstance(obj, models.Producto)]
+    eliminados = [obj for obj in session.deleted if isinstance(obj, models.Producto)]
+    if not productos and not eliminados:
+        return
+    _versionar(session)
+    pendientes = session.info.setdefault(PENDIENTES, {})
+    for obj in productos:
+        pendientes[obj.id] = (obj.stock_actual, obj.stock_minimo, obj.precio_venta)
+    for obj in eliminados:
+        pendientes[obj.id] = None
+
+
+@event.listens_for(Session, "after_commit")
+def _al_confirmar(session):
+    pendientes = session.info.pop(PENDIENTES, None)
+    version = session.info.pop(VERSION, None)
+    if pendientes:
+        tabla.aplicar(pendientes, version)
+
+
+@event.listens_for(Session, "after_rollback")
+def _al_revertir(session):
+    session.info.pop(PENDIENTES, None)
+    session.info.pop(VERSION, None)
+
+
+# =========================
+# 📌 Carga y recarga periódica
+# =========================
+def cargar():
+    with SessionLocal() as db:
+        return tabla.cargar(db)
+
+
+def _bucle(detener: threading.Event):
+    while not detener.wait(RECARGA):
+        try:
+            cargar()
+        except Exception:
+            metricas.incrementar("disponibilidad_recargas_fallidas")
+            logger.exception("No se pudo recargar la tabla de disponibilidad")
+
+
+def iniciar():
+    """Arranca la recarga periódica. Devuelve el evento para detenerla (o None si está desactivada)."""
+    metricas.registrar_medidor("disponibilidad_productos", lambda: len(tabla))
+    if RECARGA <= 0:
+        return None
+    detener = threading.Event()
+    threading.Thread(target=_bucle, args=(detener,), name="disponibilidad", daemon=True).start()
+    return detener
@@ -0,0 +1,123 @@
+"""
+Exportación a Parquet de documentos, detalles y movimientos.
+
+Escribe un archivo por tabla y por mes, con particiones al estilo Hive:
+
+    destino/documentos/mes=2025-09/documentos.parquet
+    destino/detalle_documentos/mes=2025-09/detalle_documentos.parquet
+    destino/movimientos/mes=2025-09/movimientos.parquet
+
+Cada consulta se recorre en bloques de `FILAS_POR_GRUPO` filas (`yield_per`) y
+cada bloque se escribe como un row group, así que la memoria no depende del
+tamaño del rango. Los movimientos incluyen las tablas de archivo. Los
+detalles se asignan al mes de su documento.
+
+Uso por consola (fecha_fin exclusiva):
+    python -m app.exportacion 2025-01-01 2026-01-01 ./export
+"""
+import argparse
+import os
+from datetime import datetime
+from typing import List
+
+from sqlalchemy import select
+
+from . import models, archivo, formatos
+from .archivo import _inicio_mes, _mes_siguiente
+
+FILAS_POR_GRUPO = 100_000
+
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("La exportación a Parquet requiere pyarrow")
+    return pa, pq
+
+
+def meses(fecha_inicio: datetime, fecha_fin: datetime):
+    """Intervalos [inicio, fin) de cada mes que cruza [fecha_inicio, fecha_fin)."""
+    mes = _inicio_mes(fecha_inicio)
+    while mes < fecha_fin:
+        siguiente = _mes_siguiente(mes)
+        yield mes, max(mes, fecha_inicio), min(siguiente, fecha_fin)
+        mes = siguiente
+
+
+def _consultas(db, desde: datetime, hasta: datetime):
+    d, det = models.Documento, models.DetalleDocumento
+    en_rango = (d.fecha >= desde) & (d.fecha < hasta)
+    yield "documentos", select(d.__table__).where(en_rango).order_by(d.id)
+    yield "detalle_documentos", (
+        select(det.__table__).join(d, d.id == det.documento_id).where(en_rango).order_by(det.id)
+    )
+    fuente = archivo.fuente_movimientos(db, desde, hasta)
+    yield "movimientos", (
+        select(fuente).where(fuente.c.fecha >= desde, fuente.c.fecha < hasta).order_by(fuente.c.id)
+    )
+
+
+def _escribir(db, consulta, ruta: str) -> int:
+    """Escribe la consulta en `ruta` por row groups. Devuelve las filas (sin archivo si son 0)."""
+    pa, pq = _pyarrow()
+    esquema = pa.schema([
+        (c.name, formatos.tipo_arrow(pa, c.type) or pa.string()) for c in consulta.selected_columns
+    ])
+    escritor = None
+    filas = 0
+    try:
+        # Core directo sobre la conexión: sin la capa de resultados del ORM
+        resultado = db.connection().execute(consulta.execution_options(yield_per=FILAS_POR_GRUPO))
+        for bloque in resultado.partitions():
+            columnas = list(zip(*bloque))
+            lote = pa.RecordBatch.from_arrays(
+                [pa.array(list(v), type=campo.type) for v, campo in zip(columnas, esquema)],
+                schema=esquema,
+            )
+            if escritor is None:
+                os.makedirs(os.path.dirname(ruta), exist_ok=True)
+                escritor = pq.ParquetWriter(ruta, esquema, compression="zstd")
+            escritor.write_batch(lote, row_group_size=FILAS_POR_GRUPO)
+            filas += len(bloque)
+    finally:
+        if escritor is not None:
+            escritor.close()
+    return filas
+
+
+def exportar(db, destino: str, fecha_inicio: datetime, fecha_fin: datetime, avance=None) -> List[dict]:
+    """Exporta el rango [fecha_inicio, fecha_fin) a `destino`. Devuelve un resumen por archivo."""
+    _pyarrow()
+    periodos = list(meses(fecha_inicio, fecha_fin))
+    resumen = []
+    for n, (mes, desde, hasta) in enumerate(periodos, start=1):
+        for tabla, consulta in _consultas(db, desde, hasta):
+            ruta = os.path.join(destino, tabla, f"mes={mes:%Y-%m}", f"{tabla}.parquet")
+            filas = _escribir(db, consulta, ruta)
+            if filas:
+                resumen.append({"tabla": tabla, "mes": f"{mes:%Y-%m}", "filas": filas, "archivo": ruta})
+        if avance:
+            avance(n / len(periodos))
+    return resumen
+
+
+if __name__ == "__main__":
+    from .database import SessionLocal, sincronizar_esquema
+    from .archivo import sincronizar_archivos
+
+    parser = argparse.ArgumentParser(description="Exporta documentos, detalles y movimientos a Parquet")
+    parser.add_argument("fecha_inicio", type=datetime.fromisoformat, help="AAAA-MM-DD (inclusive)")
+    parser.add_argument("fecha_fin", type=datetime.fromisoformat, help="AAAA-MM-DD (exclusiva)")
+    parser.add_argument("destino", help="Directorio de salida")
+    args = parser.parse_args()
+
+    sincronizar_esquema()
+    sincronizar_archivos()
+    db = SessionLocal()
+    try:
+        for r in exportar(db, args.destino, args.fecha_inicio, args.fecha_fin):
+            print(f"{r['archivo']}: {r['filas']} filas")
+    finally:
+        db.close()
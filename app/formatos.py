@@ -0,0 +1,102 @@
+"""
+Formatos binarios para los listados (negociados por el header Accept).
+
+  - application/msgpack                    -> lista de mapas, igual que el JSON
+  - application/vnd.apache.arrow.stream    -> record batches de Arrow (columnar)
+
+Las respuestas se construyen directamente desde las filas de la consulta, sin
+pasar por los esquemas de Pydantic. `msgpack` y `pyarrow` son opcionales: se
+importan solo al usarse y, si faltan, se responde 406.
+"""
+from datetime import date, datetime
+
+from fastapi import HTTPException, Request, Response
+
+MSGPACK = "application/msgpack"
+ARROW = "application/vnd.apache.arrow.stream"
+ALIAS = {
+    MSGPACK: MSGPACK,
+    "application/x-msgpack": MSGPACK,
+    ARROW: ARROW,
+}
+FILAS_POR_LOTE = 10_000
+
+
+def negociar(request: Request):
+    """Formato binario pedido en Accept (MSGPACK o ARROW), o None para JSON."""
+    aceptados = []
+    for orden, parte in enumerate(request.headers.get("accept", "").split(",")):
+        tipo, *parametros = [p.strip() for p in parte.split(";")]
+        calidad = 1.0
+        for parametro in parametros:
+            if parametro.startswith("q="):
+                try:
+                    calidad = float(parametro[2:])
+                except ValueError:
+                    calidad = 0.0
+        if tipo and calidad > 0:
+            aceptados.append((-calidad, orden, tipo.lower()))
+    for _, _, tipo in sorted(aceptados):
+        if tipo in ALIAS:
+            return ALIAS[tipo]
+        if tipo in ("application/json", "application/*", "*/*"):
+            return None
+    return None
+
+
+def _serializable(valor):
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    raise TypeError(f"Tipo no serializable: {type(valor).__name__}")
+
+
+def _msgpack(columnas, filas) -> bytes:
+    try:
+        import msgpack
+    except ImportError:
+        raise HTTPException(status_code=406, detail="MessagePack no disponible en el servidor (instale msgpack)")
+    return msgpack.packb([dict(zip(columnas, fila)) for fila in filas], default=_serializable)
+
+
+def tipo_arrow(pa, tipo_sql):
+    try:
+        tipo = tipo_sql.python_type
+    except NotImplementedError:
+        return None  # se infiere de los valores
+    return {
+        int: pa.int64(),
+        float: pa.float64(),
+        str: pa.string(),
+        bool: pa.bool_(),
+        datetime: pa.timestamp("us"),
+        date: pa.date32(),
+    }.get(tipo)
+
+
+def _arrow(columnas, tipos, filas) -> bytes:
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise HTTPException(status_code=406, detail="Arrow no disponible en el servidor (instale pyarrow)")
+    # El esquema sale de los tipos de las columnas: no cambia aunque una página venga vacía o con nulos
+    valores = list(zip(*filas)) if filas else [[] for _ in columnas]
+    tabla = pa.table({
+        nombre: pa.array(list(v), type=tipo_arrow(pa, tipo))
+        for nombre, tipo, v in zip(columnas, tipos, valores)
+    })
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, tabla.schema) as escritor:
+        escritor.write_table(tabla, max_chunksize=FILAS_POR_LOTE)
+    return sink.getvalue().to_pybytes()
+
+
+def responder(formato: str, db, consulta) -> Response:
+    """Ejecuta `consulta` (un select de Core) y serializa sus filas en el formato pedido."""
+    resultado = db.execute(consulta)
+    columnas = list(resultado.keys())
+    filas = [tuple(fila) for fila in resultado]
+    if formato == MSGPACK:
+        contenido = _msgpack(columnas, filas)
+    else:
+        contenido = _arrow(columnas, [c.type for c in consulta.selected_columns], filas)
+    return Response(content=contenido, media_type=formato)
@@ -0,0 +1,233 @@
+"""
+Claves de idempotencia para los POST que escriben inventario.
+
+Si el cliente envía el header `Idempotency-Key`, la primera respuesta se guarda
+durante `IDEMPOTENCIA_TTL` segundos. Un reintento con la misma clave recibe esa
+misma respuesta sin ejecutar el endpoint. Si llega mientras la primera solicitud
+sigue en curso, espera a que termine en lugar de competir con ella.
+
+Las claves viven en la tabla `idempotencia` de la base, así un reintento que
+llega a otro worker también encuentra la respuesta. Al empezar, la solicitud
+lee la clave: una respuesta ya guardada se reproduce sin abrir una transacción
+de escritura. Solo si no existe (o venció) la reclama con un INSERT ... ON
+CONFLICT: solo una solicitud la obtiene, y las demás esperan consultando la
+fila. Se guardan hashes de 16 bytes, el código de estado, los headers y el
+cuerpo ya serializado. Una reserva en curso de un worker caído vence a los
+`IDEMPOTENCIA_RESERVA` segundos.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import time
+from typing import Optional
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+
+from . import models
+from .database import SessionLocal, escritura
+
+RUTAS = {
+    ("POST", "/documentos/"),
+    ("POST", "/movimientos/"),
+}
+HEADER = b"idempotency-key"
+TTL = int(os.getenv("IDEMPOTENCIA_TTL", "86400"))              # segundos
+RESERVA = float(os.getenv("IDEMPOTENCIA_RESERVA", "300"))      # segundos que dura una reserva en curso
+ESPERA_MAXIMA = float(os.getenv("IDEMPOTENCIA_ESPERA", "30"))  # segundos
+SONDEO = 0.05       # segundos entre consultas mientras se espera la primera solicitud
+PURGA = 60.0        # segundos entre limpiezas de claves vencidas
+
+
+def _hash(*partes: bytes) -> bytes:
+    h = hashlib.sha256()
+    for parte in partes:
+        h.update(parte)
+        h.update(b"\0")
+    return h.digest()[:16]
+
+
+# =========================
+# 📌 Almacén en la base
+# =========================
+_tabla = models.ClaveIdempotencia.__table__
+_ultima_purga = 0.0
+
+
+@escritura
+def _reclamar(db: Session, clave: bytes, huella: bytes):
+    ahora = time.time()
+    # Una fila vencida (respuesta vieja o reserva abandonada) se reemplaza
+    tomada = db.execute(
+        sqlite_insert(_tabla)
+        .values(clave=clave, huella=huella, estado=None, tipo=None, headers=None, cuerpo=None, expira=ahora + RESERVA)
+        .on_conflict_do_update(
+            index_elements=["clave"],
+            set_={"huella": huella, "estado": None, "tipo": None, "headers": None, "cuerpo": None,
+                  "expira": ahora + RESERVA},
+            where=_tabla.c.expira <= ahora,
+        )
+        .returning(_tabla.c.clave)
+    ).first()
+    fila = None if tomada else db.execute(select(_tabla).where(_tabla.c.clave == clave)).first()
+
+    global _ultima_purga
+    if ahora - _ultima_purga > PURGA:
+        _ultima_purga = ahora
+        db.execute(delete(_tabla).where(_tabla.c.expira <= ahora))
+    db.commit()
+    return fila
+
+
+def reclamar(clave: bytes, huella: bytes):
+    """Reserva la clave para esta solicitud. Devuelve None si se obtuvo, o la fila vigente de otra."""
+    with SessionLocal() as db:
+        return _reclamar(db, clave, huella)
+
+
+def obtener(clave: bytes):
+    """Fila vigente de la clave, o None si no existe o venció."""
+    with SessionLocal() as db:
+        return db.execute(
+            select(_tabla).where(_tabla.c.clave == clave, _tabla.c.expira > time.time())
+        ).first()
+
+
+@escritura
+def _completar(db: Session, clave: bytes, estado: int, headers: list, cuerpo: bytes):
+    db.execute(
+        update(_tabla).where(_tabla.c.clave == clave)
+        .values(estado=estado, tipo=dict(headers).get(b"content-type"), headers=_serializar(headers),
+                cuerpo=cuerpo, expira=time.time() + TTL)
+    )
+    db.commit()
+
+
+def completar(clave: bytes, estado: int, headers: list, cuerpo: bytes):
+    with SessionLocal() as db:
+        _completar(db, clave, estado, headers, cuerpo)
+
+
+@escritura
+def _liberar(db: Session, clave: bytes):
+    db.execute(delete(_tabla).where(_tabla.c.clave == clave, _tabla.c.estado.is_(None)))
+    db.commit()
+
+
+def liberar(clave: bytes):
+    """Descarta una reserva fallida para que el reintento vuelva a ejecutarse."""
+    with SessionLocal() as db:
+        _liberar(db, clave)
+
+
+# =========================
+# 📌 Headers guardados
+# =========================
+def _serializar(headers: list) -> bytes:
+    """Headers de la respuesta sin content-length (se recalcula al reproducir)."""
+    return json.dumps([
+        [nombre.decode("latin-1"), valor.decode("latin-1")]
+        for nombre, valor in headers if nombre.lower() != b"content-length"
+    ]).encode()
+
+
+def _headers_guardados(fila) -> list:
+    if fila.headers is None:  # respuesta guardada antes de la columna headers
+        return [(b"content-type", fila.tipo)]
+    return [(nombre.encode("latin-1"), valor.encode("latin-1")) for nombre, valor in json.loads(fila.headers)]
+
+
+# =========================
+# 📌 Middleware
+# =========================
+async def _responder(send, estado: int, headers: list, cuerpo: bytes, reproducida: bool = False):
+    headers = headers + [(b"content-length", str(len(cuerpo)).encode())]
+    if reproducida:
+        headers.append((b"idempotent-replay", b"true"))
+    await send({"type": "http.response.start", "status": estado, "headers": headers})
+    await send({"type": "http.response.body", "body": cuerpo})
+
+
+async def _error(send, estado: int, detalle: str):
+    await _responder(send, estado, [(b"content-type", b"application/json")], json.dumps({"detail": detalle}).encode())
+
+
+class IdempotenciaMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or (scope["method"], scope["path"]) not in RUTAS:
+            return await self.app(scope, receive, send)
+
+        valor = dict(scope["headers"]).get(HEADER)
+        if not valor:
+            return await self.app(scope, receive, send)
+        if len(valor) > 255:
+            return await _error(send, 400, "Idempotency-Key demasiado larga")
+
+        # Se lee el cuerpo completo para calcular la huella de la solicitud
+        partes = []
+        while True:
+            mensaje = await receive()
+            partes.append(mensaje.get("body", b""))
+            if not mensaje.get("more_body"):
+                break
+        cuerpo_solicitud = b"".join(partes)
+
+        clave = _hash(scope["method"].encode(), scope["path"].encode(), valor)
+        huella = _hash(cuerpo_solicitud)
+
+        inicio = time.monotonic()
+        # Primero una lectura: reproducir una respuesta guardada no toma el bloqueo de escritura
+        fila = await run_in_threadpool(obtener, clave)
+        if fila is None:
+            fila = await run_in_threadpool(reclamar, clave, huella)
+        while fila is not None:
+            if fila.huella != huella:
+                return await _error(send, 422, "Idempotency-Key ya usada con otro cuerpo")
+            if fila.estado is not None:
+                return await _responder(send, fila.estado, _headers_guardados(fila), fila.cuerpo, reproducida=True)
+            # Duplicado concurrente (en este u otro worker): esperar a la primera solicitud
+            if time.monotonic() - inicio >= ESPERA_MAXIMA:
+                return await _error(send, 409, "Solicitud con la misma Idempotency-Key aún en curso")
+            await asyncio.sleep(SONDEO)
+            fila = await run_in_threadpool(obtener, clave)
+            if fila is None:
+                # La primera falló (o su reserva venció): se vuelve a reclamar
+                fila = await run_in_threadpool(reclamar, clave, huella)
+
+        entregado = False
+
+        async def receive_repetido():
+            nonlocal entregado
+            if entregado:
+                return await receive()
+            entregado = True
+            return {"type": "http.request", "body": cuerpo_solicitud, "more_body": False}
+
+        respuesta = {"estado": 500, "headers": [], "cuerpo": []}
+
+        async def send_capturado(mensaje):
+            if mensaje["type"] == "http.response.start":
+                respuesta["estado"] = mensaje["status"]
+                respuesta["headers"] = [(bytes(n), bytes(v)) for n, v in mensaje.get("headers", [])]
+            elif mensaje["type"] == "http.response.body":
+                respuesta["cuerpo"].append(mensaje.get("body", b""))
+            await send(mensaje)
+
+        try:
+            await self.app(scope, receive_repetido, send_capturado)
+        except BaseException:
+            await run_in_threadpool(liberar, clave)
+            raise
+
+        # Los errores del servidor no se guardan: el reintento debe ejecutarse de nuevo
+        if respuesta["estado"] >= 500:
+            await run_in_threadpool(liberar, clave)
+        else:
+            await run_in_threadpool(completar, clave, respuesta["estado"], respuesta["headers"],
+                                    b"".join(respuesta["cuerpo"]))
@@ -1,12 +1,52 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from .routers import categorias, productos, proveedores, clientes, documentos, movimientos
-from . import models, database
+from .routers import categorias, productos, proveedores, clientes, documentos, movimientos, metricas, cambios, valorizacion, trabajos, dashboard, series, perfiles, sync
+from . import models, database, archivo, replica, contadores, crud, perfil, catalogo, disponibilidad
+from .trabajos import detener as detener_trabajos
+from .idempotencia import IdempotenciaMiddleware
+from .admision import AdmisionMiddleware
+
+# Crear tablas (y columnas nuevas en tablas existentes)
+database.sincronizar_esquema()
+archivo.sincronizar_archivos()
+with database.SessionLocal() as db:
+    crud.completar_totales(db)  # documentos creados antes de guardar los totales
+    catalogo.inicializar(db)    # productos y categorías anteriores al versionado del catálogo
+contadores.inicializar()
+disponibilidad.cargar()  # stock en memoria para POST /productos/disponibilidad
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Copias periódicas de la réplica de lectura (solo si REPLICA_LECTURA está definida)
+    detener = replica.iniciar()
+    # Recarga periódica de la tabla de disponibilidad (escrituras de otros workers)
+    detener_disponibilidad = disponibilidad.iniciar()
+    yield
+    if detener:
+        detener.set()
+    if detener_disponibilidad:
+        detener_disponibilidad.set()
+    detener_trabajos()
+
+
+app = FastAPI(lifespan=lifespan)
+
+# Perfilado a pedido (header X-Perfil con PERFIL_TOKEN). Sin token no se instala nada.
+# Es el más interno: mide el endpoint, no la espera en la cola de admisión.
+if perfil.ACTIVO:
+    perfil.instalar_sql(database.engine)
+    app.add_middleware(perfil.PerfilMiddleware)
 
-# Crear tablas
-models.Base.metadata.create_all(bind=database.engine)
+# Cupos por clase de ruta (escritura / reporte / lectura) con colas acotadas y 503 al llenarse.
+# Queda dentro de Idempotencia: las respuestas reproducidas no ocupan cupo.
+app.add_middleware(AdmisionMiddleware)
 
-app = FastAPI()
+# Reintentos seguros de POST /documentos y POST /movimientos (header Idempotency-Key).
+# Se registra antes que CORS para que las respuestas reproducidas también lleven sus headers.
+app.add_middleware(IdempotenciaMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -23,3 +63,12 @@ app.include_router(proveedores.router)
 app.include_router(clientes.router)
 app.include_router(documentos.router)
 app.include_router(movimientos.router)
+app.include_router(metricas.router)
+app.include_router(cambios.router)
+app.include_router(valorizacion.router)
+app.include_router(trabajos.router)
+app.include_router(dashboard.router)
+app.include_router(series.router)
+app.include_router(sync.router)
+if perfil.ACTIVO:
+    app.include_router(perfiles.router)
@@ -0,0 +1,49 @@
+"""
+Métricas simples del proceso: contadores, tiempos acumulados y medidores.
+
+Se exponen en `GET /metricas`. Cada worker de Uvicorn tiene sus propios valores.
+"""
+import threading
+from collections import defaultdict
+from typing import Callable, Dict
+
+_lock = threading.Lock()
+_contadores: Dict[str, float] = defaultdict(float)
+_tiempos: Dict[str, list] = {}                 # nombre -> [conteo, suma, máximo]
+_medidores: Dict[str, Callable[[], float]] = {}
+
+
+def incrementar(nombre: str, valor: float = 1):
+    with _lock:
+        _contadores[nombre] += valor
+
+
+def observar(nombre: str, segundos: float):
+    """Registra una duración (en segundos)."""
+    with _lock:
+        t = _tiempos.setdefault(nombre, [0, 0.0, 0.0])
+        t[0] += 1
+        t[1] += segundos
+        t[2] = max(t[2], segundos)
+
+
+def registrar_medidor(nombre: str, funcion: Callable[[], float]):
+    """Medidor cuyo valor se calcula al momento de leer las métricas."""
+    _medidores[nombre] = funcion
+
+
+def resumen() -> dict:
+    with _lock:
+        contadores = dict(_contadores)
+        tiempos = {
+            nombre: {"conteo": c, "total_s": round(s, 6), "promedio_s": round(s / c, 6) if c else 0.0, "max_s": round(m, 6)}
+            for nombre, (c, s, m) in _tiempos.items()
+        }
+    medidores = {nombre: funcion() for nombre, funcion in _medidores.items()}
+    return {"contadores": contadores, "tiempos": tiempos, "medidores": medidores}
+
+
+def reiniciar():
+    with _lock:
+        _contadores.clear()
+        _tiempos.clear()
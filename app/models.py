@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Float
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Float, Boolean, Index, LargeBinary
 from datetime import datetime
 from sqlalchemy.orm import relationship
 from .database import Base
@@ -12,6 +12,7 @@ class Categoria(Base):
     id = Column(Integer, primary_key=True, index=True)
     nombre = Column(String, unique=True, index=True, nullable=False)
     descripcion = Column(String, nullable=True)
+    version = Column(Integer, index=True, nullable=True)  # versión del catálogo del último cambio (catalogo.py)
 
     # Relación con productos
     productos = relationship("Producto", back_populates="categoria")
@@ -31,6 +32,7 @@ class Producto(Base):
     stock_actual = Column(Integer, nullable=False, default=0)
     stock_minimo = Column(Integer, nullable=False, default=0)
     unidad_medida = Column(String, nullable=False, default="unidad")
+    version = Column(Integer, index=True, nullable=True)  # versión del catálogo del último cambio (no cambia con el stock)
 
     # Relaciones
     categoria_id = Column(Integer, ForeignKey("categorias.id"), nullable=False)
@@ -80,10 +82,25 @@ class Documento(Base):
     tipo = Column(String, nullable=False)           # Boleta, Factura, etc.
     operacion = Column(String, nullable=False)      # "COMPRA" o "VENTA"
     numero = Column(String, unique=True, index=True, nullable=False)
-    fecha = Column(DateTime, default=datetime.utcnow)
+    fecha = Column(DateTime, default=datetime.utcnow, index=True)
     cliente_id = Column(Integer, ForeignKey("clientes.id"), nullable=True)
     proveedor_id = Column(Integer, ForeignKey("proveedores.id"), nullable=True)
 
+    # Totales de cabecera, calculados desde los detalles al crear/actualizar (crud.aplicar_totales)
+    subtotal = Column(Float, nullable=True)
+    impuesto = Column(Float, nullable=True)
+    total = Column(Float, nullable=True)
+    lineas = Column(Integer, nullable=True)
+
+    # Búsqueda (GET /documentos/search): filtro por igualdad + rango de fecha.
+    # SQLite agrega el id al final de cada índice, que sirve de desempate al paginar por (fecha, id).
+    __table_args__ = (
+        Index("ix_documentos_operacion_fecha", "operacion", "fecha"),
+        Index("ix_documentos_cliente_fecha", "cliente_id", "fecha"),
+        Index("ix_documentos_proveedor_fecha", "proveedor_id", "fecha"),
+        Index("ix_documentos_total", "total"),
+    )
+
     # Relaciones
     cliente = relationship("Cliente", back_populates="documentos")
     proveedor = relationship("Proveedor", back_populates="documentos")
@@ -97,7 +114,7 @@ class DetalleDocumento(Base):
     __tablename__ = "detalle_documentos"
 
     id = Column(Integer, primary_key=True, index=True)
-    documento_id = Column(Integer, ForeignKey("documentos.id"), nullable=False)
+    documento_id = Column(Integer, ForeignKey("documentos.id"), nullable=False, index=True)
     producto_id = Column(Integer, ForeignKey("productos.id"), nullable=False)
     cantidad = Column(Integer, nullable=False)
     precio_unitario = Column(Float, nullable=False)
@@ -115,9 +132,160 @@ class Movimiento(Base):
     __tablename__ = "movimientos"
 
     id = Column(Integer, primary_key=True, index=True)
-    producto_id = Column(Integer, ForeignKey("productos.id"), nullable=False)
+    producto_id = Column(Integer, ForeignKey("productos.id"), nullable=False, index=True)  # SQLite agrega el id: sirve para (producto_id, id)
     tipo = Column(String, nullable=False)          # "entrada" o "salida"
     cantidad = Column(Integer, nullable=False)
+    fecha = Column(DateTime, default=datetime.utcnow, index=True)
+    documento_id = Column(Integer, ForeignKey("documentos.id"), nullable=True)  # None = movimiento manual
+    costo_unitario = Column(Float, nullable=True)  # costo promedio aplicado (ver valorizacion.py)
+    costo_propio = Column(Boolean, nullable=True)  # entrada a su propio costo (compras): costo_unitario es el de la compra
+
+    producto = relationship("Producto", back_populates="movimientos")
+
+    # Los movimientos archivados conservan su id: AUTOINCREMENT evita que la
+    # tabla caliente vuelva a asignarlo (ver archivo.py)
+    __table_args__ = {"sqlite_autoincrement": True}
+
+# =========================
+# 📌 ArchivoMovimientos
+# =========================
+class ArchivoMovimientos(Base):
+    """Registro de las tablas de archivo de movimientos (una por mes)."""
+    __tablename__ = "movimientos_archivo"
+
+    id = Column(Integer, primary_key=True, index=True)
+    tabla = Column(String, unique=True, nullable=False)        # movimientos_2025_09
+    periodo_inicio = Column(DateTime, nullable=False)          # inclusivo
+    periodo_fin = Column(DateTime, nullable=False)             # exclusivo
+    filas = Column(Integer, nullable=False, default=0)
+    archivado_en = Column(DateTime, default=datetime.utcnow)
+
+
+# =========================
+# 📌 Cambio (outbox)
+# =========================
+class Cambio(Base):
+    """Registro append-only de cambios en documentos y movimientos (feed de cambios)."""
+    __tablename__ = "cambios"
+
+    seq = Column(Integer, primary_key=True, autoincrement=True)
+    entidad = Column(String, nullable=False)       # "documento", "movimiento" o "archivo" (lote archivado)
+    entidad_id = Column(Integer, nullable=False)
+    operacion = Column(String, nullable=False)     # "insert", "update", "delete" o "archivo"
     fecha = Column(DateTime, default=datetime.utcnow)
+    datos = Column(String, nullable=True)          # JSON con las columnas de la entidad
+
+
+# =========================
+# 📌 CostoProducto (valorización)
+# =========================
+class CostoProducto(Base):
+    """Costo promedio ponderado vigente de cada producto."""
+    __tablename__ = "costos_producto"
+
+    producto_id = Column(Integer, ForeignKey("productos.id"), primary_key=True)
+    costo_promedio = Column(Float, nullable=False)
+    actualizado = Column(DateTime, default=datetime.utcnow)
+
+
+# =========================
+# 📌 Contador (dashboard)
+# =========================
+class Contador(Base):
+    """Totales precalculados del dashboard (ver contadores.py)."""
+    __tablename__ = "contadores"
+
+    clave = Column(String, primary_key=True)       # "unidades", "ventas:2025-09-30", ...
+    valor = Column(Float, nullable=False, default=0)
+
+
+# =========================
+# 📌 Versiones del catálogo (sincronización de terminales)
+# =========================
+class VersionCatalogo(Base):
+    """Contadores de versiones: del catálogo (ver catalogo.py) y del stock (ver disponibilidad.py)."""
+    __tablename__ = "catalogo_version"
+
+    nombre = Column(String, primary_key=True)      # "catalogo" o "stock"
+    valor = Column(Integer, nullable=False, default=0)
+
+
+class BajaCatalogo(Base):
+    """Registro de productos y categorías eliminados, para que las terminales los borren."""
+    __tablename__ = "catalogo_bajas"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    tabla = Column(String, nullable=False)         # "productos" o "categorias"
+    registro_id = Column(Integer, nullable=False)
+    version = Column(Integer, nullable=False, index=True)
+
+
+# =========================
+# 📌 Reposición sugerida
+# =========================
+class Reposicion(Base):
+    """Punto de reorden y nivel objetivo por producto, calculados en lote (ver reposicion.py)."""
+    __tablename__ = "reposicion"
+
+    producto_id = Column(Integer, ForeignKey("productos.id"), primary_key=True)
+    demanda_diaria = Column(Float, nullable=False)     # promedio móvil de salidas por día
+    desviacion = Column(Float, nullable=False)         # desviación estándar de las salidas diarias
+    demanda_plazo = Column(Float, nullable=False)      # demanda esperada durante el plazo de reposición
+    stock_seguridad = Column(Float, nullable=False)
+    punto_reorden = Column(Integer, nullable=False)
+    nivel_objetivo = Column(Integer, nullable=False)   # punto de reorden + cobertura: hasta dónde pedir
+    calculado = Column(DateTime, nullable=False)
+
+
+
+# =========================
+# 📌 SerieDocumento (numeración)
+# =========================
+class SerieDocumento(Base):
+    """Correlativo de cada serie de documentos (ver numeracion.py)."""
+    __tablename__ = "series_documento"
+
+    tipo = Column(String, primary_key=True)        # Boleta, Factura, etc.
+    serie = Column(String, primary_key=True)       # B001, F001, ...
+    siguiente = Column(Integer, nullable=False, default=1)   # primer número aún no reservado
+    sin_huecos = Column(Boolean, nullable=False, default=False)
+    por_defecto = Column(Boolean, nullable=True)   # serie que se usa cuando el documento no trae una
+    generacion = Column(Integer, nullable=True, default=0)   # sube al reconfigurar: invalida los bloques en memoria
+
+
+# =========================
+# 📌 Claves de idempotencia
+# =========================
+class ClaveIdempotencia(Base):
+    """Respuesta guardada por Idempotency-Key, compartida entre workers (ver idempotencia.py)."""
+    __tablename__ = "idempotencia"
+
+    clave = Column(LargeBinary, primary_key=True)   # hash de método + ruta + clave del cliente
+    huella = Column(LargeBinary, nullable=False)   # hash del cuerpo de la solicitud
+    estado = Column(Integer, nullable=True)        # None = en curso
+    tipo = Column(LargeBinary, nullable=True)      # content-type de la respuesta
+    headers = Column(LargeBinary, nullable=True)   # headers de la respuesta (JSON), sin content-length
+    cuerpo = Column(LargeBinary, nullable=True)
+    expira = Column(Float, nullable=False, index=True)   # time.time()
+
+
+# =========================
+# 📌 Trabajos en segundo plano
+# =========================
+class Trabajo(Base):
+    """Estado de un trabajo de reporte, visible para todos los workers (ver trabajos.py)."""
+    __tablename__ = "trabajos"
 
-    producto = relationship("Producto", back_populates="movimientos")
\ No newline at end of file
+    id = Column(String, primary_key=True)          # uuid hex
+    tipo = Column(String, nullable=False)
+    estado = Column(String, nullable=False, index=True)   # pendiente, en_curso, completado, fallido, cancelado
+    progreso = Column(Float, nullable=False, default=0.0)
+    error = Column(String, nullable=True)
+    creado = Column(DateTime, nullable=False, default=datetime.utcnow)
+    terminado = Column(DateTime, nullable=True)
+    nombre_archivo = Column(String, nullable=False)
+    media_type = Column(String, nullable=False)
+    ruta = Column(String, nullable=False)          # archivo de resultado en TRABAJOS_DIR
+    cancelar = Column(Boolean, nullable=False, default=False)   # cancelación pedida desde otro worker
+    actualizado = Column(Float, nullable=False)    # time.time() de la última escritura del worker que lo ejecuta
+    vence = Column(Float, nullable=True)           # time.time() en que se elimina el resultado
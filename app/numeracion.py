@@ -0,0 +1,213 @@
+"""
+Numeración de documentos en el servidor, por (tipo, serie).
+
+El correlativo vive en `series_documento.siguiente`. Hay dos modos:
+
+  - por bloques (por defecto): cada worker reserva `NUMERACION_BLOQUE` números
+    en una transacción corta y propia, y los entrega desde memoria. Las ventas
+    no escriben la fila de la serie en su transacción. Un documento que falla, o
+    un worker que se reinicia, deja huecos en la numeración.
+  - sin huecos (`sin_huecos`, para series fiscales): el número se toma dentro
+    de la transacción del documento (`siguiente_sin_huecos`). Si el documento
+    hace rollback, el número vuelve a quedar libre. Serializa la emisión de la
+    serie.
+
+El número tiene la forma "B001-00000042". Cada serie pertenece a un solo tipo,
+así el número (único en `documentos`) no se repite entre tipos. La serie por
+defecto de cada tipo queda marcada en `series_documento.por_defecto`: la
+inicial del tipo + "001", o el siguiente correlativo libre si esa serie ya es
+de otro tipo ("Nota de crédito" N001, "Nota de débito" N002).
+
+Los números que ya existen en `documentos` (enviados por un cliente con el
+mismo formato) se saltan al asignar.
+
+Los bloques en memoria llevan la `generacion` de la serie con la que se
+reservaron; `configurar` la incrementa y cada worker descarta su bloque al ver
+una generación distinta.
+
+Las transacciones propias de la numeración usan una sesión aparte sobre la
+misma base que la sesión del llamador (`db.get_bind()`); los cachés en memoria
+se separan por base.
+"""
+import os
+import threading
+
+from sqlalchemy import update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from . import models
+from .database import escritura
+
+NUMERACION_BLOQUE = int(os.getenv("NUMERACION_BLOQUE", "50"))
+
+
+class NumeroDuplicado(ValueError):
+    pass
+
+
+def formatear(serie: str, numero: int) -> str:
+    return f"{serie}-{numero:08d}"
+
+
+def _sesion_aparte(db: Session) -> Session:
+    """Sesión nueva sobre la misma base que `db`, para transacciones cortas y propias."""
+    return Session(bind=db.get_bind(), autoflush=False)
+
+
+def _existe(db: Session, numero: str) -> bool:
+    return db.query(models.Documento.id).filter(models.Documento.numero == numero).first() is not None
+
+
+def _validar_serie(db: Session, tipo: str, serie: str):
+    otro = (
+        db.query(models.SerieDocumento.tipo)
+        .filter(models.SerieDocumento.serie == serie, models.SerieDocumento.tipo != tipo)
+        .first()
+    )
+    if otro:
+        raise ValueError(f"La serie {serie} ya pertenece al tipo {otro[0]}")
+
+
+# =========================
+# 📌 Serie por defecto
+# =========================
+_por_defecto = {}  # (base, tipo) -> serie (la asignación no cambia una vez hecha)
+
+
+@escritura
+def _asignar_por_defecto(db: Session, tipo: str) -> str:
+    t = models.SerieDocumento
+    marcada = db.query(t.serie).filter(t.tipo == tipo, t.por_defecto.is_(True)).first()
+    if marcada:
+        db.rollback()
+        return marcada[0]
+    inicial = tipo[:1].upper()
+    for n in range(1, 1000):
+        serie = f"{inicial}{n:03d}"
+        duenos = {fila[0] for fila in db.query(t.tipo).filter(t.serie == serie)}
+        if duenos - {tipo}:
+            continue  # pertenece a otro tipo
+        config = db.get(t, (tipo, serie))
+        if config is None:
+            config = t(tipo=tipo, serie=serie, siguiente=1, sin_huecos=False, generacion=0)
+            db.add(config)
+        config.por_defecto = True
+        db.commit()
+        return serie
+    raise ValueError(f"No quedan series libres con la inicial {inicial} para el tipo {tipo}")
+
+
+def serie_por_defecto(db: Session, tipo: str) -> str:
+    """Serie por defecto del tipo en la base de `db` (la asigna en una transacción propia)."""
+    clave = (db.get_bind(), tipo)
+    serie = _por_defecto.get(clave)
+    if serie is None:
+        with _sesion_aparte(db) as propia:
+            serie = _por_defecto[clave] = _asignar_por_defecto(propia, tipo)
+    return serie
+
+
+# =========================
+# 📌 Modo por bloques
+# =========================
+_lock = threading.Lock()
+_bloques = {}  # (base, tipo, serie) -> [siguiente, fin, generación]
+
+
+@escritura
+def _reservar_bloque(db: Session, tipo: str, serie: str, cantidad: int):
+    """
+    Avanza el correlativo en `cantidad` (crea la serie si no existe).
+    Devuelve (primer número, generación de la serie).
+    """
+    _validar_serie(db, tipo, serie)
+    tabla = models.SerieDocumento.__table__
+    fin, generacion = db.execute(
+        sqlite_insert(tabla)
+        .values(tipo=tipo, serie=serie, siguiente=1 + cantidad, sin_huecos=False, generacion=0)
+        .on_conflict_do_update(index_elements=["tipo", "serie"], set_={"siguiente": tabla.c.siguiente + cantidad})
+        .returning(tabla.c.siguiente, tabla.c.generacion)
+    ).one()
+    db.commit()
+    return fin - cantidad, generacion or 0
+
+
+def reservar(db: Session, tipo: str, serie: str):
+    """
+    Número para un documento nuevo, fuera de su transacción: la reserva usa una
+    sesión propia sobre la base de `db`.
+
+    Devuelve None si la serie es sin huecos: el número se toma luego con
+    `siguiente_sin_huecos` dentro de la transacción del documento.
+    """
+    clave = (db.get_bind(), tipo, serie)
+    db = _sesion_aparte(db)
+    try:
+        config = db.get(models.SerieDocumento, (tipo, serie))
+        if config is not None and config.sin_huecos:
+            return None
+        generacion = (config.generacion or 0) if config is not None else None
+        db.rollback()  # la reserva abre su propia transacción de escritura
+
+        while True:
+            with _lock:
+                bloque = _bloques.get(clave)
+                vigente = bloque and bloque[0] < bloque[1] and generacion in (None, bloque[2])
+                if not vigente:
+                    inicio, generacion = _reservar_bloque(db, tipo, serie, NUMERACION_BLOQUE)
+                    bloque = _bloques[clave] = [inicio, inicio + NUMERACION_BLOQUE, generacion]
+                numero = formatear(serie, bloque[0])
+                bloque[0] += 1
+            if not _existe(db, numero):
+                return numero
+            db.rollback()
+    finally:
+        db.close()
+
+
+# =========================
+# 📌 Modo sin huecos
+# =========================
+def siguiente_sin_huecos(db: Session, tipo: str, serie: str) -> str:
+    """Toma el siguiente número dentro de la transacción en curso (sin commit)."""
+    tabla = models.SerieDocumento.__table__
+    while True:
+        siguiente = db.execute(
+            update(tabla)
+            .where(tabla.c.tipo == tipo, tabla.c.serie == serie)
+            .values(siguiente=tabla.c.siguiente + 1)
+            .returning(tabla.c.siguiente)
+        ).scalar()
+        numero = formatear(serie, siguiente - 1)
+        if not _existe(db, numero):
+            return numero
+
+
+# =========================
+# 📌 Configuración
+# =========================
+@escritura
+def configurar(db: Session, tipo: str, serie: str, sin_huecos: bool = None, siguiente: int = None):
+    _validar_serie(db, tipo, serie)
+    config = db.get(models.SerieDocumento, (tipo, serie))
+    if config is None:
+        config = models.SerieDocumento(tipo=tipo, serie=serie, siguiente=1, sin_huecos=False, generacion=0)
+        db.add(config)
+    if siguiente is not None:
+        if siguiente < config.siguiente:
+            raise ValueError(f"El correlativo solo puede avanzar (actual: {config.siguiente})")
+        config.siguiente = siguiente
+    if sin_huecos is not None:
+        config.sin_huecos = sin_huecos
+    # Los bloques en memoria de todos los workers ya no se usan
+    config.generacion = (config.generacion or 0) + 1
+    db.commit()
+    db.refresh(config)
+    with _lock:
+        _bloques.pop((db.get_bind(), tipo, serie), None)
+    return config
+
+
+def listar(db: Session):
+    return db.query(models.SerieDocumento).order_by(models.SerieDocumento.tipo, models.SerieDocumento.serie).all()
@@ -0,0 +1,109 @@
+"""
+Generación del PDF de un documento (usado por GET /documentos/{id}/pdf y por
+los trabajos de PDFs en lote).
+"""
+import io
+
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Table, TableStyle, Spacer
+from reportlab.lib.pagesizes import A4
+from reportlab.lib import colors
+from reportlab.lib.styles import getSampleStyleSheet
+
+
+def nombre_pdf(db_documento) -> str:
+    return f"{db_documento.tipo}_{db_documento.numero}.pdf"
+
+
+def pdf_documento(db_documento) -> bytes:
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=A4)
+
+    # 🔑 Metadatos
+    doc.title = f"{db_documento.tipo} {db_documento.numero}"
+    doc.author = "Mi Sistema de Facturación"
+    doc.subject = f"Documento {db_documento.tipo}"
+    doc.keywords = "Factura, Boleta, Documento, Reporte"
+
+    styles = getSampleStyleSheet()
+    estilos = {
+        "titulo": styles["Title"],
+        "normal": styles["Normal"],
+        "negrita": styles["Heading3"],
+    }
+
+    elementos = []
+
+    # =========================
+    # Encabezado
+    # =========================
+    elementos.append(Paragraph("<b>SISTEMA DE FACTURACIÓN</b>", estilos["titulo"]))
+    elementos.append(Spacer(1, 12))
+    elementos.append(Paragraph(f"<b>{db_documento.tipo} {db_documento.numero}</b>", estilos["negrita"]))
+    elementos.append(Paragraph(f"Operación: {db_documento.operacion}", estilos["normal"]))
+    elementos.append(Spacer(1, 12))
+
+    # =========================
+    # Datos de Cliente y Proveedor
+    # =========================
+    data_info = []
+    if db_documento.cliente:
+        data_info.append(["Cliente:", db_documento.cliente.nombre])
+    if db_documento.proveedor:
+        data_info.append(["Proveedor:", db_documento.proveedor.nombre])
+
+    if data_info:
+        tabla_info = Table(data_info, colWidths=[100, 400])
+        tabla_info.setStyle(TableStyle([
+            ("BACKGROUND", (0, 0), (0, -1), colors.lightgrey),
+            ("ALIGN", (0, 0), (-1, -1), "LEFT"),
+            ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
+            ("FONTSIZE", (0, 0), (-1, -1), 10),
+            ("BOTTOMPADDING", (0, 0), (-1, -1), 6),
+        ]))
+        elementos.append(tabla_info)
+        elementos.append(Spacer(1, 12))
+
+    # =========================
+    # Tabla de Detalles
+    # =========================
+    # Precios y totales guardados en el documento (no los precios actuales del producto)
+    data = [["Producto", "Cantidad", "Precio", "Subtotal"]]
+    for det in db_documento.detalles:
+        data.append([det.producto.nombre, det.cantidad, f"S/ {det.precio_unitario:.2f}", f"S/ {det.subtotal:.2f}"])
+    data.append(["", "", "SUBTOTAL", f"S/ {db_documento.subtotal or 0:.2f}"])
+    data.append(["", "", "IGV", f"S/ {db_documento.impuesto or 0:.2f}"])
+    data.append(["", "", "TOTAL", f"S/ {db_documento.total or 0:.2f}"])
+
+    tabla = Table(data, colWidths=[200, 80, 100, 100])
+    tabla.setStyle(TableStyle([
+        # Cabecera
+        ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#1E3A8A")),
+        ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
+        ("ALIGN", (0, 0), (-1, 0), "CENTER"),
+        ("FONTSIZE", (0, 0), (-1, 0), 11),
+        ("BOTTOMPADDING", (0, 0), (-1, 0), 8),
+
+        # Celdas
+        ("GRID", (0, 0), (-1, -4), 0.5, colors.grey),
+        ("ALIGN", (1, 1), (-1, -1), "CENTER"),
+        ("FONTSIZE", (0, 1), (-1, -1), 10),
+
+        # Totales
+        ("BACKGROUND", (-2, -3), (-1, -1), colors.lightgrey),
+        ("TEXTCOLOR", (-2, -3), (-1, -1), colors.black),
+        ("FONTSIZE", (-2, -1), (-1, -1), 11),
+        ("ALIGN", (-2, -3), (-1, -1), "RIGHT"),
+    ]))
+
+    elementos.append(tabla)
+    elementos.append(Spacer(1, 20))
+
+    # =========================
+    # Pie de página
+    # =========================
+    elementos.append(Paragraph("Gracias por su preferencia 🙌", estilos["normal"]))
+
+    doc.build(elementos)
+    pdf = buffer.getvalue()
+    buffer.close()
+    return pdf
@@ -0,0 +1,278 @@
+"""
+Perfilado por solicitud, a pedido.
+
+Solo se activa si `PERFIL_TOKEN` está definido: sin esa variable no se instala
+el middleware, ni los listeners de SQL, ni las rutas de `/debug/profiles`.
+
+Una solicitud con el header `X-Perfil: <token>` (o `?perfil=<token>`) se
+ejecuta bajo un muestreador: un hilo que cada `PERFIL_INTERVALO` segundos lee
+las pilas de los hilos que atienden esa solicitud (el del event loop mientras
+ejecuta su código y el del threadpool que corre el endpoint). Si en ese
+momento el hilo está dentro de una consulta, la muestra termina en un marco
+`SQL <sentencia>`.
+
+El resultado se guarda en `PERFIL_DIR` como:
+  - `<id>.folded`: pilas en formato "folded" (una pila por línea con su conteo),
+    listo para flamegraph.pl, speedscope o inferno
+  - `<id>.json`: ruta, duración, muestras y tiempo por sentencia SQL
+Se conservan los últimos `PERFIL_MAX` perfiles. La respuesta lleva `X-Perfil-Id`.
+"""
+import contextvars
+import functools
+import hmac
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+from urllib.parse import parse_qsl, urlencode
+
+from starlette.concurrency import run_in_threadpool
+
+TOKEN = os.getenv("PERFIL_TOKEN")
+ACTIVO = bool(TOKEN)
+INTERVALO = float(os.getenv("PERFIL_INTERVALO", "0.005"))   # segundos entre muestras
+MAX_PERFILES = int(os.getenv("PERFIL_MAX", "50"))
+DIRECTORIO = os.getenv("PERFIL_DIR", os.path.join(tempfile.gettempdir(), "stockmanager-perfiles"))
+PROFUNDIDAD = 200
+HEADER = b"x-perfil"
+
+_actual = contextvars.ContextVar("perfil_actual", default=None)
+_lock = threading.Lock()
+_activos = 0                 # perfiles en curso (los listeners de SQL no hacen nada si es 0)
+_sql_en_curso = {}           # id de hilo -> sentencia que está ejecutando
+
+
+def token_valido(valor) -> bool:
+    return ACTIVO and valor is not None and hmac.compare_digest(str(valor), TOKEN)
+
+
+class Perfil:
+    def __init__(self, metodo: str, ruta: str):
+        self.id = f"{datetime.utcnow():%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+        self.metodo = metodo
+        self.ruta = ruta
+        self.muestras = Counter()
+        self.sql = {}        # sentencia -> [veces, segundos]
+        self.estado = None
+
+
+# =========================
+# 📌 Pilas
+# =========================
+@functools.lru_cache(maxsize=4096)
+def _etiqueta(codigo) -> str:
+    archivo = codigo.co_filename
+    for prefijo in sorted((p for p in sys.path if p), key=len, reverse=True):
+        if archivo.startswith(prefijo + os.sep):
+            archivo = archivo[len(prefijo) + 1:]
+            break
+    return f"{codigo.co_name} ({archivo}:{codigo.co_firstlineno})".replace(";", ",")
+
+
+def _sql_etiqueta(sentencia: str) -> str:
+    return "SQL " + " ".join(sentencia.split())[:120].replace(";", ",")
+
+
+def _portadores():
+    """Marcos que indican a qué solicitud pertenece un hilo (código -> función que lee el perfil)."""
+    portadores = {
+        PerfilMiddleware._perfilar.__code__: lambda locales: locales.get("perfil"),
+    }
+    try:
+        # El worker de anyio ejecuta cada tarea del threadpool con context.run(...)
+        # sobre una copia del contexto de la solicitud: ahí se lee el perfil.
+        from anyio._backends._asyncio import WorkerThread
+
+        def _desde_contexto(locales):
+            contexto = locales.get("context")
+            return contexto.get(_actual) if isinstance(contexto, contextvars.Context) else None
+
+        portadores[WorkerThread.run.__code__] = _desde_contexto
+    except (ImportError, AttributeError):
+        pass  # sin esto solo se muestrea el event loop
+    return portadores
+
+
+def _muestrear(perfil: Perfil, detener: threading.Event, portadores: dict):
+    propio = threading.get_ident()
+    while not detener.wait(INTERVALO):
+        for hilo, marco in sys._current_frames().items():
+            if hilo == propio:
+                continue
+            pila = []
+            pertenece = False
+            while marco is not None and len(pila) < PROFUNDIDAD:
+                lector = portadores.get(marco.f_code)
+                if lector is not None:
+                    if lector(marco.f_locals) is perfil:
+                        pertenece = True
+                        break  # lo que está debajo (loop, hilo del pool) es igual en todas las muestras
+                    pila = None
+                    break
+                pila.append(_etiqueta(marco.f_code))
+                marco = marco.f_back
+            if not pertenece or not pila:
+                continue
+            pila.reverse()
+            sentencia = _sql_en_curso.get(hilo)
+            if sentencia:
+                pila.append(_sql_etiqueta(sentencia))
+            perfil.muestras[";".join(pila)] += 1
+
+
+# =========================
+# 📌 SQL
+# =========================
+def _antes_de_sql(conn, cursor, statement, parameters, context, executemany):
+    if _activos and _actual.get() is not None:
+        _sql_en_curso[threading.get_ident()] = statement
+        conn.info["perfil_inicio"] = time.perf_counter()
+
+
+def _despues_de_sql(conn, cursor, statement, parameters, context, executemany):
+    if not _activos:
+        return
+    _sql_en_curso.pop(threading.get_ident(), None)
+    perfil = _actual.get()
+    inicio = conn.info.pop("perfil_inicio", None)
+    if perfil is not None and inicio is not None:
+        total = perfil.sql.setdefault(" ".join(statement.split()), [0, 0.0])
+        total[0] += 1
+        total[1] += time.perf_counter() - inicio
+
+
+def instalar_sql(engine):
+    from sqlalchemy import event
+
+    event.listen(engine, "before_cursor_execute", _antes_de_sql)
+    event.listen(engine, "after_cursor_execute", _despues_de_sql)
+
+
+# =========================
+# 📌 Almacén (anillo en disco)
+# =========================
+def _ruta(perfil_id: str, extension: str) -> str:
+    return os.path.join(DIRECTORIO, f"{os.path.basename(perfil_id)}.{extension}")
+
+
+def guardar(perfil: Perfil, duracion: float):
+    os.makedirs(DIRECTORIO, exist_ok=True)
+    with open(_ruta(perfil.id, "folded"), "w", encoding="utf-8") as f:
+        for pila, cuenta in perfil.muestras.most_common():
+            f.write(f"{pila} {cuenta}\n")
+    sql = sorted(perfil.sql.items(), key=lambda s: s[1][1], reverse=True)
+    resumen = {
+        "id": perfil.id,
+        "metodo": perfil.metodo,
+        "ruta": perfil.ruta,
+        "estado": perfil.estado,
+        "duracion_ms": round(duracion * 1000, 2),
+        "intervalo_ms": INTERVALO * 1000,
+        "muestras": sum(perfil.muestras.values()),
+        "sql_ms": round(sum(t for _, t in perfil.sql.values()) * 1000, 2),
+        "sql": [{"sentencia": s, "veces": n, "total_ms": round(t * 1000, 2)} for s, (n, t) in sql[:50]],
+    }
+    # El .json se escribe al final: su presencia indica un perfil completo
+    with open(_ruta(perfil.id, "json"), "w", encoding="utf-8") as f:
+        json.dump(resumen, f, ensure_ascii=False)
+    _recortar()
+
+
+def _recortar():
+    ids = sorted(nombre[:-5] for nombre in os.listdir(DIRECTORIO) if nombre.endswith(".json"))
+    for viejo in ids[:-MAX_PERFILES] if MAX_PERFILES > 0 else ids:
+        for extension in ("json", "folded"):
+            try:
+                os.remove(_ruta(viejo, extension))
+            except FileNotFoundError:
+                pass
+
+
+def listar() -> list:
+    if not os.path.isdir(DIRECTORIO):
+        return []
+    perfiles = []
+    for nombre in sorted(os.listdir(DIRECTORIO), reverse=True):
+        if nombre.endswith(".json"):
+            resumen = leer(nombre[:-5])
+            if resumen:
+                resumen.pop("sql", None)
+                perfiles.append(resumen)
+    return perfiles
+
+
+def leer(perfil_id: str):
+    try:
+        with open(_ruta(perfil_id, "json"), encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def ruta_folded(perfil_id: str):
+    ruta = _ruta(perfil_id, "folded")
+    return ruta if os.path.exists(ruta) else None
+
+
+# =========================
+# 📌 Middleware
+# =========================
+def _pedido(scope):
+    """(token del header o del query string, query string sin el token)."""
+    token = None
+    for nombre, valor in scope["headers"]:
+        if nombre == HEADER:
+            token = valor.decode("latin-1")
+    parametros = parse_qsl(scope.get("query_string", b"").decode("latin-1"), keep_blank_values=True)
+    resto = [(k, v) for k, v in parametros if k != "perfil"]
+    if token is None:
+        token = next((v for k, v in parametros if k == "perfil"), None)
+    return token, urlencode(resto)
+
+
+class PerfilMiddleware:
+    def __init__(self, app):
+        self.app = app
+        self.portadores = _portadores()
+
+    async def __call__(self, scope, receive, send):
+        # Las rutas de /debug usan el mismo token para autorizar: no se perfilan
+        if scope["type"] != "http" or scope["path"].startswith("/debug/"):
+            return await self.app(scope, receive, send)
+        token, query = _pedido(scope)
+        if not token_valido(token):
+            return await self.app(scope, receive, send)
+        await self._perfilar(scope, receive, send, query)
+
+    async def _perfilar(self, scope, receive, send, query):
+        global _activos
+        perfil = Perfil(scope["method"], scope["path"] + (f"?{query}" if query else ""))
+
+        async def enviar(mensaje):
+            if mensaje["type"] == "http.response.start":
+                perfil.estado = mensaje["status"]
+                mensaje = dict(mensaje, headers=list(mensaje.get("headers", [])) + [(b"x-perfil-id", perfil.id.encode())])
+            await send(mensaje)
+
+        detener = threading.Event()
+        muestreador = threading.Thread(target=_muestrear, args=(perfil, detener, self.portadores), daemon=True)
+        ficha = _actual.set(perfil)
+        with _lock:
+            _activos += 1
+        inicio = time.perf_counter()
+        muestreador.start()
+        try:
+            await self.app(scope, receive, enviar)
+        finally:
+            duracion = time.perf_counter() - inicio
+            detener.set()
+            muestreador.join()
+            with _lock:
+                _activos -= 1
+            _actual.reset(ficha)
+            await run_in_threadpool(guardar, perfil, duracion)
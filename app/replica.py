@@ -0,0 +1,172 @@
+"""
+Réplica de solo lectura para reportes pesados.
+
+Si se define `REPLICA_LECTURA` (ruta de archivo), un hilo en segundo plano copia
+cada `REPLICA_INTERVALO` segundos la base SQLite en uso con la API de backup
+en línea. La copia se escribe a un archivo temporal y se reemplaza de forma
+atómica, así que los lectores nunca ven una réplica a medio escribir.
+
+Los endpoints de reportes usan `get_db_lectura`: abren sesiones contra la
+réplica (engine sin pool, `mode=ro`) e informan la antigüedad de los datos en
+el header `X-Snapshot-Age` (segundos). Sin réplica, o mientras no exista la
+primera copia, se lee de la base principal.
+
+Con varios workers cada uno ejecuta el hilo: un bloqueo `flock` sobre
+`<réplica>.lock` deja copiar a uno solo por vez, y la fecha de modificación del
+archivo evita copias repetidas dentro del mismo intervalo. Cada copia se
+escribe en un temporal propio del proceso, nunca sobre el de otro worker.
+"""
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: sin bloqueo entre workers (el temporal propio evita mezclar copias)
+    fcntl = None
+
+from fastapi import Response
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+
+from . import metricas
+from .database import SessionLocal, engine
+
+logger = logging.getLogger(__name__)
+
+REPLICA_LECTURA = os.getenv("REPLICA_LECTURA", "")                 # vacío = desactivada
+REPLICA_INTERVALO = float(os.getenv("REPLICA_INTERVALO", "60"))    # segundos entre copias
+
+HABILITADA = bool(REPLICA_LECTURA) and engine.dialect.name == "sqlite"
+
+# Sin pool: cada sesión abre el archivo vigente (el anterior se reemplaza con os.replace)
+engine_lectura = create_engine(
+    f"sqlite:///file:{os.path.abspath(REPLICA_LECTURA)}?mode=ro&uri=true",
+    connect_args={"check_same_thread": False},
+    poolclass=NullPool,
+) if HABILITADA else None
+SessionLectura = sessionmaker(autocommit=False, autoflush=False, bind=engine_lectura) if HABILITADA else None
+
+
+# =========================
+# 📌 Copia
+# =========================
+def antiguedad():
+    """Segundos desde la última copia, o None si aún no hay réplica."""
+    try:
+        return max(0.0, time.time() - os.path.getmtime(REPLICA_LECTURA))
+    except OSError:
+        return None
+
+
+def copiar():
+    """Copia la base principal a la réplica (archivo temporal + reemplazo atómico)."""
+    # Temporal propio de este proceso, en el mismo directorio para que os.replace sea atómico
+    descriptor, temporal = tempfile.mkstemp(
+        prefix=os.path.basename(REPLICA_LECTURA) + ".", suffix=".tmp",
+        dir=os.path.dirname(os.path.abspath(REPLICA_LECTURA)),
+    )
+    os.close(descriptor)
+    inicio = time.perf_counter()
+    try:
+        origen = sqlite3.connect(engine.url.database)
+        destino = sqlite3.connect(temporal)
+        try:
+            # Un solo paso: en WAL la lectura no bloquea a los escritores, y en
+            # varios pasos la copia se reinicia cada vez que alguien escribe.
+            origen.backup(destino)
+            # La réplica se abre en solo lectura: sin WAL no necesita archivos -wal/-shm
+            destino.execute("PRAGMA journal_mode=DELETE")
+        finally:
+            destino.close()
+            origen.close()
+        os.replace(temporal, REPLICA_LECTURA)
+    except BaseException:
+        try:
+            os.remove(temporal)
+        except OSError:
+            pass
+        raise
+    metricas.observar("replica_copia", time.perf_counter() - inicio)
+
+
+@contextmanager
+def _turno():
+    """
+    Bloqueo exclusivo (flock) entre workers sobre `<réplica>.lock`, sin esperar.
+    Devuelve True si este proceso obtuvo el turno para copiar.
+    """
+    if fcntl is None:
+        yield True
+        return
+    with open(f"{REPLICA_LECTURA}.lock", "a") as archivo:
+        try:
+            fcntl.flock(archivo, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            yield False  # otro worker está copiando
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(archivo, fcntl.LOCK_UN)
+
+
+def refrescar() -> bool:
+    """Copia si la réplica está vencida y ningún otro worker la está copiando."""
+    with _turno() as propio:
+        if not propio:
+            return False
+        # Con el bloqueo tomado se vuelve a mirar: otro worker pudo terminar recién
+        edad = antiguedad()
+        if edad is not None and edad < REPLICA_INTERVALO:
+            return False
+        copiar()
+        return True
+
+
+def _bucle(detener: threading.Event):
+    while not detener.is_set():
+        edad = antiguedad()
+        if edad is None or edad >= REPLICA_INTERVALO:
+            try:
+                refrescar()
+            except Exception:
+                metricas.incrementar("replica_copias_fallidas")
+                logger.exception("No se pudo copiar la réplica de lectura")
+            edad = 0.0
+        detener.wait(max(1.0, REPLICA_INTERVALO - edad))
+
+
+def iniciar():
+    """Arranca el hilo de copias. Devuelve el evento para detenerlo (o None si no está habilitada)."""
+    if not HABILITADA:
+        return None
+    detener = threading.Event()
+    threading.Thread(target=_bucle, args=(detener,), name="replica-lectura", daemon=True).start()
+    metricas.registrar_medidor("replica_antiguedad_s", lambda: antiguedad() or 0.0)
+    return detener
+
+
+# =========================
+# 📌 Dependencia para reportes
+# =========================
+def sesion_lectura():
+    """Devuelve (sesión, antigüedad en s): la réplica si existe, si no la base principal (0)."""
+    edad = antiguedad() if HABILITADA else None
+    if edad is None:
+        return SessionLocal(), 0.0
+    return SessionLectura(), edad
+
+
+def get_db_lectura(response: Response):
+    db, edad = sesion_lectura()
+    response.headers["X-Snapshot-Age"] = f"{edad:.1f}"
+    try:
+        yield db
+    finally:
+        db.close()
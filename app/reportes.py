@@ -0,0 +1,123 @@
+"""
+Reportes largos que se ejecutan como trabajos (ver `trabajos.py`).
+
+Cada función recibe la ruta del archivo de resultado y `avance(fraccion)`, y lee
+de la réplica de lectura si está habilitada.
+"""
+import csv
+import os
+import tempfile
+import zipfile
+from datetime import datetime
+from typing import List
+
+from sqlalchemy import select, func
+
+from . import models, archivo, crud, exportacion
+from .pdf import pdf_documento, nombre_pdf
+from .replica import sesion_lectura
+from .valorizacion import costo_sql
+
+LOTE_LECTURA = 5000
+
+
+# =========================
+# 📌 Movimientos (CSV)
+# =========================
+def movimientos_csv(ruta: str, avance, tipo: str = None, fecha_inicio: datetime = None, fecha_fin: datetime = None):
+    db, _ = sesion_lectura()
+    try:
+        fuente = archivo.fuente_movimientos(db, fecha_inicio, fecha_fin)
+        condiciones = []
+        if tipo:
+            condiciones.append(fuente.c.tipo == tipo)
+        if fecha_inicio:
+            condiciones.append(fuente.c.fecha >= fecha_inicio)
+        if fecha_fin:
+            condiciones.append(fuente.c.fecha <= fecha_fin)
+
+        total = db.execute(select(func.count()).select_from(fuente).where(*condiciones)).scalar() or 1
+        nombres = dict(db.query(models.Producto.id, models.Producto.nombre).all())
+        filas = db.execute(
+            select(fuente.c.id, fuente.c.fecha, fuente.c.producto_id, fuente.c.tipo, fuente.c.cantidad,
+                   fuente.c.costo_unitario, fuente.c.documento_id)
+            .where(*condiciones)
+            .order_by(fuente.c.fecha, fuente.c.id)
+            .execution_options(yield_per=LOTE_LECTURA)
+        )
+
+        with open(ruta, "w", newline="", encoding="utf-8") as f:
+            escritor = csv.writer(f)
+            escritor.writerow(["id", "fecha", "producto_id", "producto", "tipo", "cantidad", "costo_unitario", "documento_id"])
+            for n, m in enumerate(filas, start=1):
+                escritor.writerow([m.id, m.fecha, m.producto_id, nombres.get(m.producto_id, ""), m.tipo,
+                                   m.cantidad, m.costo_unitario, m.documento_id])
+                if n % LOTE_LECTURA == 0:
+                    avance(n / total)
+    finally:
+        db.close()
+
+
+# =========================
+# 📌 Valorización completa (CSV)
+# =========================
+def valorizacion_csv(ruta: str, avance):
+    db, _ = sesion_lectura()
+    try:
+        total = db.query(func.count(models.Producto.id)).scalar() or 1
+        costo = costo_sql()
+        filas = db.execute(
+            select(models.Producto.id, models.Producto.codigo_barras, models.Producto.nombre,
+                   models.Categoria.nombre.label("categoria"), models.Producto.stock_actual, costo.label("costo"))
+            .outerjoin(models.Categoria, models.Categoria.id == models.Producto.categoria_id)
+            .outerjoin(models.CostoProducto, models.CostoProducto.producto_id == models.Producto.id)
+            .order_by(models.Producto.id)
+            .execution_options(yield_per=LOTE_LECTURA)
+        )
+
+        valor_total = 0.0
+        with open(ruta, "w", newline="", encoding="utf-8") as f:
+            escritor = csv.writer(f)
+            escritor.writerow(["producto_id", "codigo_barras", "nombre", "categoria", "cantidad", "costo_promedio", "valor"])
+            for n, p in enumerate(filas, start=1):
+                valor = p.stock_actual * p.costo
+                valor_total += valor
+                escritor.writerow([p.id, p.codigo_barras, p.nombre, p.categoria, p.stock_actual, p.costo, valor])
+                if n % LOTE_LECTURA == 0:
+                    avance(n / total)
+            escritor.writerow(["", "", "TOTAL", "", "", "", valor_total])
+    finally:
+        db.close()
+
+
+# =========================
+# 📌 PDFs de documentos (ZIP)
+# =========================
+def documentos_pdf_zip(ruta: str, avance, ids: List[int]):
+    db, _ = sesion_lectura()
+    try:
+        with zipfile.ZipFile(ruta, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+            for n, documento_id in enumerate(ids, start=1):
+                db_documento = crud.get_documento(db, documento_id)
+                if db_documento:
+                    zf.writestr(nombre_pdf(db_documento), pdf_documento(db_documento))
+                db.expunge_all()  # no acumular documentos en la sesión
+                avance(n / len(ids))
+    finally:
+        db.close()
+
+
+# =========================
+# 📌 Exportación Parquet (ZIP con particiones por mes)
+# =========================
+def exportacion_parquet_zip(ruta: str, avance, fecha_inicio: datetime, fecha_fin: datetime):
+    db, _ = sesion_lectura()
+    try:
+        with tempfile.TemporaryDirectory() as directorio:
+            archivos = exportacion.exportar(db, directorio, fecha_inicio, fecha_fin, avance=avance)
+            # Parquet ya viene comprimido: el ZIP solo agrupa
+            with zipfile.ZipFile(ruta, "w", compression=zipfile.ZIP_STORED) as zf:
+                for r in archivos:
+                    zf.write(r["archivo"], os.path.relpath(r["archivo"], directorio))
+    finally:
+        db.close()
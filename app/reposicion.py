@@ -0,0 +1,194 @@
+"""
+Punto de reorden y cantidad sugerida de compra para todo el catálogo.
+
+Proceso en lote (pensado para correr cada noche):
+
+  1. Las salidas de los últimos `REPOSICION_DIAS` días se leen en una sola
+     pasada y se suman en una matriz productos x días de NumPy (los días sin
+     salidas quedan en cero).
+  2. Sobre la matriz, sin recorrer productos en Python:
+       demanda_diaria  = promedio móvil de la ventana
+       desviacion      = desviación estándar de las salidas diarias
+       demanda_plazo   = demanda_diaria * plazo
+       stock_seguridad = z * desviacion * sqrt(plazo)
+       punto_reorden   = ceil(demanda_plazo + stock_seguridad)
+       nivel_objetivo  = ceil(punto_reorden + demanda_diaria * cobertura)
+  3. Se reemplaza la tabla `reposicion` en una transacción.
+
+`GET /productos/reposicion` cruza esos valores con el stock actual: si el stock
+está en o bajo el punto de reorden, sugiere pedir hasta el nivel objetivo.
+
+    python -m app.reposicion
+
+NumPy es opcional: solo lo necesita el cálculo, no la consulta.
+"""
+import os
+import time
+from itertools import chain
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, func, cast, Integer, delete, insert, case
+from sqlalchemy.orm import Session
+
+from . import models, archivo
+from .database import escritura
+
+DIAS = int(os.getenv("REPOSICION_DIAS", "56"))                 # ventana del promedio móvil
+PLAZO = float(os.getenv("REPOSICION_PLAZO", "7"))              # días entre pedir y recibir
+COBERTURA = float(os.getenv("REPOSICION_COBERTURA", "30"))     # días de demanda que cubre un pedido
+Z_SERVICIO = float(os.getenv("REPOSICION_Z", "1.65"))          # 1.65 ~ 95 % de ciclos sin quiebre
+FILAS_POR_LOTE = 50_000
+
+
+def _numpy():
+    try:
+        import numpy as np
+    except ImportError:
+        raise RuntimeError("El cálculo de reposición requiere numpy")
+    return np
+
+
+# =========================
+# 📌 Carga
+# =========================
+def cargar_series(db: Session, hasta: datetime, dias: int = DIAS):
+    """
+    (ids de productos, matriz productos x días de salidas) de [hasta - dias, hasta).
+
+    Las salidas se leen en bloques (sin GROUP BY: ordenar millones de filas en
+    SQLite cuesta más que sumarlas en NumPy) y se acumulan con `np.add.at`.
+    """
+    np = _numpy()
+    hasta = hasta.replace(hour=0, minute=0, second=0, microsecond=0)
+    desde = hasta - timedelta(days=dias)
+    fuente = archivo.fuente_movimientos(db, desde, hasta)
+    # Número de día juliano: julianday vale N.5 a medianoche, así que +0.5 y truncar da el día
+    dia = cast(func.julianday(fuente.c.fecha) + 0.5, Integer)
+    primer_dia = desde.toordinal() + 1_721_425
+    consulta = (
+        select(fuente.c.producto_id, dia, fuente.c.cantidad)
+        .where(fuente.c.tipo == "salida", fuente.c.fecha >= desde, fuente.c.fecha < hasta)
+        .execution_options(yield_per=FILAS_POR_LOTE)
+    )
+    conexion = db.connection()
+    ids = np.fromiter(
+        conexion.execute(select(models.Producto.id).order_by(models.Producto.id)).scalars(), dtype=np.int64
+    )
+
+    serie = np.zeros(len(ids) * dias, dtype=np.float32)
+    for bloque in conexion.execute(consulta).partitions():
+        if not len(ids):
+            break
+        # fromiter sobre los valores: np.array con objetos Row los trata como mapeos y es mucho más lento
+        salidas = np.fromiter(chain.from_iterable(bloque), dtype=np.int64, count=3 * len(bloque)).reshape(-1, 3)
+        posicion = np.searchsorted(ids, salidas[:, 0]).clip(max=len(ids) - 1)
+        vigentes = ids[posicion] == salidas[:, 0]  # salidas de productos ya eliminados
+        indice = posicion[vigentes] * dias + (salidas[vigentes, 1] - primer_dia)
+        np.add.at(serie, indice, salidas[vigentes, 2])
+    return ids, serie.reshape(len(ids), dias)
+
+
+# =========================
+# 📌 Cálculo
+# =========================
+def calcular(serie, plazo: float = PLAZO, cobertura: float = COBERTURA, z: float = Z_SERVICIO) -> dict:
+    """Indicadores de reposición por fila de `serie` (productos x días), vectorizados."""
+    np = _numpy()
+    demanda = serie.mean(axis=1, dtype=np.float64)
+    desviacion = serie.std(axis=1, dtype=np.float64, ddof=1) if serie.shape[1] > 1 else np.zeros(len(serie))
+    demanda_plazo = demanda * plazo
+    stock_seguridad = z * desviacion * np.sqrt(plazo)
+    punto_reorden = np.ceil(demanda_plazo + stock_seguridad)
+    nivel_objetivo = np.ceil(punto_reorden + demanda * cobertura)
+    return {
+        "demanda_diaria": demanda,
+        "desviacion": desviacion,
+        "demanda_plazo": demanda_plazo,
+        "stock_seguridad": stock_seguridad,
+        "punto_reorden": punto_reorden.astype(np.int64),
+        "nivel_objetivo": nivel_objetivo.astype(np.int64),
+    }
+
+
+@escritura
+def guardar(db: Session, ids, resultado: dict, calculado: datetime) -> int:
+    """Reemplaza el contenido de la tabla `reposicion`."""
+    tabla = models.Reposicion.__table__
+    db.execute(delete(tabla))
+    columnas = list(resultado)
+    valores = [ids.tolist()] + [resultado[c].tolist() for c in columnas]
+    for inicio in range(0, len(ids), FILAS_POR_LOTE):
+        db.execute(insert(tabla), [
+            {"producto_id": fila[0], **dict(zip(columnas, fila[1:])), "calculado": calculado}
+            for fila in zip(*(v[inicio:inicio + FILAS_POR_LOTE] for v in valores))
+        ])
+    db.commit()
+    return len(ids)
+
+
+def ejecutar(db: Session, hasta: datetime = None) -> dict:
+    """Carga, calcula y guarda. Devuelve la cantidad de productos y el tiempo de cada etapa."""
+    hasta = hasta or datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    tiempos = {}
+
+    inicio = time.perf_counter()
+    ids, serie = cargar_series(db, hasta)
+    db.rollback()  # cierra la lectura antes de tomar el bloqueo de escritura
+    tiempos["carga"] = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    resultado = calcular(serie)
+    tiempos["calculo"] = time.perf_counter() - inicio
+
+    inicio = time.perf_counter()
+    guardar(db, ids, resultado, datetime.utcnow())
+    tiempos["guardado"] = time.perf_counter() - inicio
+    return {"productos": len(ids), "hasta": hasta, "segundos": tiempos}
+
+
+# =========================
+# 📌 Consulta
+# =========================
+def sugerencias(db: Session, categoria_id: int = None, solo_pedir: bool = False,
+                despues_de: int = 0, limite: int = 100):
+    """
+    Valores calculados junto al stock actual, paginados por producto_id.
+
+    La cantidad sugerida usa el stock del momento de la consulta, no el del
+    cálculo: pedir hasta el nivel objetivo si el stock está en o bajo el punto de reorden.
+    """
+    p, r = models.Producto, models.Reposicion
+    cantidad = case((p.stock_actual <= r.punto_reorden, r.nivel_objetivo - p.stock_actual), else_=0)
+    consulta = (
+        select(r.producto_id, p.nombre, p.categoria_id, p.stock_actual, p.stock_minimo,
+               r.demanda_diaria, r.desviacion, r.demanda_plazo, r.stock_seguridad,
+               r.punto_reorden, r.nivel_objetivo, cantidad.label("cantidad_sugerida"), r.calculado)
+        .join(p, p.id == r.producto_id)
+        .where(r.producto_id > despues_de)
+        .order_by(r.producto_id)
+        .limit(limite)
+    )
+    if categoria_id is not None:
+        consulta = consulta.where(p.categoria_id == categoria_id)
+    if solo_pedir:
+        consulta = consulta.where(p.stock_actual <= r.punto_reorden, r.nivel_objetivo > p.stock_actual)
+    filas = [dict(f._mapping) for f in db.execute(consulta)]
+    return {
+        "productos": filas,
+        "siguiente": filas[-1]["producto_id"] if len(filas) == limite else None,
+    }
+
+
+if __name__ == "__main__":
+    from .database import SessionLocal, sincronizar_esquema
+    from .archivo import sincronizar_archivos
+
+    sincronizar_esquema()
+    sincronizar_archivos()
+    db = SessionLocal()
+    try:
+        resumen = ejecutar(db)
+        etapas = ", ".join(f"{etapa} {s:.2f} s" for etapa, s in resumen["segundos"].items())
+        print(f"{resumen['productos']} productos hasta {resumen['hasta']:%Y-%m-%d} ({etapas})")
+    finally:
+        db.close()
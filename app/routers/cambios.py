@@ -0,0 +1,84 @@
+import json
+import time
+
+from fastapi import APIRouter, Header, Query, Request
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
+
+from .. import schemas
+from ..cambios import leer_cambios, notificador
+from ..database import SessionLocal
+
+router = APIRouter(
+    prefix="/cambios",
+    tags=["Cambios"],
+)
+
+# Cada cuánto se vuelve a consultar la base mientras se espera: los cambios
+# hechos por otros workers no disparan el aviso en proceso.
+INTERVALO_CONSULTA = 1.0
+LATIDO_SSE = 15.0
+
+
+def _consultar(desde: int, limite: int):
+    db = SessionLocal()
+    try:
+        return [schemas.Cambio.model_validate(c) for c in leer_cambios(db, desde, limite)]
+    finally:
+        db.close()
+
+
+# =========================
+# 📌 Feed con long-polling
+# =========================
+@router.get("/", response_model=schemas.FeedCambios)
+async def listar_cambios(
+        desde: int = 0,
+        limite: int = Query(100, ge=1, le=1000),
+        espera: float = Query(0, ge=0, le=60)  # segundos a esperar si no hay cambios
+):
+    limite_tiempo = time.monotonic() + espera
+    while True:
+        cambios = await run_in_threadpool(_consultar, desde, limite)
+        restante = limite_tiempo - time.monotonic()
+        if cambios or restante <= 0:
+            break
+        await notificador.esperar(min(restante, INTERVALO_CONSULTA))
+
+    return {"cambios": cambios, "ultimo": cambios[-1].seq if cambios else desde}
+
+
+# =========================
+# 📌 Feed por Server-Sent Events
+# =========================
+@router.get("/stream")
+async def stream_cambios(
+        request: Request,
+        desde: int = 0,
+        last_event_id: int = Header(None)
+):
+    # Al reconectar, el navegador envía Last-Event-ID con el último seq recibido
+    ultimo = last_event_id if last_event_id is not None else desde
+
+    async def eventos():
+        nonlocal ultimo
+        ultimo_envio = time.monotonic()
+        while not await request.is_disconnected():
+            cambios = await run_in_threadpool(_consultar, ultimo, 500)
+            for cambio in cambios:
+                datos = json.dumps(cambio.model_dump(mode="json"))
+                yield f"id: {cambio.seq}\nevent: cambio\ndata: {datos}\n\n"
+                ultimo = cambio.seq
+            if cambios:
+                ultimo_envio = time.monotonic()
+                continue
+            if time.monotonic() - ultimo_envio >= LATIDO_SSE:
+                yield ": latido\n\n"
+                ultimo_envio = time.monotonic()
+            await notificador.esperar(INTERVALO_CONSULTA)
+
+    return StreamingResponse(
+        eventos(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,20 +1,14 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from typing import List
-from .. import crud, models, schemas, database
+from .. import crud, models, schemas
+from ..database import get_db
 
 router = APIRouter(
     prefix="/categorias",
     tags=["Categorias"],
 )
 
-# Dependencia para obtener la sesión de BD
-def get_db():
-    db = database.SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
 
 # =========================
 # 📌 ENDPOINTS CATEGORÍA
@@ -0,0 +1,27 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+
+from .. import schemas, contadores
+from ..database import get_db
+
+router = APIRouter(
+    prefix="/dashboard",
+    tags=["Dashboard"],
+)
+
+
+# =========================
+# 📌 Resumen (contadores precalculados)
+# =========================
+@router.get("/", response_model=schemas.Dashboard)
+def obtener_dashboard(db: Session = Depends(get_db)):
+    return contadores.resumen(db)
+
+
+# =========================
+# 📌 Reconciliación
+# =========================
+@router.post("/reconciliar", response_model=schemas.ReconciliacionDashboard)
+def reconciliar_dashboard(db: Session = Depends(get_db)):
+    """Recalcula los contadores desde las tablas de origen."""
+    return contadores.reconciliar(db)
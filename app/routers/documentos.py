@@ -1,13 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from datetime import datetime
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
 from sqlalchemy.orm import Session
 from app.database import get_db
-from app import crud, schemas
+from app import crud, schemas, formatos
 from fastapi.responses import Response
-from reportlab.platypus import SimpleDocTemplate, Paragraph, Table, TableStyle, Spacer
-from reportlab.lib.pagesizes import A4
-from reportlab.lib import colors
-from reportlab.lib.styles import getSampleStyleSheet
-import io
+from app.pdf import pdf_documento, nombre_pdf
+from app.numeracion import NumeroDuplicado
 
 router = APIRouter(
     prefix="/documentos",
@@ -19,15 +19,49 @@ router = APIRouter(
 # =========================
 @router.post("/", response_model=schemas.Documento, status_code=status.HTTP_201_CREATED)
 def create_documento(documento: schemas.DocumentoCreate, db: Session = Depends(get_db)):
-    return crud.create_documento(db=db, documento=documento)
+    try:
+        return crud.create_documento(db=db, documento=documento)
+    except NumeroDuplicado as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 # =========================
 # 📌 Listar Documentos
 # =========================
 @router.get("/", response_model=list[schemas.Documento])
-def read_documentos(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+def read_documentos(request: Request, skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
+    # MessagePack / Arrow: una fila por línea de detalle con los datos de cabecera
+    formato = formatos.negociar(request)
+    if formato:
+        return formatos.responder(formato, db, crud.consulta_documentos_lineas(skip=skip, limit=limit))
     return crud.get_documentos(db, skip=skip, limit=limit)
 
+# =========================
+# 📌 Buscar Documentos
+# =========================
+@router.get("/search", response_model=schemas.BusquedaDocumentos)
+def buscar_documentos(
+    fecha_inicio: Optional[datetime] = None,
+    fecha_fin: Optional[datetime] = None,
+    operacion: Optional[str] = None,
+    cliente_id: Optional[int] = None,
+    proveedor_id: Optional[int] = None,
+    total_min: Optional[float] = None,
+    total_max: Optional[float] = None,
+    despues_de: Optional[str] = None,
+    limite: int = Query(50, ge=1, le=500),
+    db: Session = Depends(get_db)
+):
+    try:
+        return crud.buscar_documentos(
+            db, fecha_inicio=fecha_inicio, fecha_fin=fecha_fin, operacion=operacion,
+            cliente_id=cliente_id, proveedor_id=proveedor_id, total_min=total_min, total_max=total_max,
+            despues_de=despues_de, limite=limite,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 # =========================
 # 📌 Obtener Documento por ID
 # =========================
@@ -68,101 +102,10 @@ def generar_pdf(documento_id: int, db: Session = Depends(get_db)):
     if not db_documento:
         raise HTTPException(status_code=404, detail=f"Documento {documento_id} no encontrado")
 
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4)
-
-    # 🔑 Metadatos
-    doc.title = f"{db_documento.tipo} {db_documento.numero}"
-    doc.author = "Mi Sistema de Facturación"
-    doc.subject = f"Documento {db_documento.tipo}"
-    doc.keywords = "Factura, Boleta, Documento, Reporte"
-
-    styles = getSampleStyleSheet()
-    estilos = {
-        "titulo": styles["Title"],
-        "normal": styles["Normal"],
-        "negrita": styles["Heading3"],
-    }
-
-    elementos = []
-
-    # =========================
-    # Encabezado
-    # =========================
-    elementos.append(Paragraph("<b>SISTEMA DE FACTURACIÓN</b>", estilos["titulo"]))
-    elementos.append(Spacer(1, 12))
-    elementos.append(Paragraph(f"<b>{db_documento.tipo} {db_documento.numero}</b>", estilos["negrita"]))
-    elementos.append(Paragraph(f"Operación: {db_documento.operacion}", estilos["normal"]))
-    elementos.append(Spacer(1, 12))
-
-    # =========================
-    # Datos de Cliente y Proveedor
-    # =========================
-    data_info = []
-    if db_documento.cliente:
-        data_info.append(["Cliente:", db_documento.cliente.nombre])
-    if db_documento.proveedor:
-        data_info.append(["Proveedor:", db_documento.proveedor.nombre])
-
-    if data_info:
-        tabla_info = Table(data_info, colWidths=[100, 400])
-        tabla_info.setStyle(TableStyle([
-            ("BACKGROUND", (0, 0), (0, -1), colors.lightgrey),
-            ("ALIGN", (0, 0), (-1, -1), "LEFT"),
-            ("VALIGN", (0, 0), (-1, -1), "MIDDLE"),
-            ("FONTSIZE", (0, 0), (-1, -1), 10),
-            ("BOTTOMPADDING", (0, 0), (-1, -1), 6),
-        ]))
-        elementos.append(tabla_info)
-        elementos.append(Spacer(1, 12))
-
-    # =========================
-    # Tabla de Detalles
-    # =========================
-    data = [["Producto", "Cantidad", "Precio", "Subtotal"]]
-    total = 0
-    for det in db_documento.detalles:
-        precio = det.producto.precio_venta if db_documento.operacion == "VENTA" else det.producto.precio_compra
-        subtotal = det.cantidad * precio
-        total += subtotal
-        data.append([det.producto.nombre, det.cantidad, f"S/ {precio:.2f}", f"S/ {subtotal:.2f}"])
-    data.append(["", "", "TOTAL", f"S/ {total:.2f}"])
-
-    tabla = Table(data, colWidths=[200, 80, 100, 100])
-    tabla.setStyle(TableStyle([
-        # Cabecera
-        ("BACKGROUND", (0, 0), (-1, 0), colors.HexColor("#1E3A8A")),
-        ("TEXTCOLOR", (0, 0), (-1, 0), colors.white),
-        ("ALIGN", (0, 0), (-1, 0), "CENTER"),
-        ("FONTSIZE", (0, 0), (-1, 0), 11),
-        ("BOTTOMPADDING", (0, 0), (-1, 0), 8),
-
-        # Celdas
-        ("GRID", (0, 0), (-1, -2), 0.5, colors.grey),
-        ("ALIGN", (1, 1), (-1, -1), "CENTER"),
-        ("FONTSIZE", (0, 1), (-1, -1), 10),
-
-        # Totales
-        ("BACKGROUND", (-2, -1), (-1, -1), colors.lightgrey),
-        ("TEXTCOLOR", (-2, -1), (-1, -1), colors.black),
-        ("FONTSIZE", (-2, -1), (-1, -1), 11),
-        ("ALIGN", (-2, -1), (-1, -1), "RIGHT"),
-    ]))
-
-    elementos.append(tabla)
-    elementos.append(Spacer(1, 20))
-
-    # =========================
-    # Pie de página
-    # =========================
-    elementos.append(Paragraph("Gracias por su preferencia 🙌", estilos["normal"]))
-
-    doc.build(elementos)
-    pdf = buffer.getvalue()
-    buffer.close()
+    pdf = pdf_documento(db_documento)
 
     # Descargar con nombre
-    filename = f"{db_documento.tipo}_{db_documento.numero}.pdf"
+    filename = nombre_pdf(db_documento)
     headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
 
     return Response(content=pdf, media_type="application/pdf", headers=headers)
\ No newline at end of file
@@ -0,0 +1,16 @@
+from fastapi import APIRouter
+
+from .. import metricas
+
+router = APIRouter(
+    prefix="/metricas",
+    tags=["Métricas"],
+)
+
+
+# =========================
+# 📌 Métricas del proceso
+# =========================
+@router.get("/")
+def leer_metricas():
+    return metricas.resumen()
@@ -1,11 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
 from typing import List
 from datetime import datetime
+from sqlalchemy import select
 from sqlalchemy.orm import joinedload
 
-from .. import models, schemas
-from ..database import get_db
+from .. import crud, models, schemas, archivo, formatos
+from ..replica import get_db_lectura
+from ..database import get_db, escritura
 
 router = APIRouter(
     prefix="/movimientos",
@@ -16,73 +18,116 @@ router = APIRouter(
 # 📌 Crear Movimiento
 # =========================
 @router.post("/", response_model=schemas.Movimiento)
+@escritura
 def create_movimiento(movimiento: schemas.MovimientoCreate, db: Session = Depends(get_db)):
     producto = db.query(models.Producto).filter(models.Producto.id == movimiento.producto_id).first()
     if not producto:
         raise HTTPException(status_code=404, detail="Producto no encontrado")
 
     # Ajustar stock automáticamente
-    if movimiento.tipo == "entrada":
-        producto.stock_actual += movimiento.cantidad
-    elif movimiento.tipo == "salida":
-        if producto.stock_actual < movimiento.cantidad:
-            raise HTTPException(status_code=400, detail="Stock insuficiente")
-        producto.stock_actual -= movimiento.cantidad
-    else:
+    if movimiento.tipo not in ("entrada", "salida"):
         raise HTTPException(status_code=400, detail="Tipo de movimiento inválido")
+    if movimiento.tipo == "salida" and producto.stock_actual < movimiento.cantidad:
+        raise HTTPException(status_code=400, detail="Stock insuficiente")
 
-    db.add(producto)
-
-    db_movimiento = models.Movimiento(
-        producto_id=movimiento.producto_id,
-        tipo=movimiento.tipo,
-        cantidad=movimiento.cantidad,
-        fecha=datetime.utcnow()
-    )
-    db.add(db_movimiento)
+    db_movimiento = crud.registrar_movimiento(db, producto, movimiento.tipo, movimiento.cantidad)
     db.commit()
     db.refresh(db_movimiento)
     return db_movimiento
 
 
+# =========================
+# 📌 Lectura sobre datos calientes y archivados
+# =========================
+def _consulta(fuente, producto_id, tipo, fecha_inicio, fecha_fin, skip, limit):
+    stmt = select(fuente)
+    if producto_id is not None:
+        stmt = stmt.where(fuente.c.producto_id == producto_id)
+    if tipo:
+        stmt = stmt.where(fuente.c.tipo == tipo)
+    if fecha_inicio:
+        stmt = stmt.where(fuente.c.fecha >= fecha_inicio)
+    if fecha_fin:
+        stmt = stmt.where(fuente.c.fecha <= fecha_fin)
+    return stmt.order_by(fuente.c.id).offset(skip).limit(limit)
+
+
+def _leer_movimientos(
+        db: Session,
+        producto_id: int = None,
+        tipo: str = None,
+        fecha_inicio: datetime = None,
+        fecha_fin: datetime = None,
+        skip: int = 0,
+        limit: int = None
+):
+    """Consulta la tabla caliente y, solo si el rango de fechas lo requiere, las de archivo."""
+    fuente = archivo.fuente_movimientos(db, fecha_inicio, fecha_fin)
+
+    if fuente is models.Movimiento.__table__:
+        query = db.query(models.Movimiento).options(joinedload(models.Movimiento.producto))
+        if producto_id is not None:
+            query = query.filter(models.Movimiento.producto_id == producto_id)
+        if tipo:
+            query = query.filter(models.Movimiento.tipo == tipo)
+        if fecha_inicio:
+            query = query.filter(models.Movimiento.fecha >= fecha_inicio)
+        if fecha_fin:
+            query = query.filter(models.Movimiento.fecha <= fecha_fin)
+        return query.order_by(models.Movimiento.id).offset(skip).limit(limit).all()
+
+    filas = db.execute(_consulta(fuente, producto_id, tipo, fecha_inicio, fecha_fin, skip, limit)).mappings().all()
+
+    # Productos en una sola consulta (las tablas de archivo no tienen relación ORM)
+    ids = {f["producto_id"] for f in filas}
+    productos = {
+        p.id: p for p in db.query(models.Producto).filter(models.Producto.id.in_(ids)).all()
+    } if ids else {}
+    return [{**f, "producto": productos.get(f["producto_id"])} for f in filas]
+
+
 # =========================
 # 📌 Listar Movimientos
 # =========================
 @router.get("/", response_model=List[schemas.Movimiento])
-def get_movimientos(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    movimientos = (
-        db.query(models.Movimiento)
-        .options(joinedload(models.Movimiento.producto))  # 👈 aquí cargamos el producto
-        .offset(skip)
-        .limit(limit)
-        .all()
-    )
-    return movimientos
+def get_movimientos(
+        request: Request,
+        skip: int = 0,
+        limit: int = 100,
+        fecha_inicio: datetime = None,
+        fecha_fin: datetime = None,
+        db: Session = Depends(get_db)
+):
+    # MessagePack / Arrow: filas planas directamente de la consulta
+    formato = formatos.negociar(request)
+    if formato:
+        fuente = archivo.fuente_movimientos(db, fecha_inicio, fecha_fin)
+        return formatos.responder(formato, db, _consulta(fuente, None, None, fecha_inicio, fecha_fin, skip, limit))
+
+    return _leer_movimientos(db, fecha_inicio=fecha_inicio, fecha_fin=fecha_fin, skip=skip, limit=limit)
 
 
 # =========================
 # 📌 Obtener Movimientos por Producto
 # =========================
 @router.get("/producto/{producto_id}", response_model=List[schemas.Movimiento])
-def get_movimientos_producto(producto_id: int, db: Session = Depends(get_db)):
-    return db.query(models.Movimiento).filter(models.Movimiento.producto_id == producto_id).all()
+def get_movimientos_producto(
+        producto_id: int,
+        fecha_inicio: datetime = None,
+        fecha_fin: datetime = None,
+        db: Session = Depends(get_db)
+):
+    return _leer_movimientos(db, producto_id=producto_id, fecha_inicio=fecha_inicio, fecha_fin=fecha_fin)
 
 
 # =========================
-# 📌 Filtrar Movimientos por Fecha y Tipo
+# 📌 Filtrar Movimientos por Fecha y Tipo (réplica de lectura)
 # =========================
 @router.get("/reportes", response_model=List[schemas.Movimiento])
 def reporte_movimientos(
         tipo: str = None,  # "entrada" o "salida"
         fecha_inicio: datetime = None,
         fecha_fin: datetime = None,
-        db: Session = Depends(get_db)
+        db: Session = Depends(get_db_lectura)
 ):
-    query = db.query(models.Movimiento)
-    if tipo:
-        query = query.filter(models.Movimiento.tipo == tipo)
-    if fecha_inicio:
-        query = query.filter(models.Movimiento.fecha >= fecha_inicio)
-    if fecha_fin:
-        query = query.filter(models.Movimiento.fecha <= fecha_fin)
-    return query.all()
\ No newline at end of file
+    return _leer_movimientos(db, tipo=tipo, fecha_inicio=fecha_inicio, fecha_fin=fecha_fin)
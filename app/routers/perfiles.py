@@ -0,0 +1,43 @@
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import FileResponse
+
+from .. import perfil
+
+
+def _autorizar(x_perfil: Optional[str] = Header(None), token: Optional[str] = Query(None, alias="perfil")):
+    if not perfil.token_valido(x_perfil or token):
+        raise HTTPException(status_code=403, detail="Token de perfilado inválido")
+
+
+router = APIRouter(
+    prefix="/debug/profiles",
+    tags=["Perfilado"],
+    dependencies=[Depends(_autorizar)],
+)
+
+
+# =========================
+# 📌 Perfiles guardados
+# =========================
+@router.get("/")
+def listar_perfiles():
+    return perfil.listar()
+
+
+@router.get("/{perfil_id}")
+def leer_perfil(perfil_id: str):
+    resumen = perfil.leer(perfil_id)
+    if not resumen:
+        raise HTTPException(status_code=404, detail="Perfil no encontrado")
+    return resumen
+
+
+# Pilas en formato folded (flamegraph.pl, speedscope, inferno)
+@router.get("/{perfil_id}/folded")
+def descargar_perfil(perfil_id: str):
+    ruta = perfil.ruta_folded(perfil_id)
+    if not ruta:
+        raise HTTPException(status_code=404, detail="Perfil no encontrado")
+    return FileResponse(ruta, media_type="text/plain", filename=f"{perfil_id}.folded")
@@ -1,22 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from pydantic import ValidationError
 from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
 from typing import List
+import csv
+import hashlib
+import io
+import json
 
-from .. import crud, models, schemas, database
+from .. import crud, models, schemas, formatos, reposicion, conciliacion, disponibilidad
+from ..database import get_db
 
 router = APIRouter(
     prefix="/productos",
     tags=["Productos"]
 )
 
-# Dependencia para la BD
-def get_db():
-    db = database.SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 
 # =========================
 # 📌 Endpoints
@@ -29,26 +28,221 @@ def create_producto(producto: schemas.ProductoCreate, db: Session = Depends(get_
 
 # Listar productos
 @router.get("/", response_model=List[schemas.Producto])
-def get_productos(skip: int = 0, limit: int = 10, db: Session = Depends(get_db)):
+def get_productos(request: Request, skip: int = 0, limit: int = 10, db: Session = Depends(get_db)):
+    formato = formatos.negociar(request)  # MessagePack / Arrow
+    if formato:
+        return formatos.responder(formato, db, crud.consulta_productos(skip=skip, limit=limit))
     return crud.get_productos(db, skip=skip, limit=limit)
 
-# Obtener producto por ID
+# Reposición sugerida (calculada en lote: python -m app.reposicion)
+@router.get("/reposicion", response_model=schemas.Reposicion)
+def get_reposicion(
+    categoria_id: int = None,
+    solo_pedir: bool = False,
+    despues_de: int = 0,
+    limite: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db)
+):
+    return reposicion.sugerencias(db, categoria_id=categoria_id, solo_pedir=solo_pedir,
+                                  despues_de=despues_de, limite=limite)
+
+# Disponibilidad de un lote de productos desde la tabla en memoria (sin consultar la base)
+@router.post("/disponibilidad", response_model=schemas.Disponibilidad)
+async def get_disponibilidad(consulta: schemas.ConsultaDisponibilidad):
+    encontrados = disponibilidad.tabla.consultar(consulta.ids)
+    return {
+        "productos": [
+            {"producto_id": producto_id, "stock_actual": stock, "stock_minimo": minimo,
+             "precio_venta": precio, "disponible": stock > 0}
+            for producto_id, (stock, minimo, precio) in encontrados.items()
+        ],
+        "no_encontrados": [i for i in consulta.ids if i not in encontrados],
+    }
+
+# Productos cuyo stock no coincide con el neto de sus movimientos
+@router.get("/conciliacion", response_model=schemas.ConciliacionStock)
+def get_conciliacion(
+    despues_de: int = 0,
+    limite: int = Query(1000, ge=1, le=10000),
+    db: Session = Depends(get_db)
+):
+    return conciliacion.diferencias(db, despues_de=despues_de, limite=limite)
+
+# Conteo físico: ajusta el stock de todos los productos contados en una transacción
+@router.post("/conteo", response_model=schemas.ResultadoConteo)
+def conteo_fisico(conteo: schemas.ConteoFisico, db: Session = Depends(get_db)):
+    try:
+        return conciliacion.aplicar_conteo(db, [c.model_dump() for c in conteo.conteos])
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+# =========================
+# 📌 Carga masiva (sincronización de catálogo)
+# =========================
+LOTE_CARGA = 2000
+MAX_ERRORES_REPORTADOS = 100
+
+
+async def _lineas(request: Request):
+    """Recorre el cuerpo de la solicitud línea por línea, sin cargarlo completo en memoria."""
+    resto = b""
+    async for parte in request.stream():
+        resto += parte
+        *lineas, resto = resto.split(b"\n")
+        for linea in lineas:
+            yield linea.decode("utf-8-sig").rstrip("\r")
+    if resto:
+        yield resto.decode("utf-8-sig").rstrip("\r")
+
+
+async def _registros(request: Request, es_csv: bool):
+    """
+    Genera (número de línea, dict | error) a partir de CSV con cabecera o NDJSON.
+
+    En CSV un campo entre comillas puede contener saltos de línea: las líneas se
+    acumulan hasta que las comillas quedan cerradas (cantidad par de `"`, las
+    comillas escapadas `""` cuentan dos) y el registro se numera por su primera línea.
+    """
+    cabecera = None
+    numero = 0
+    pendiente, inicio, comillas = [], 0, 0   # líneas de un registro CSV con comillas abiertas
+    async for linea in _lineas(request):
+        numero += 1
+        if not es_csv:
+            if not linea.strip():
+                continue
+            try:
+                yield numero, json.loads(linea)
+            except json.JSONDecodeError as e:
+                yield numero, f"JSON inválido: {e.msg}"
+            continue
+        if not pendiente:
+            if not linea.strip():
+                continue
+            inicio, comillas = numero, 0
+        pendiente.append(linea)
+        comillas += linea.count('"')
+        if comillas % 2:
+            continue  # comillas abiertas: el campo sigue en la línea siguiente
+        valores = next(csv.reader(io.StringIO("\n".join(pendiente), newline="")))
+        pendiente = []
+        if cabecera is None:
+            cabecera = [c.strip() for c in valores]
+            continue
+        # En CSV las celdas vacías significan "sin valor"
+        yield inicio, {k: v for k, v in zip(cabecera, valores) if v != ""}
+    if pendiente:
+        yield inicio, "Comillas sin cerrar al final del archivo"
+
+
+@router.post("/bulk", response_model=schemas.ResumenCarga)
+async def bulk_productos(request: Request, db: Session = Depends(get_db)):
+    """Upsert por `codigo_barras` desde CSV (text/csv) o NDJSON (application/x-ndjson)."""
+    tipo = request.headers.get("content-type", "").split(";")[0].strip()
+    if tipo not in ("text/csv", "application/x-ndjson", "application/ndjson"):
+        raise HTTPException(status_code=415, detail="Use text/csv o application/x-ndjson")
+
+    # Categorías por nombre: se cargan una vez por carga
+    categorias = await run_in_threadpool(
+        lambda: {nombre.lower(): id_ for nombre, id_ in db.query(models.Categoria.nombre, models.Categoria.id)}
+    )
+    ids_categorias = set(categorias.values())
+    resumen = schemas.ResumenCarga()
+
+    def rechazar(linea: int, error: str):
+        resumen.rechazados += 1
+        if len(resumen.errores) < MAX_ERRORES_REPORTADOS:
+            resumen.errores.append(schemas.ErrorCarga(linea=linea, error=error))
+
+    async def guardar(lote: List[dict]):
+        insertados, actualizados, sin_cambios = await run_in_threadpool(crud.upsert_productos, db, lote)
+        resumen.insertados += insertados
+        resumen.actualizados += actualizados
+        resumen.sin_cambios += sin_cambios
+
+    lote = []
+    lineas_lote = {}  # codigo_barras -> línea, dentro del lote en curso
+    async for linea, registro in _registros(request, es_csv=tipo == "text/csv"):
+        if isinstance(registro, str):
+            rechazar(linea, registro)
+            continue
+        try:
+            fila = schemas.ProductoCarga.model_validate(registro)
+        except ValidationError as e:
+            rechazar(linea, "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()))
+            continue
+
+        categoria_id = fila.categoria_id
+        if categoria_id is None and fila.categoria:
+            categoria_id = categorias.get(fila.categoria.strip().lower())
+        if categoria_id not in ids_categorias:
+            rechazar(linea, f"Categoría no encontrada: {fila.categoria or fila.categoria_id or '(vacía)'}")
+            continue
+
+        if fila.codigo_barras in lineas_lote:
+            rechazar(linea, f"codigo_barras {fila.codigo_barras} repetido (línea {lineas_lote[fila.codigo_barras]})")
+            continue
+        lineas_lote[fila.codigo_barras] = linea
+        lote.append({**fila.model_dump(exclude={"categoria", "categoria_id"}), "categoria_id": categoria_id})
+        if len(lote) >= LOTE_CARGA:
+            await guardar(lote)
+            lote, lineas_lote = [], {}
+    if lote:
+        await guardar(lote)
+
+    return resumen
+
+# Actualización masiva (precios y atributos) en un solo UPDATE
+@router.patch("/bulk", response_model=schemas.ResultadoActualizacionMasiva)
+def bulk_actualizar_productos(actualizacion: schemas.ActualizacionMasiva, db: Session = Depends(get_db)):
+    try:
+        afectados = crud.actualizar_productos_masivo(db, filtro=actualizacion.filtro, cambios=actualizacion.cambios)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"afectados": afectados}
+
+# =========================
+# 📌 Endpoints por ID
+# =========================
+
+def _etag(db_producto: models.Producto) -> str:
+    """ETag derivado del contenido: cambia con cualquier escritura, incluida la masiva."""
+    contenido = schemas.Producto.model_validate(db_producto).model_dump_json()
+    return '"' + hashlib.sha1(contenido.encode()).hexdigest() + '"'
+
+# Obtener producto por ID (con ETag / If-None-Match)
 @router.get("/{producto_id}", response_model=schemas.Producto)
-def get_producto(producto_id: int, db: Session = Depends(get_db)):
+def get_producto(producto_id: int, request: Request, response: Response, db: Session = Depends(get_db)):
     db_producto = crud.get_producto(db, producto_id=producto_id)
     if not db_producto:
         raise HTTPException(status_code=404, detail="Producto no encontrado")
+
+    etag = _etag(db_producto)
+    candidatos = [e.strip().removeprefix("W/") for e in request.headers.get("if-none-match", "").split(",")]
+    if etag in candidatos or "*" in candidatos:
+        return Response(status_code=304, headers={"ETag": etag})
+    response.headers["ETag"] = etag
     return db_producto
 
+# Kardex del producto (saldo acumulado, paginado por id de movimiento)
+@router.get("/{producto_id}/kardex", response_model=schemas.Kardex)
+def get_kardex(
+    producto_id: int,
+    despues_de: int = 0,
+    limite: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db)
+):
+    kardex = crud.get_kardex(db, producto_id=producto_id, despues_de=despues_de, limite=limite)
+    if not kardex:
+        raise HTTPException(status_code=404, detail="Producto no encontrado")
+    return kardex
+
 # DELETE producto
 @router.delete("/{producto_id}", status_code=200)
 def delete_producto(producto_id: int, db: Session = Depends(get_db)):
-    db_producto = crud.get_producto(db, producto_id=producto_id)
+    db_producto = crud.delete_producto(db, producto_id=producto_id)
     if not db_producto:
         raise HTTPException(status_code=404, detail="Producto no encontrado")
-
-    db.delete(db_producto)
-    db.commit()
     return {"message": f"Producto con ID {producto_id} eliminado correctamente"}
 
 # PUT (actualización total)
@@ -2,7 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from typing import List
 from app import crud, schemas, models
-from app.database import get_db
+from app.database import get_db, escritura
 
 router = APIRouter(
     prefix="/proveedores",
@@ -36,6 +36,7 @@ def update_proveedor(proveedor_id: int, proveedor: schemas.ProveedorCreate, db:
     return db_proveedor
 
 @router.patch("/{proveedor_id}", response_model=schemas.Proveedor)
+@escritura
 def update_proveedor_partial(
     proveedor_id: int,
     proveedor_update: schemas.ProveedorUpdate,  # schema con todos los campos opcionales
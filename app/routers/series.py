@@ -0,0 +1,30 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from typing import List
+
+from .. import schemas, numeracion
+from ..database import get_db
+
+router = APIRouter(
+    prefix="/series",
+    tags=["Series de documentos"],
+)
+
+
+# =========================
+# 📌 Listar series
+# =========================
+@router.get("/", response_model=List[schemas.SerieDocumento])
+def listar_series(db: Session = Depends(get_db)):
+    return numeracion.listar(db)
+
+
+# =========================
+# 📌 Crear / configurar serie
+# =========================
+@router.put("/{tipo}/{serie}", response_model=schemas.SerieDocumento)
+def configurar_serie(tipo: str, serie: str, config: schemas.SerieDocumentoUpdate, db: Session = Depends(get_db)):
+    try:
+        return numeracion.configurar(db, tipo, serie, sin_huecos=config.sin_huecos, siguiente=config.siguiente)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
@@ -0,0 +1,64 @@
+import gzip
+import json
+from typing import Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from sqlalchemy.orm import Session
+
+from .. import schemas, catalogo
+from ..database import get_db
+
+router = APIRouter(
+    prefix="/sync",
+    tags=["Sincronización"],
+)
+
+# Por debajo de esto comprimir no compensa
+MINIMO_GZIP = 1024
+
+
+def _acepta_gzip(request: Request) -> bool:
+    """gzip aceptado en Accept-Encoding con q > 0 (explícito, o por `*` si gzip no figura)."""
+    calidades = {}
+    for parte in request.headers.get("accept-encoding", "").split(","):
+        codificacion, *parametros = [p.strip() for p in parte.split(";")]
+        calidad = 1.0
+        for parametro in parametros:
+            if parametro.startswith("q="):
+                try:
+                    calidad = float(parametro[2:])
+                except ValueError:
+                    calidad = 0.0
+        if codificacion:
+            calidades[codificacion.lower()] = calidad
+    return calidades.get("gzip", calidades.get("*", 0.0)) > 0
+
+
+# =========================
+# 📌 Delta del catálogo para terminales POS
+# =========================
+@router.get("/catalogo", responses={200: {"model": schemas.SyncCatalogo}})
+def sync_catalogo(
+    request: Request,
+    since: int = Query(0, ge=0),
+    limite: int = Query(5000, ge=1, le=50000),
+    cursor: Optional[str] = None,
+    db: Session = Depends(get_db),
+):
+    """
+    Categorías y productos cambiados desde la versión `since` (0 = catálogo
+    completo), ids eliminados en `bajas` y la versión nueva en `version`.
+    Si `hay_mas`, se pide la página siguiente con el mismo `since` y
+    `cursor=siguiente`; la `version` a guardar es la de la última página.
+    Con `Accept-Encoding: gzip` la respuesta va comprimida.
+    """
+    try:
+        resultado = catalogo.delta(db, since, limite=limite, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    cuerpo = json.dumps(resultado, ensure_ascii=False, separators=(",", ":")).encode()
+    headers = {"Vary": "Accept-Encoding"}
+    if len(cuerpo) >= MINIMO_GZIP and _acepta_gzip(request):
+        cuerpo = gzip.compress(cuerpo, compresslevel=6)
+        headers["Content-Encoding"] = "gzip"
+    return Response(cuerpo, media_type="application/json", headers=headers)
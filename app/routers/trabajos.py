@@ -0,0 +1,93 @@
+from fastapi import APIRouter, HTTPException, status
+from fastapi.responses import FileResponse
+from typing import List
+
+from .. import models, schemas, trabajos, reportes
+
+router = APIRouter(
+    prefix="/jobs",
+    tags=["Jobs"],
+)
+
+
+def _estado(trabajo: models.Trabajo) -> dict:
+    return {
+        "id": trabajo.id,
+        "tipo": trabajo.tipo,
+        "estado": trabajo.estado,
+        "progreso": trabajo.progreso,
+        "error": trabajo.error,
+        "creado": trabajo.creado,
+        "terminado": trabajo.terminado,
+        "resultado": f"{router.prefix}/{trabajo.id}/resultado" if trabajo.estado == trabajos.COMPLETADO else None,
+    }
+
+
+def _enviar(tipo: str, funcion, nombre_archivo: str, media_type: str, parametros: dict = None):
+    try:
+        trabajo = trabajos.enviar(tipo, funcion, nombre_archivo, media_type, parametros)
+    except trabajos.ColaLlena:
+        raise HTTPException(status_code=503, detail="Demasiados trabajos en cola, intente más tarde",
+                            headers={"Retry-After": "30"})
+    return _estado(trabajo)
+
+
+# =========================
+# 📌 Crear trabajos
+# =========================
+@router.post("/movimientos", response_model=schemas.Trabajo, status_code=status.HTTP_202_ACCEPTED)
+def trabajo_movimientos(parametros: schemas.TrabajoMovimientos):
+    return _enviar("movimientos", reportes.movimientos_csv, "movimientos.csv", "text/csv",
+                   parametros.model_dump())
+
+
+@router.post("/valorizacion", response_model=schemas.Trabajo, status_code=status.HTTP_202_ACCEPTED)
+def trabajo_valorizacion():
+    return _enviar("valorizacion", reportes.valorizacion_csv, "valorizacion.csv", "text/csv")
+
+
+@router.post("/exportacion", response_model=schemas.Trabajo, status_code=status.HTTP_202_ACCEPTED)
+def trabajo_exportacion(parametros: schemas.TrabajoExportacion):
+    """Parquet de documentos, detalles y movimientos por mes (ZIP)."""
+    return _enviar("exportacion", reportes.exportacion_parquet_zip, "exportacion.zip", "application/zip",
+                   parametros.model_dump())
+
+
+@router.post("/documentos-pdf", response_model=schemas.Trabajo, status_code=status.HTTP_202_ACCEPTED)
+def trabajo_documentos_pdf(parametros: schemas.TrabajoDocumentosPdf):
+    return _enviar("documentos_pdf", reportes.documentos_pdf_zip, "documentos.zip", "application/zip",
+                   {"ids": parametros.ids})
+
+
+# =========================
+# 📌 Estado, resultado y cancelación
+# =========================
+@router.get("/", response_model=List[schemas.Trabajo])
+def listar_trabajos():
+    return [_estado(t) for t in trabajos.listar()]
+
+
+@router.get("/{trabajo_id}", response_model=schemas.Trabajo)
+def obtener_trabajo(trabajo_id: str):
+    trabajo = trabajos.obtener(trabajo_id)
+    if not trabajo:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado o vencido")
+    return _estado(trabajo)
+
+
+@router.get("/{trabajo_id}/resultado")
+def descargar_resultado(trabajo_id: str):
+    trabajo = trabajos.obtener(trabajo_id)
+    if not trabajo:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado o vencido")
+    if trabajo.estado != trabajos.COMPLETADO:
+        raise HTTPException(status_code=409, detail=f"El trabajo está {trabajo.estado}")
+    return FileResponse(trabajo.ruta, media_type=trabajo.media_type, filename=trabajo.nombre_archivo)
+
+
+@router.delete("/{trabajo_id}", response_model=schemas.Trabajo)
+def cancelar_trabajo(trabajo_id: str):
+    trabajo = trabajos.cancelar(trabajo_id)
+    if not trabajo:
+        raise HTTPException(status_code=404, detail="Trabajo no encontrado o vencido")
+    return _estado(trabajo)
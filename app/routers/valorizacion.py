@@ -0,0 +1,51 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy.orm import Session
+from typing import List
+
+from .. import schemas, valorizacion, contadores
+from ..database import get_db, escritura
+from ..replica import get_db_lectura
+
+router = APIRouter(
+    prefix="/valorizacion",
+    tags=["Valorización"],
+)
+
+
+# =========================
+# 📌 Valor por producto
+# =========================
+@router.get("/productos/{producto_id}", response_model=schemas.ValorizacionProducto)
+def valorizar_producto(producto_id: int, db: Session = Depends(get_db)):
+    resultado = valorizacion.valorizar_producto(db, producto_id)
+    if not resultado:
+        raise HTTPException(status_code=404, detail="Producto no encontrado")
+    return resultado
+
+
+# =========================
+# 📌 Valor por categoría (réplica de lectura)
+# =========================
+@router.get("/categorias", response_model=List[schemas.ValorizacionCategoria])
+def valorizar_categorias(db: Session = Depends(get_db_lectura)):
+    return valorizacion.valorizar_categorias(db)
+
+
+@router.get("/categorias/{categoria_id}", response_model=schemas.ValorizacionCategoria)
+def valorizar_categoria(categoria_id: int, db: Session = Depends(get_db_lectura)):
+    resultado = valorizacion.valorizar_categorias(db, categoria_id=categoria_id)
+    if not resultado:
+        raise HTTPException(status_code=404, detail="Categoría no encontrada o sin productos")
+    return resultado[0]
+
+
+# =========================
+# 📌 Reconstrucción (auditoría)
+# =========================
+@router.post("/reconstruir")
+@escritura
+def reconstruir_valorizacion(db: Session = Depends(get_db)):
+    resumen = valorizacion.reconstruir(db)
+    contadores.recalcular_productos(db)  # el valor del stock depende del costo promedio
+    db.commit()
+    return resumen
@@ -1,5 +1,7 @@
+import json
 from pydantic import BaseModel, EmailStr, validator, field_validator
-from typing import Optional, List
+from typing import Optional, List, Union
+from datetime import datetime
 
 # =========================
 # 📌 Categoria
@@ -61,6 +63,63 @@ class Producto(ProductoBase):
     class Config:
         from_attributes = True
 
+# Fila de carga masiva (POST /productos/bulk): la categoría puede venir por nombre
+class ProductoCarga(BaseModel):
+    codigo_barras: str
+    nombre: str
+    precio_compra: float
+    precio_venta: float
+    stock_actual: int = 0
+    stock_minimo: int = 0
+    unidad_medida: str = "unidad"
+    categoria: Optional[str] = None
+    categoria_id: Optional[int] = None
+
+class ErrorCarga(BaseModel):
+    linea: int
+    error: str
+
+class ResumenCarga(BaseModel):
+    insertados: int = 0
+    actualizados: int = 0
+    sin_cambios: int = 0   # códigos existentes con los mismos datos: no se escriben
+    rechazados: int = 0
+    errores: List[ErrorCarga] = []  # primeros errores, para diagnóstico
+
+# Actualización masiva (PATCH /productos/bulk): un solo UPDATE con filtro y expresiones
+CAMPOS_NUMERICOS_MASIVOS = ["precio_compra", "precio_venta", "stock_minimo"]
+CAMPOS_MASIVOS = CAMPOS_NUMERICOS_MASIVOS + ["unidad_medida", "categoria_id"]
+
+class FiltroProductos(BaseModel):
+    categoria_id: Optional[int] = None
+    ids: Optional[List[int]] = None
+    prefijo_codigo: Optional[str] = None  # prefijo de codigo_barras
+
+class ExpresionProducto(BaseModel):
+    campo: str
+    operacion: str  # "set", "add" o "porcentaje"
+    valor: Union[int, float, str]
+    redondeo: Optional[int] = None  # decimales del resultado
+
+    @field_validator('campo')
+    def campo_valido(cls, v):
+        if v not in CAMPOS_MASIVOS:
+            raise ValueError(f"campo debe ser uno de {CAMPOS_MASIVOS}")
+        return v
+
+    @field_validator('operacion')
+    def operacion_valida(cls, v):
+        if v.lower() not in ["set", "add", "porcentaje"]:
+            raise ValueError("operacion debe ser 'set', 'add' o 'porcentaje'")
+        return v.lower()
+
+class ActualizacionMasiva(BaseModel):
+    filtro: FiltroProductos
+    cambios: List[ExpresionProducto]
+
+class ResultadoActualizacionMasiva(BaseModel):
+    afectados: int
+
 
 # =========================
 # 📌 Proveedor
@@ -149,6 +208,8 @@ class DocumentoBase(BaseModel):
     proveedor_id: Optional[int] = None
 
 class DocumentoCreate(DocumentoBase):
+    numero: Optional[str] = None  # sin número: lo asigna el servidor según tipo y serie
+    serie: Optional[str] = None   # por defecto la inicial del tipo + "001" (B001, F001)
     operacion: str  # "COMPRA" o "VENTA"
     detalles: List[DocumentoDetalleCreate]
 
@@ -185,16 +246,36 @@ class DocumentoUpdate(BaseModel):
 class Documento(DocumentoBase):
     id: int
     operacion: str
+    fecha: Optional[datetime] = None
+    subtotal: Optional[float] = None
+    impuesto: Optional[float] = None
+    total: Optional[float] = None
+    lineas: Optional[int] = None
     detalles: List[DocumentoDetalle] = []
 
     class Config:
         from_attributes = True
 
+# Búsqueda: solo cabecera con totales (sin detalles)
+class DocumentoCabecera(DocumentoBase):
+    id: int
+    operacion: str
+    fecha: Optional[datetime] = None
+    subtotal: Optional[float] = None
+    impuesto: Optional[float] = None
+    total: Optional[float] = None
+    lineas: Optional[int] = None
+
+    class Config:
+        from_attributes = True
+
+class BusquedaDocumentos(BaseModel):
+    documentos: List[DocumentoCabecera]
+    siguiente: Optional[str] = None  # valor de `despues_de` para la siguiente página
+
 # =========================
 # 📌 Movimiento
 # =========================
-from datetime import datetime
-
 class MovimientoBase(BaseModel):
     producto_id: int
     tipo: str  # "entrada" o "salida"
@@ -206,7 +287,280 @@ class MovimientoCreate(MovimientoBase):
 class Movimiento(MovimientoBase):
     id: int
     fecha: datetime
+    documento_id: Optional[int] = None
+    costo_unitario: Optional[float] = None
     producto: Optional[Producto]  # 👈 Esto incluye el producto completo
 
     class Config:
         from_attributes = True
+
+
+# =========================
+# 📌 Cambio (feed)
+# =========================
+class Cambio(BaseModel):
+    seq: int
+    entidad: str
+    entidad_id: int
+    operacion: str
+    fecha: datetime
+    datos: Optional[dict] = None
+
+    @field_validator('datos', mode='before')
+    def datos_json(cls, v):
+        return json.loads(v) if isinstance(v, str) else v
+
+    class Config:
+        from_attributes = True
+
+class FeedCambios(BaseModel):
+    cambios: List[Cambio]
+    ultimo: int  # seq a usar como `desde` en la siguiente consulta
+
+
+# =========================
+# 📌 Valorización
+# =========================
+class ValorizacionProducto(BaseModel):
+    producto_id: int
+    nombre: str
+    cantidad: int
+    costo_promedio: float
+    valor: float
+
+class ValorizacionCategoria(BaseModel):
+    categoria_id: int
+    nombre: str
+    productos: int
+    cantidad: int
+    valor: float
+
+
+# =========================
+# 📌 Kardex
+# =========================
+class KardexLinea(BaseModel):
+    movimiento_id: int
+    fecha: Optional[datetime] = None
+    tipo: str
+    entrada: int
+    salida: int
+    saldo: int
+    costo_unitario: Optional[float] = None
+    costo_total: Optional[float] = None
+    documento_id: Optional[int] = None
+    documento_tipo: Optional[str] = None
+    documento_numero: Optional[str] = None
+    operacion: Optional[str] = None
+
+class Kardex(BaseModel):
+    producto_id: int
+    nombre: str
+    lineas: List[KardexLinea]
+    siguiente: Optional[int] = None  # valor de `despues_de` para la siguiente página
+
+
+# =========================
+# 📌 Reposición
+# =========================
+class ReposicionProducto(BaseModel):
+    producto_id: int
+    nombre: str
+    categoria_id: int
+    stock_actual: int
+    stock_minimo: int
+    demanda_diaria: float
+    desviacion: float
+    demanda_plazo: float
+    stock_seguridad: float
+    punto_reorden: int
+    nivel_objetivo: int
+    cantidad_sugerida: int  # con el stock actual
+    calculado: datetime
+
+class Reposicion(BaseModel):
+    productos: List[ReposicionProducto]
+    siguiente: Optional[int] = None  # valor de `despues_de` para la siguiente página
+
+
+# =========================
+# 📌 Disponibilidad (tabla en memoria)
+# =========================
+class ConsultaDisponibilidad(BaseModel):
+    ids: List[int]
+
+    @field_validator('ids')
+    def ids_validos(cls, v):
+        if not v:
+            raise ValueError("Debe indicar al menos un producto")
+        if len(v) > 1000:
+            raise ValueError("Máximo 1000 productos por consulta")
+        return v
+
+class DisponibilidadProducto(BaseModel):
+    producto_id: int
+    stock_actual: int
+    stock_minimo: int
+    precio_venta: float
+    disponible: bool  # stock_actual > 0
+
+class Disponibilidad(BaseModel):
+    productos: List[DisponibilidadProducto]
+    no_encontrados: List[int]
+
+# =========================
+# 📌 Conciliación de stock y conteo físico
+# =========================
+class DiferenciaStock(BaseModel):
+    producto_id: int
+    nombre: str
+    stock_actual: int
+    stock_esperado: int  # entradas menos salidas registradas
+    diferencia: int
+
+class ConciliacionStock(BaseModel):
+    con_diferencia: int
+    unidades_sobrantes: int
+    unidades_faltantes: int
+    productos: List[DiferenciaStock]
+    siguiente: Optional[int] = None  # valor de `despues_de` para la siguiente página
+
+class ConteoProducto(BaseModel):
+    producto_id: int
+    cantidad: int
+
+    @field_validator('cantidad')
+    def cantidad_valida(cls, v):
+        if v < 0:
+            raise ValueError("La cantidad contada no puede ser negativa")
+        return v
+
+class ConteoFisico(BaseModel):
+    conteos: List[ConteoProducto]
+
+    @field_validator('conteos')
+    def conteos_validos(cls, v):
+        if not v:
+            raise ValueError("Debe indicar al menos un producto")
+        if len(v) > 50000:
+            raise ValueError("Máximo 50000 productos por conteo")
+        return v
+
+class AjusteConteo(BaseModel):
+    producto_id: int
+    anterior: int
+    contado: int
+    diferencia: int
+
+class ResultadoConteo(BaseModel):
+    contados: int
+    ajustados: int
+    unidades_entrada: int
+    unidades_salida: int
+    ajustes: List[AjusteConteo]
+
+
+# =========================
+# 📌 Trabajos (reportes en segundo plano)
+# =========================
+class TrabajoMovimientos(BaseModel):
+    tipo: Optional[str] = None  # "entrada" o "salida"
+    fecha_inicio: Optional[datetime] = None
+    fecha_fin: Optional[datetime] = None
+
+class TrabajoExportacion(BaseModel):
+    fecha_inicio: datetime  # inclusive
+    fecha_fin: datetime     # exclusiva
+
+    @field_validator('fecha_fin')
+    def rango_valido(cls, v, info):
+        if 'fecha_inicio' in info.data and v <= info.data['fecha_inicio']:
+            raise ValueError("fecha_fin debe ser posterior a fecha_inicio")
+        return v
+
+class TrabajoDocumentosPdf(BaseModel):
+    ids: List[int]
+
+    @field_validator('ids')
+    def ids_validos(cls, v):
+        if not v:
+            raise ValueError("Debe indicar al menos un documento")
+        if len(v) > 5000:
+            raise ValueError("Máximo 5000 documentos por trabajo")
+        return v
+
+class Trabajo(BaseModel):
+    id: str
+    tipo: str
+    estado: str  # pendiente, en_curso, completado, fallido, cancelado
+    progreso: float
+    error: Optional[str] = None
+    creado: datetime
+    terminado: Optional[datetime] = None
+    resultado: Optional[str] = None  # URL de descarga cuando está completado
+
+
+# =========================
+# 📌 Dashboard
+# =========================
+class Dashboard(BaseModel):
+    fecha: str  # día (UTC) de los totales "hoy"
+    valor_stock: float
+    unidades: int
+    bajo_stock: int
+    ventas_hoy: float
+    compras_hoy: float
+    documentos_hoy: int
+
+class ReconciliacionDashboard(BaseModel):
+    antes: Dashboard
+    despues: Dashboard
+
+
+# =========================
+# 📌 Series de documentos
+# =========================
+class SerieDocumentoUpdate(BaseModel):
+    sin_huecos: Optional[bool] = None
+    siguiente: Optional[int] = None  # solo puede avanzar
+
+class SerieDocumento(BaseModel):
+    tipo: str
+    serie: str
+    siguiente: int
+    sin_huecos: bool
+    por_defecto: Optional[bool] = None
+
+    class Config:
+        from_attributes = True
+
+
+# =========================
+# 📌 Sincronización del catálogo
+# =========================
+class CategoriaSync(CategoriaBase):
+    id: int
+    version: int
+
+class ProductoSync(BaseModel):
+    id: int
+    codigo_barras: Optional[str] = None
+    nombre: str
+    precio_compra: float
+    precio_venta: float
+    stock_minimo: int
+    unidad_medida: str
+    categoria_id: int
+    version: int
+
+class BajasSync(BaseModel):
+    categorias: List[int]
+    productos: List[int]
+
+class SyncCatalogo(BaseModel):
+    version: int  # usar como `since` en la próxima sincronización (la de la última página)
+    categorias: List[CategoriaSync]
+    productos: List[ProductoSync]
+    bajas: BajasSync
+    hay_mas: bool
+    siguiente: Optional[str] = None  # `cursor` de la página siguiente
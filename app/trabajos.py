@@ -0,0 +1,265 @@
+"""
+Trabajos en segundo plano para reportes largos.
+
+`enviar()` registra el trabajo y lo encola en un pool de hilos de tamaño fijo
+(`TRABAJOS_CONCURRENTES`); como máximo se aceptan `TRABAJOS_MAX_PENDIENTES`
+trabajos sin terminar. Cada trabajo escribe su resultado en un archivo de
+`TRABAJOS_DIR` y reporta su avance con `avance(fraccion)`, que además lanza
+`Cancelado` si se pidió cancelarlo. Los trabajos terminados (y sus archivos)
+se eliminan `TRABAJOS_TTL` segundos después de finalizar.
+
+El estado de cada trabajo vive en la tabla `trabajos`, así cualquier worker
+responde la consulta, la descarga o la cancelación; `TRABAJOS_DIR` debe ser un
+directorio compartido por los workers. El worker que ejecuta el trabajo
+escribe el progreso como máximo cada `AVANCE_INTERVALO` segundos y en esa
+misma escritura ve si otro worker pidió cancelarlo. Un trabajo sin terminar
+cuyo worker no lo actualiza en `TRABAJOS_TTL` segundos (el proceso se detuvo)
+se descarta.
+"""
+import logging
+import os
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Dict, Optional
+
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.orm import Session
+
+from . import metricas, models
+from .database import SessionLocal, escritura
+
+logger = logging.getLogger(__name__)
+
+TRABAJOS_CONCURRENTES = int(os.getenv("TRABAJOS_CONCURRENTES", "2"))
+TRABAJOS_MAX_PENDIENTES = int(os.getenv("TRABAJOS_MAX_PENDIENTES", "20"))
+TRABAJOS_TTL = float(os.getenv("TRABAJOS_TTL", "3600"))   # segundos que se conserva un resultado
+TRABAJOS_DIR = os.getenv("TRABAJOS_DIR", os.path.join(tempfile.gettempdir(), "inventario_trabajos"))
+AVANCE_INTERVALO = 1.0  # segundos entre escrituras del progreso
+
+PENDIENTE = "pendiente"
+EN_CURSO = "en_curso"
+COMPLETADO = "completado"
+FALLIDO = "fallido"
+CANCELADO = "cancelado"
+TERMINADOS = (COMPLETADO, FALLIDO, CANCELADO)
+
+
+class Cancelado(Exception):
+    pass
+
+
+class ColaLlena(Exception):
+    pass
+
+
+class _Ejecucion:
+    """Lado del worker que ejecuta el trabajo: evento de cancelación y futuro del pool."""
+
+    def __init__(self, trabajo_id: str, tipo: str, ruta: str):
+        self.id = trabajo_id
+        self.tipo = tipo
+        self.ruta = ruta
+        self._cancelar = threading.Event()
+        self._futuro = None
+        self._escrito = 0.0
+
+    def avance(self, fraccion: float):
+        """Actualiza el progreso (0 a 1). Lanza Cancelado si se pidió cancelar."""
+        if self._cancelar.is_set():
+            raise Cancelado()
+        ahora = time.monotonic()
+        if ahora - self._escrito < AVANCE_INTERVALO:
+            return
+        self._escrito = ahora
+        if _guardar(self.id, progreso=round(min(max(fraccion, 0.0), 1.0), 4)):
+            self._cancelar.set()
+            raise Cancelado()
+
+
+_lock = threading.Lock()
+_ejecuciones: Dict[str, _Ejecucion] = {}   # trabajos de este worker aún sin terminar
+_pool = ThreadPoolExecutor(max_workers=TRABAJOS_CONCURRENTES, thread_name_prefix="trabajo")
+_tabla = models.Trabajo.__table__
+
+
+def _contar(estado: str) -> int:
+    with SessionLocal() as db:
+        return db.execute(select(func.count()).where(_tabla.c.estado == estado)).scalar()
+
+
+metricas.registrar_medidor("trabajos_pendientes", lambda: _contar(PENDIENTE))
+metricas.registrar_medidor("trabajos_en_curso", lambda: _contar(EN_CURSO))
+
+
+# =========================
+# 📌 Registro en la base
+# =========================
+@escritura
+def _actualizar(db: Session, trabajo_id: str, valores: dict) -> bool:
+    fila = db.execute(
+        update(_tabla).where(_tabla.c.id == trabajo_id)
+        .values(actualizado=time.time(), **valores)
+        .returning(_tabla.c.cancelar)
+    ).first()
+    db.commit()
+    return fila is None or fila[0]
+
+
+def _guardar(trabajo_id: str, **valores) -> bool:
+    """Escribe el estado del trabajo. Devuelve True si se pidió cancelarlo (o ya no existe)."""
+    with SessionLocal() as db:
+        return _actualizar(db, trabajo_id, valores)
+
+
+def _finalizar(trabajo_id: str, estado: str, error: str = None):
+    valores = {"estado": estado, "error": error, "terminado": datetime.utcnow(), "vence": time.time() + TRABAJOS_TTL}
+    if estado == COMPLETADO:
+        valores["progreso"] = 1.0
+    _guardar(trabajo_id, **valores)
+
+
+@escritura
+def _registrar(db: Session, trabajo: models.Trabajo):
+    activos = db.execute(select(func.count()).where(_tabla.c.estado.not_in(TERMINADOS))).scalar()
+    if activos >= TRABAJOS_MAX_PENDIENTES:
+        raise ColaLlena()
+    db.add(trabajo)
+    db.commit()
+    db.refresh(trabajo)
+
+
+# =========================
+# 📌 Ejecución
+# =========================
+def _ejecutar(ejecucion: _Ejecucion, funcion: Callable, parametros: dict):
+    inicio = time.perf_counter()
+    estado, error = CANCELADO, None
+    try:
+        if ejecucion._cancelar.is_set() or _guardar(ejecucion.id, estado=EN_CURSO):
+            return
+        funcion(ejecucion.ruta, ejecucion.avance, **parametros)
+        estado = COMPLETADO
+    except Cancelado:
+        pass
+    except Exception as e:
+        logger.exception("Falló el trabajo %s (%s)", ejecucion.id, ejecucion.tipo)
+        estado, error = FALLIDO, str(e)
+    finally:
+        if estado != COMPLETADO and os.path.exists(ejecucion.ruta):
+            os.remove(ejecucion.ruta)
+        with _lock:
+            _ejecuciones.pop(ejecucion.id, None)
+        _finalizar(ejecucion.id, estado, error)
+        metricas.observar(f"trabajo_{ejecucion.tipo}", time.perf_counter() - inicio)
+        metricas.incrementar(f"trabajos_{estado}")
+
+
+def enviar(tipo: str, funcion: Callable, nombre_archivo: str, media_type: str, parametros: dict = None) -> models.Trabajo:
+    """
+    Encola `funcion(ruta_resultado, avance, **parametros)`. Lanza ColaLlena si ya
+    hay TRABAJOS_MAX_PENDIENTES trabajos sin terminar (en todos los workers).
+    """
+    purgar()
+    trabajo_id = uuid.uuid4().hex
+    trabajo = models.Trabajo(
+        id=trabajo_id, tipo=tipo, estado=PENDIENTE, progreso=0.0, creado=datetime.utcnow(),
+        nombre_archivo=nombre_archivo, media_type=media_type,
+        ruta=os.path.join(TRABAJOS_DIR, f"{trabajo_id}_{nombre_archivo}"),
+        cancelar=False, actualizado=time.time(),
+    )
+    with SessionLocal() as db:
+        _registrar(db, trabajo)
+    os.makedirs(TRABAJOS_DIR, exist_ok=True)
+    ejecucion = _Ejecucion(trabajo.id, tipo, trabajo.ruta)
+    with _lock:
+        _ejecuciones[trabajo.id] = ejecucion
+    ejecucion._futuro = _pool.submit(_ejecutar, ejecucion, funcion, parametros or {})
+    return trabajo
+
+
+def obtener(trabajo_id: str) -> Optional[models.Trabajo]:
+    purgar()
+    with SessionLocal() as db:
+        return db.get(models.Trabajo, trabajo_id)
+
+
+def listar():
+    purgar()
+    with SessionLocal() as db:
+        return db.query(models.Trabajo).order_by(models.Trabajo.creado.desc()).all()
+
+
+def cancelar(trabajo_id: str) -> Optional[models.Trabajo]:
+    """Cancela un trabajo pendiente o en curso; uno terminado se elimina con su resultado."""
+    trabajo = obtener(trabajo_id)
+    if trabajo is None:
+        return None
+    if trabajo.estado in TERMINADOS:
+        _eliminar(trabajo)
+        return trabajo
+    with _lock:
+        ejecucion = _ejecuciones.get(trabajo_id)
+    if ejecucion is None:
+        # Lo ejecuta otro worker: lo verá en su próxima escritura del progreso
+        _guardar(trabajo_id, cancelar=True)
+        return obtener(trabajo_id)
+    ejecucion._cancelar.set()
+    if ejecucion._futuro.cancel():  # aún no había empezado
+        with _lock:
+            _ejecuciones.pop(trabajo_id, None)
+        _finalizar(trabajo_id, CANCELADO)
+    return obtener(trabajo_id)
+
+
+# =========================
+# 📌 Vencimiento
+# =========================
+@escritura
+def _borrar(db: Session, ids: list):
+    db.execute(delete(_tabla).where(_tabla.c.id.in_(ids)))
+    db.commit()
+
+
+def _eliminar(trabajo: models.Trabajo):
+    with SessionLocal() as db:
+        _borrar(db, [trabajo.id])
+    if os.path.exists(trabajo.ruta):
+        os.remove(trabajo.ruta)
+
+
+def purgar():
+    """
+    Elimina los trabajos terminados cuyo resultado ya venció y los que quedaron
+    sin terminar porque su worker se detuvo.
+    """
+    ahora = time.time()
+    with SessionLocal() as db:
+        vencidos = db.execute(
+            select(_tabla.c.id, _tabla.c.ruta).where(
+                (_tabla.c.vence <= ahora)
+                | (_tabla.c.estado.not_in(TERMINADOS) & (_tabla.c.actualizado <= ahora - TRABAJOS_TTL))
+            )
+        ).all()
+        if not vencidos:
+            return
+        db.rollback()  # el borrado abre su propia transacción de escritura
+        _borrar(db, [v.id for v in vencidos])
+    for vencido in vencidos:
+        if os.path.exists(vencido.ruta):
+            os.remove(vencido.ruta)
+
+
+def detener():
+    """Al apagar el proceso: cancela sus trabajos sin terminar (los resultados quedan para los demás workers)."""
+    with _lock:
+        ejecuciones = list(_ejecuciones.values())
+    for ejecucion in ejecuciones:
+        ejecucion._cancelar.set()
+    _pool.shutdown(wait=False, cancel_futures=True)
+    for ejecucion in ejecuciones:
+        if ejecucion._futuro.cancelled():
+            _finalizar(ejecucion.id, CANCELADO)
@@ -0,0 +1,220 @@
+"""
+Valorización del inventario por costo promedio ponderado.
+
+Se guarda solo el costo promedio vigente de cada producto (`costos_producto`).
+El valor del stock es `stock_actual * costo_promedio`, por lo que sigue siendo
+correcto aunque el stock se edite directamente. Productos sin registro se
+valorizan a su `precio_compra`.
+
+Reglas (las mismas en la actualización incremental y en la reconstrucción):
+  - entrada con costo propio (compras): recalcula el promedio
+        (existencia * promedio + cantidad * costo) / (existencia + cantidad)
+    o toma el costo de la compra si la existencia previa es <= 0.
+  - salidas y entradas sin costo propio (devoluciones, ajustes): al promedio
+    vigente, sin modificarlo.
+"""
+from datetime import datetime
+
+from sqlalchemy import select, update, union_all, literal, func, case, bindparam
+from sqlalchemy.orm import Session
+
+from . import models, archivo, cambios
+
+LOTE_ACTUALIZACION = 5000
+
+
+def _siguiente_promedio(promedio: float, existencia: int, tipo: str, cantidad: int, costo_entrada: float = None):
+    """Devuelve (costo aplicado al movimiento, nuevo promedio)."""
+    if tipo == "salida" or costo_entrada is None:
+        return promedio, promedio
+    if existencia > 0:
+        return costo_entrada, (existencia * promedio + cantidad * costo_entrada) / (existencia + cantidad)
+    return costo_entrada, costo_entrada
+
+
+# =========================
+# 📌 Actualización incremental
+# =========================
+def costo_promedio(db: Session, producto: models.Producto) -> float:
+    registro = db.get(models.CostoProducto, producto.id)
+    return registro.costo_promedio if registro else producto.precio_compra
+
+
+def precargar_costos(db: Session, productos: list) -> list:
+    """
+    Carga en la sesión el registro de costo de cada producto, creando al
+    `precio_compra` los que faltan (mismo promedio que sin registro), para que
+    los movimientos en lote no consulten ni hagan flush producto por producto.
+
+    El mapa de identidad de la sesión guarda referencias débiles: hay que
+    conservar la lista devuelta mientras se registran los movimientos.
+    """
+    ids = [p.id for p in productos]
+    registros = []
+    for inicio in range(0, len(ids), LOTE_ACTUALIZACION):
+        lote = ids[inicio:inicio + LOTE_ACTUALIZACION]
+        registros += db.query(models.CostoProducto).filter(models.CostoProducto.producto_id.in_(lote)).all()
+    existentes = {r.producto_id for r in registros}
+    nuevos = [
+        models.CostoProducto(producto_id=p.id, costo_promedio=p.precio_compra)
+        for p in productos if p.id not in existentes
+    ]
+    db.add_all(nuevos)
+    db.flush()
+    return registros + nuevos
+
+
+def aplicar_movimiento(db: Session, producto: models.Producto, tipo: str, cantidad: int, costo_entrada: float = None) -> float:
+    """
+    Actualiza el costo promedio del producto por un movimiento (sin commit).
+
+    Debe llamarse antes de modificar `stock_actual`. Devuelve el costo unitario
+    aplicado al movimiento.
+    """
+    registro = db.get(models.CostoProducto, producto.id)
+    promedio = registro.costo_promedio if registro else producto.precio_compra
+    costo, nuevo_promedio = _siguiente_promedio(promedio, producto.stock_actual, tipo, cantidad, costo_entrada)
+
+    if registro is None:
+        registro = models.CostoProducto(producto_id=producto.id, costo_promedio=nuevo_promedio)
+        db.add(registro)
+        db.flush()  # un mismo producto puede repetirse en el documento
+    registro.costo_promedio = nuevo_promedio
+    registro.actualizado = datetime.utcnow()
+    return costo
+
+
+# =========================
+# 📌 Consultas
+# =========================
+def costo_sql():
+    return func.coalesce(models.CostoProducto.costo_promedio, models.Producto.precio_compra)
+
+
+def valorizar_producto(db: Session, producto_id: int):
+    costo = costo_sql()
+    fila = (
+        db.query(models.Producto.id, models.Producto.nombre, models.Producto.stock_actual, costo)
+        .outerjoin(models.CostoProducto, models.CostoProducto.producto_id == models.Producto.id)
+        .filter(models.Producto.id == producto_id)
+        .first()
+    )
+    if not fila:
+        return None
+    return {
+        "producto_id": fila[0],
+        "nombre": fila[1],
+        "cantidad": fila[2],
+        "costo_promedio": fila[3],
+        "valor": fila[2] * fila[3],
+    }
+
+
+def valorizar_categorias(db: Session, categoria_id: int = None):
+    cantidad = func.sum(models.Producto.stock_actual)
+    valor = func.sum(models.Producto.stock_actual * costo_sql())
+    query = (
+        db.query(models.Categoria.id, models.Categoria.nombre, func.count(models.Producto.id), cantidad, valor)
+        .join(models.Producto, models.Producto.categoria_id == models.Categoria.id)
+        .outerjoin(models.CostoProducto, models.CostoProducto.producto_id == models.Producto.id)
+        .group_by(models.Categoria.id, models.Categoria.nombre)
+        .order_by(models.Categoria.id)
+    )
+    if categoria_id is not None:
+        query = query.filter(models.Categoria.id == categoria_id)
+    return [
+        {"categoria_id": f[0], "nombre": f[1], "productos": f[2], "cantidad": f[3] or 0, "valor": f[4] or 0.0}
+        for f in query.all()
+    ]
+
+
+# =========================
+# 📌 Reconstrucción completa (auditoría)
+# =========================
+def reconstruir(db: Session) -> dict:
+    """
+    Recalcula desde cero el costo promedio de todos los productos y el
+    `costo_unitario` de cada movimiento (tabla caliente y archivos).
+
+    La existencia inicial de cada producto es `stock_actual` menos el neto de
+    sus movimientos, valorizada a `precio_compra`. Las entradas a costo propio
+    (`costo_propio`, las de compras) conservan el `costo_unitario` con que se
+    registraron: no dependen del documento, que pudo editarse o eliminarse
+    después. No hace commit.
+
+    Los movimientos anteriores a `costo_propio` (NULL) se consideran a costo
+    propio si son entradas de un documento de COMPRA que aún existe; si además
+    no tienen `costo_unitario`, toman el precio de su línea.
+
+    Los `costo_unitario` se reescriben con UPDATE de Core: cada movimiento cuyo
+    costo cambia se registra como "update" en el feed de cambios.
+    """
+    tablas = archivo.tablas_para_rango(db) + [models.Movimiento.__table__]
+    todos = union_all(*[
+        select(t.c.id, t.c.producto_id, t.c.tipo, t.c.cantidad, t.c.fecha, t.c.documento_id,
+               t.c.costo_unitario, t.c.costo_propio, literal(t.name).label("tabla"))
+        for t in tablas
+    ]).subquery()
+
+    neto = func.sum(case((todos.c.tipo == "entrada", todos.c.cantidad), else_=-todos.c.cantidad))
+    netos = dict(db.execute(select(todos.c.producto_id, neto).group_by(todos.c.producto_id)).all())
+    productos = {
+        p.id: (p.stock_actual, p.precio_compra)
+        for p in db.query(models.Producto.id, models.Producto.stock_actual, models.Producto.precio_compra)
+    }
+
+    propio = case(
+        (todos.c.costo_propio.is_not(None), todos.c.costo_propio),
+        else_=models.Documento.operacion == "COMPRA",
+    )
+    precio_linea = (
+        select(func.max(models.DetalleDocumento.precio_unitario))
+        .where(models.DetalleDocumento.documento_id == todos.c.documento_id,
+               models.DetalleDocumento.producto_id == todos.c.producto_id)
+        .scalar_subquery()
+    )
+    costo_registrado = case((todos.c.costo_unitario.is_not(None), todos.c.costo_unitario), else_=precio_linea)
+    movimientos = db.execute(
+        select(todos, propio.label("propio"), costo_registrado.label("costo_registrado"))
+        .outerjoin(models.Documento, models.Documento.id == todos.c.documento_id)
+        .order_by(todos.c.fecha, todos.c.id)
+        .execution_options(yield_per=LOTE_ACTUALIZACION)
+    )
+
+    estado = {}  # producto_id -> [existencia, promedio]
+    pendientes = {t.name: [] for t in tablas}
+    columnas = [c.name for c in models.Movimiento.__table__.columns]
+    modificados = []  # filas completas de los movimientos cuyo costo cambia, para el feed
+    for m in movimientos:
+        if m.producto_id not in productos:
+            continue
+        if m.producto_id not in estado:
+            stock, precio_compra = productos[m.producto_id]
+            estado[m.producto_id] = [stock - netos.get(m.producto_id, 0), precio_compra]
+        existencia, promedio = estado[m.producto_id]
+
+        costo_entrada = m.costo_registrado if m.tipo == "entrada" and m.propio else None
+        costo, promedio = _siguiente_promedio(promedio, existencia, m.tipo, m.cantidad, costo_entrada)
+        existencia += m.cantidad if m.tipo == "entrada" else -m.cantidad
+        estado[m.producto_id] = [existencia, promedio]
+        pendientes[m.tabla].append({"b_id": m.id, "b_costo": costo})
+        if costo != m.costo_unitario:
+            modificados.append({**{c: getattr(m, c) for c in columnas}, "costo_unitario": costo})
+
+    # Costo aplicado a cada movimiento
+    for tabla in tablas:
+        filas = pendientes[tabla.name]
+        stmt = update(tabla).where(tabla.c.id == bindparam("b_id")).values(costo_unitario=bindparam("b_costo"))
+        for i in range(0, len(filas), LOTE_ACTUALIZACION):
+            db.connection().execute(stmt, filas[i:i + LOTE_ACTUALIZACION])
+    for i in range(0, len(modificados), LOTE_ACTUALIZACION):
+        cambios.anotar(db, "movimiento", "update", modificados[i:i + LOTE_ACTUALIZACION])
+
+    # Costo promedio vigente
+    db.query(models.CostoProducto).delete()
+    ahora = datetime.utcnow()
+    db.add_all([
+        models.CostoProducto(producto_id=producto_id, costo_promedio=promedio, actualizado=ahora)
+        for producto_id, (_, promedio) in estado.items()
+    ])
+    return {"productos": len(estado), "movimientos": sum(len(f) for f in pendientes.values())}
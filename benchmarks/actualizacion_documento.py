@@ -0,0 +1,99 @@
+"""
+Costo de `crud.update_documento` según la cantidad de líneas modificadas.
+
+Crea un documento de N líneas en una base SQLite temporal y lo actualiza
+cambiando k cantidades. Mide el tiempo y las filas escritas por actualización.
+
+Uso:
+    python -m benchmarks.actualizacion_documento --lineas 300
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+from app import crud, models, schemas
+
+
+def preparar(lineas: int):
+    ruta = os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = create_engine(f"sqlite:///{ruta}")
+    models.Base.metadata.create_all(bind=engine)
+    Sesion = sessionmaker(bind=engine, autoflush=False)
+
+    db = Sesion()
+    db.add(models.Categoria(nombre="Bench"))
+    db.flush()
+    db.add_all([
+        models.Producto(nombre=f"P{i}", precio_compra=1.0, precio_venta=2.0,
+                        stock_actual=1_000_000, stock_minimo=0, unidad_medida="unidad", categoria_id=1)
+        for i in range(lineas)
+    ])
+    db.commit()
+    db.close()
+    return engine, Sesion
+
+
+def contar_escrituras(engine):
+    """Cuenta filas afectadas por INSERT/UPDATE/DELETE."""
+    contador = {"filas": 0}
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _despues(conn, cursor, statement, parameters, context, executemany):
+        verbo = statement.lstrip().split(" ", 1)[0]
+        if verbo == "INSERT":
+            # Con RETURNING el rowcount de sqlite3 no es confiable: se cuentan las tuplas de VALUES
+            filas_sql = statement.split("VALUES", 1)[-1].count("(")
+            if executemany and parameters and isinstance(parameters[0], (tuple, list, dict)):
+                filas_sql *= len(parameters)
+            contador["filas"] += filas_sql
+        elif verbo in ("UPDATE", "DELETE"):
+            contador["filas"] += max(cursor.rowcount, 0)
+
+    return contador
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lineas", type=int, default=300)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    args = parser.parse_args()
+
+    engine, Sesion = preparar(args.lineas)
+    contador = contar_escrituras(engine)
+
+    cantidades = [1] * args.lineas
+    db = Sesion()
+    documento = crud.create_documento(db, schemas.DocumentoCreate(
+        tipo="Factura", numero="BENCH-1", operacion="VENTA",
+        detalles=[{"producto_id": i + 1, "cantidad": c} for i, c in enumerate(cantidades)],
+    ))
+    documento_id = documento.id
+    db.close()
+
+    print(f"{'cambiadas':>10} {'ms (mediana)':>14} {'filas escritas':>16}")
+    for cambiadas in sorted({0, 1, 10, args.lineas // 10, args.lineas // 2, args.lineas}):
+        tiempos, filas = [], []
+        for _ in range(args.repeticiones):
+            for i in range(cambiadas):
+                cantidades[i] += 1
+            payload = schemas.DocumentoUpdateFull(
+                tipo="Factura", numero="BENCH-1", operacion="VENTA",
+                detalles=[{"producto_id": i + 1, "cantidad": c} for i, c in enumerate(cantidades)],
+            )
+            db = Sesion()
+            contador["filas"] = 0
+            inicio = time.perf_counter()
+            crud.update_documento(db, documento_id, payload)
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+            filas.append(contador["filas"])
+            db.close()
+        print(f"{cambiadas:>10} {statistics.median(tiempos):>14.2f} {statistics.median(filas):>16}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+"""
+Prueba de carga con tráfico mixto de punto de venta sobre la app en proceso.
+
+Usuarios concurrentes (asyncio + httpx.ASGITransport, sin red) repiten
+operaciones elegidas al azar según la mezcla:
+
+  consulta        GET /productos/{id}                    (cajas buscando productos)
+  disponibilidad  POST /productos/disponibilidad, 50 ids (tienda en línea)
+  venta           POST /documentos/ (VENTA, 1 a 5 líneas)
+  movimiento      POST /movimientos/ (entrada manual)     (almacén)
+  reporte         GET /movimientos/reportes, /valorizacion/categorias, /dashboard/
+  pdf             GET /documentos/{id}/pdf
+
+Para cada cantidad de usuarios de --usuarios se corre un tramo de --duracion
+segundos y se informa el throughput, la latencia (p50/p95/p99/máx) por clase,
+los 503 del control de admisión y la espera por el bloqueo de escritura de
+SQLite. Subiendo los usuarios se ve dónde se satura la configuración (la que
+se pase por variables de entorno: ADMISION_*, POOL_*, SQLITE_BUSY_TIMEOUT...).
+
+Uso:
+    python -m benchmarks.carga_pos --usuarios 4,16,64 --duracion 20
+    python -m benchmarks.carga_pos --mezcla consulta=70,venta=25,pdf=5
+    python -m benchmarks.carga_pos --mezcla consulta=40,disponibilidad=40,venta=20
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+MEZCLA = "consulta=50,venta=20,movimiento=10,reporte=10,pdf=10"
+
+
+def _mezcla(texto: str) -> dict:
+    pesos = {}
+    for parte in texto.split(","):
+        clase, peso = parte.split("=")
+        if clase not in OPERACIONES:
+            raise argparse.ArgumentTypeError(f"Clase desconocida: {clase} (use {', '.join(OPERACIONES)})")
+        pesos[clase] = float(peso)
+    return pesos
+
+
+def _percentil(ordenados: list, p: float) -> float:
+    if not ordenados:
+        return 0.0
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+# =========================
+# 📌 Datos iniciales
+# =========================
+def preparar(productos: int, documentos: int):
+    from app import crud, models, schemas
+    from app.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        db.add(models.Categoria(nombre="Carga"))
+        db.flush()
+        db.add_all([
+            models.Producto(nombre=f"P{i}", codigo_barras=f"775{i:010d}", precio_compra=1.0, precio_venta=2.0,
+                            stock_actual=10_000_000, stock_minimo=5, unidad_medida="unidad", categoria_id=1)
+            for i in range(productos)
+        ])
+        db.commit()
+        for _ in range(documentos):
+            crud.create_documento(db, schemas.DocumentoCreate(tipo="Boleta", operacion="VENTA", detalles=[
+                {"producto_id": random.randint(1, productos), "cantidad": random.randint(1, 3)}
+                for _ in range(random.randint(1, 10))
+            ]))
+    finally:
+        db.close()
+
+
+# =========================
+# 📌 Operaciones
+# =========================
+class Estado:
+    def __init__(self, productos: int, documentos: int):
+        self.productos = productos
+        self.documentos = documentos
+
+
+async def _consulta(cliente, estado):
+    return await cliente.get(f"/productos/{random.randint(1, estado.productos)}")
+
+
+async def _disponibilidad(cliente, estado):
+    ids = [random.randint(1, estado.productos) for _ in range(50)]
+    return await cliente.post("/productos/disponibilidad", json={"ids": ids})
+
+
+async def _venta(cliente, estado):
+    respuesta = await cliente.post("/documentos/", json={
+        "tipo": "Boleta", "operacion": "VENTA",
+        "detalles": [
+            {"producto_id": random.randint(1, estado.productos), "cantidad": random.randint(1, 3)}
+            for _ in range(random.randint(1, 5))
+        ],
+    })
+    if respuesta.status_code == 201:
+        estado.documentos = max(estado.documentos, respuesta.json()["id"])
+    return respuesta
+
+
+async def _movimiento(cliente, estado):
+    return await cliente.post("/movimientos/", json={
+        "producto_id": random.randint(1, estado.productos), "tipo": "entrada", "cantidad": random.randint(1, 20),
+    })
+
+
+async def _reporte(cliente, estado):
+    ruta = random.choice(["movimientos", "valorizacion", "dashboard"])
+    if ruta == "movimientos":
+        desde = (datetime.utcnow() - timedelta(minutes=1)).isoformat()
+        return await cliente.get("/movimientos/reportes", params={"tipo": "salida", "fecha_inicio": desde})
+    if ruta == "valorizacion":
+        return await cliente.get("/valorizacion/categorias")
+    return await cliente.get("/dashboard/")
+
+
+async def _pdf(cliente, estado):
+    return await cliente.get(f"/documentos/{random.randint(1, estado.documentos)}/pdf")
+
+
+OPERACIONES = {
+    "consulta": _consulta,
+    "disponibilidad": _disponibilidad,
+    "venta": _venta,
+    "movimiento": _movimiento,
+    "reporte": _reporte,
+    "pdf": _pdf,
+}
+
+
+# =========================
+# 📌 Tramo de carga
+# =========================
+async def _usuario(cliente, estado, clases, pesos, fin, resultados):
+    while time.monotonic() < fin:
+        clase = random.choices(clases, weights=pesos)[0]
+        inicio = time.perf_counter()
+        try:
+            respuesta = await OPERACIONES[clase](cliente, estado)
+            codigo = respuesta.status_code
+        except Exception:  # noqa: BLE001 - se cuenta como error de la clase
+            codigo = 0
+        duracion = time.perf_counter() - inicio
+        r = resultados.setdefault(clase, {"latencias": [], "rechazadas": 0, "errores": 0})
+        if codigo == 503:
+            r["rechazadas"] += 1
+        elif codigo == 0 or codigo >= 400:
+            r["errores"] += 1
+        else:
+            r["latencias"].append(duracion)
+
+
+async def tramo(app, estado, usuarios: int, duracion: float, mezcla: dict) -> dict:
+    import httpx
+    from app import metricas
+
+    metricas.reiniciar()
+    clases, pesos = list(mezcla), list(mezcla.values())
+    resultados = {}
+    transporte = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transporte, base_url="http://carga", timeout=120) as cliente:
+        fin = time.monotonic() + duracion
+        inicio = time.perf_counter()
+        await asyncio.gather(*[
+            _usuario(cliente, estado, clases, pesos, fin, resultados) for _ in range(usuarios)
+        ])
+        transcurrido = time.perf_counter() - inicio
+    resumen = metricas.resumen()
+    return {
+        "segundos": transcurrido,
+        "clases": resultados,
+        "espera_bloqueo": resumen["tiempos"].get("sqlite_espera_bloqueo", {}),
+        "reintentos": resumen["contadores"].get("sqlite_reintentos", 0),
+        "espera_pool": resumen["tiempos"].get("pool_espera", {}),
+    }
+
+
+def imprimir(usuarios: int, r: dict):
+    total = sum(len(c["latencias"]) for c in r["clases"].values())
+    print(f"\n== {usuarios} usuarios: {total / r['segundos']:.1f} ops/s en {r['segundos']:.1f} s")
+    print(f"{'clase':>14} {'ops':>7} {'ops/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'máx ms':>8} {'503':>5} {'error':>5}")
+    for clase in OPERACIONES:
+        c = r["clases"].get(clase)
+        if not c:
+            continue
+        lat = sorted(x * 1000 for x in c["latencias"])
+        print(f"{clase:>14} {len(lat):>7} {len(lat) / r['segundos']:>8.1f} {_percentil(lat, 50):>8.1f} "
+              f"{_percentil(lat, 95):>8.1f} {_percentil(lat, 99):>8.1f} {(lat[-1] if lat else 0):>8.1f} "
+              f"{c['rechazadas']:>5} {c['errores']:>5}")
+    bloqueo = r["espera_bloqueo"]
+    print(f"bloqueo SQLite: {bloqueo.get('conteo', 0)} esperas, total {bloqueo.get('total_s', 0):.2f} s, "
+          f"máx {bloqueo.get('max_s', 0) * 1000:.1f} ms, {r['reintentos']:.0f} reintentos | "
+          f"espera pool: máx {r['espera_pool'].get('max_s', 0) * 1000:.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--usuarios", default="4,16,64", help="cantidades de usuarios concurrentes, una por tramo")
+    parser.add_argument("--duracion", type=float, default=15, help="segundos por tramo")
+    parser.add_argument("--mezcla", type=_mezcla, default=MEZCLA, help=f"pesos por clase (por defecto {MEZCLA})")
+    parser.add_argument("--productos", type=int, default=5000)
+    parser.add_argument("--documentos", type=int, default=200, help="documentos iniciales (PDFs)")
+    parser.add_argument("--base", help="archivo SQLite (por defecto uno temporal nuevo)")
+    args = parser.parse_args()
+    mezcla = args.mezcla  # argparse también aplica _mezcla al valor por defecto
+
+    # La app lee DATABASE_URL al importarse
+    ruta = args.base or os.path.join(tempfile.mkdtemp(), "carga.db")
+    nueva = not os.path.exists(ruta)
+    os.environ["DATABASE_URL"] = f"sqlite:///{ruta}"
+    from app.main import app
+
+    if nueva:
+        preparar(args.productos, args.documentos)
+    estado = Estado(args.productos, args.documentos)
+    print(f"base: {ruta} | mezcla: {', '.join(f'{c}={p:g}' for c, p in mezcla.items())}")
+
+    for usuarios in (int(u) for u in args.usuarios.split(",")):
+        imprimir(usuarios, asyncio.run(tramo(app, estado, usuarios, args.duracion, mezcla)))
+
+
+if __name__ == "__main__":
+    main()
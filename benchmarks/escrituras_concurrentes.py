@@ -0,0 +1,138 @@
+"""
+Prueba de estrés de escrituras concurrentes desde varios procesos.
+
+Simula varios workers de Uvicorn creando ventas sobre el mismo archivo SQLite
+y compara:
+  - directo: configuración anterior (engine sin eventos, journal por defecto,
+    BEGIN diferido del driver, sin reintentos)
+  - escritura: engine de la app (WAL) y crud.create_documento con @escritura
+    (BEGIN IMMEDIATE + reintentos)
+
+Uso:
+    python -m benchmarks.escrituras_concurrentes --procesos 8 --operaciones 200
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+
+def _worker(ruta: str, modo: str, numero: int, operaciones: int, productos: int, busy_timeout: float, cola):
+    os.environ["DATABASE_URL"] = f"sqlite:///{ruta}"
+    os.environ["SQLITE_BUSY_TIMEOUT"] = str(busy_timeout)
+
+    import random
+    from sqlalchemy import create_engine
+    from sqlalchemy.exc import OperationalError
+    from sqlalchemy.orm import sessionmaker
+    from app import crud, metricas, schemas
+    from app.database import SessionLocal
+
+    if modo == "escritura":
+        crear = crud.create_documento
+    else:
+        def crear(db, documento):
+            return crud._insertar_documento.__wrapped__(db, documento, documento.numero, None)
+        SessionLocal = sessionmaker(
+            autoflush=False,
+            bind=create_engine(os.environ["DATABASE_URL"],
+                               connect_args={"check_same_thread": False, "timeout": busy_timeout}),
+        )
+    ok = errores = 0
+    for i in range(operaciones):
+        documento = schemas.DocumentoCreate(
+            tipo="Boleta", numero=f"{modo}-{numero}-{i}", operacion="VENTA",
+            detalles=[{"producto_id": random.randint(1, productos), "cantidad": 1} for _ in range(3)],
+        )
+        db = SessionLocal()
+        try:
+            crear(db, documento)
+            ok += 1
+        except OperationalError:
+            db.rollback()
+            errores += 1
+        finally:
+            db.close()
+
+    resumen = metricas.resumen()
+    espera = resumen["tiempos"].get("sqlite_espera_bloqueo", {}).get("total_s", 0.0)
+    cola.put((ok, errores, resumen["contadores"].get("sqlite_reintentos", 0), espera))
+
+
+def preparar(ruta: str, modo: str, productos: int):
+    os.environ["DATABASE_URL"] = f"sqlite:///{ruta}"
+    import sqlite3
+    from app import models
+    from app.database import SessionLocal, engine, sincronizar_esquema
+
+    sincronizar_esquema()
+    db = SessionLocal()
+    db.add(models.Categoria(nombre="Stress"))
+    db.flush()
+    db.add_all([
+        models.Producto(nombre=f"P{i}", precio_compra=1.0, precio_venta=2.0, stock_actual=10_000,
+                        stock_minimo=0, unidad_medida="unidad", categoria_id=1)
+        for i in range(productos)
+    ])
+    db.commit()
+    db.close()
+    engine.dispose()
+
+    if modo == "directo":
+        conexion = sqlite3.connect(ruta)
+        conexion.execute("PRAGMA journal_mode=DELETE")
+        conexion.close()
+
+
+def correr(modo: str, procesos: int, operaciones: int, productos: int, busy_timeout: float) -> dict:
+    ruta = os.path.join(tempfile.mkdtemp(), "stress.db")
+    contexto = multiprocessing.get_context("spawn")
+    preparacion = contexto.Process(target=preparar, args=(ruta, modo, productos))
+    preparacion.start()
+    preparacion.join()
+
+    cola = contexto.Queue()
+    workers = [
+        contexto.Process(target=_worker, args=(ruta, modo, n, operaciones, productos, busy_timeout, cola))
+        for n in range(procesos)
+    ]
+    inicio = time.perf_counter()
+    for w in workers:
+        w.start()
+    resultados = [cola.get() for _ in workers]
+    for w in workers:
+        w.join()
+    duracion = time.perf_counter() - inicio
+
+    ok = sum(r[0] for r in resultados)
+    errores = sum(r[1] for r in resultados)
+    return {
+        "modo": modo,
+        "ok": ok,
+        "errores": errores,
+        "tasa_error": errores / (ok + errores),
+        "docs_por_s": ok / duracion,
+        "reintentos": int(sum(r[2] for r in resultados)),
+        "espera_bloqueo_s": sum(r[3] for r in resultados),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--procesos", type=int, default=8)
+    parser.add_argument("--operaciones", type=int, default=200)
+    parser.add_argument("--productos", type=int, default=50)
+    parser.add_argument("--busy-timeout", type=float, default=0.2,
+                        help="timeout de SQLite (s) para ambos modos; más bajo = más contención visible")
+    args = parser.parse_args()
+
+    print(f"{'modo':>10} {'ok':>6} {'errores':>8} {'% error':>8} {'docs/s':>8} {'reintentos':>11} {'espera s':>9}")
+    for modo in ("directo", "escritura"):
+        r = correr(modo, args.procesos, args.operaciones, args.productos, args.busy_timeout)
+        print(f"{r['modo']:>10} {r['ok']:>6} {r['errores']:>8} {r['tasa_error'] * 100:>7.1f}% "
+              f"{r['docs_por_s']:>8.1f} {r['reintentos']:>11} {r['espera_bloqueo_s']:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
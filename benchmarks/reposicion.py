@@ -0,0 +1,102 @@
+"""
+Tiempo del cálculo de reposición (app/reposicion.py) sobre un catálogo grande.
+
+Crea una base SQLite temporal con N productos y salidas aleatorias en la
+ventana del cálculo, y mide por separado la carga (consulta agrupada + matriz),
+el cálculo vectorizado y el guardado de la tabla `reposicion`. Con --comparar
+mide también el mismo cálculo con un bucle por producto en Python puro.
+
+Uso:
+    python -m benchmarks.reposicion --productos 200000
+"""
+import argparse
+import math
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import models, reposicion
+
+
+def preparar(productos: int, salidas_por_producto: int, hasta: datetime):
+    ruta = os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = create_engine(f"sqlite:///{ruta}")
+    models.Base.metadata.create_all(bind=engine)
+
+    random.seed(7)
+    desde = hasta - timedelta(days=reposicion.DIAS)
+    conexion = engine.raw_connection()
+    try:
+        cursor = conexion.cursor()
+        cursor.execute("INSERT INTO categorias (id, nombre) VALUES (1, 'Bench')")
+        cursor.executemany(
+            "INSERT INTO productos (id, nombre, precio_compra, precio_venta, stock_actual, stock_minimo, unidad_medida, categoria_id)"
+            " VALUES (?, ?, 1.0, 2.0, ?, 0, 'unidad', 1)",
+            ((i, f"P{i}", random.randint(0, 200)) for i in range(1, productos + 1)),
+        )
+        # En orden cronológico, como llegan en producción (el id crece con la fecha)
+        segundos = reposicion.DIAS * 86400
+        salidas = sorted(
+            (random.randrange(segundos), p, random.randint(1, 10))
+            for p in range(1, productos + 1)
+            for _ in range(random.randint(0, 2 * salidas_por_producto))
+        )
+        cursor.executemany(
+            "INSERT INTO movimientos (producto_id, tipo, cantidad, fecha) VALUES (?, 'salida', ?, ?)",
+            ((p, cantidad, str(desde + timedelta(seconds=s))) for s, p, cantidad in salidas),
+        )
+        conexion.commit()
+    finally:
+        conexion.close()
+    return engine, sessionmaker(bind=engine, autoflush=False)
+
+
+def calcular_por_producto(serie, plazo=reposicion.PLAZO, cobertura=reposicion.COBERTURA, z=reposicion.Z_SERVICIO):
+    """Referencia: el mismo cálculo que reposicion.calcular, producto por producto."""
+    resultado = []
+    for fila in serie.tolist():
+        demanda = statistics.fmean(fila)
+        desviacion = statistics.stdev(fila)
+        punto_reorden = math.ceil(demanda * plazo + z * desviacion * math.sqrt(plazo))
+        resultado.append((demanda, desviacion, punto_reorden, math.ceil(punto_reorden + demanda * cobertura)))
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--productos", type=int, default=200_000)
+    parser.add_argument("--salidas-por-producto", type=int, default=10, help="promedio en la ventana")
+    parser.add_argument("--comparar", action="store_true", help="mide también el bucle por producto")
+    args = parser.parse_args()
+
+    hasta = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    inicio = time.perf_counter()
+    engine, Sesion = preparar(args.productos, args.salidas_por_producto, hasta)
+    with engine.connect() as conn:
+        movimientos = conn.exec_driver_sql("SELECT COUNT(*) FROM movimientos").scalar()
+    print(f"base: {args.productos} productos, {movimientos} salidas ({time.perf_counter() - inicio:.1f} s)")
+
+    db = Sesion()
+    try:
+        resumen = reposicion.ejecutar(db, hasta)
+        for etapa, segundos in resumen["segundos"].items():
+            print(f"{etapa:>10}: {segundos * 1000:>9.1f} ms")
+        print(f"{'total':>10}: {sum(resumen['segundos'].values()) * 1000:>9.1f} ms")
+
+        if args.comparar:
+            _, serie = reposicion.cargar_series(db, hasta)
+            inicio = time.perf_counter()
+            calcular_por_producto(serie)
+            print(f"{'bucle':>10}: {(time.perf_counter() - inicio) * 1000:>9.1f} ms (cálculo por producto en Python)")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
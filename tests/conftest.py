@@ -0,0 +1,84 @@
+"""
+Configuración común: la app se importa contra una base SQLite temporal (nunca
+`inventario.db`) y cada prueba empieza con todas las tablas vacías.
+"""
+import itertools
+import os
+import tempfile
+
+import pytest
+
+DIRECTORIO = tempfile.mkdtemp(prefix="inventario_pruebas_")
+RUTA_BASE = os.path.join(DIRECTORIO, "inventario.db")
+
+# La app lee la configuración al importarse
+os.environ["DATABASE_URL"] = f"sqlite:///{RUTA_BASE}"
+os.environ["SQLITE_BUSY_TIMEOUT"] = "0.05"      # bloqueos cortos: se ejercitan los reintentos de escritura
+os.environ["DISPONIBILIDAD_RECARGA"] = "0"
+os.environ["REPLICA_LECTURA"] = ""
+os.environ["TRABAJOS_DIR"] = os.path.join(DIRECTORIO, "trabajos")
+
+from fastapi.testclient import TestClient  # noqa: E402
+
+from app import database, disponibilidad, metricas, numeracion  # noqa: E402
+from app.main import app  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def cliente():
+    with TestClient(app) as c:
+        yield c
+
+
+@pytest.fixture(autouse=True)
+def base_limpia():
+    with database.engine.begin() as conn:
+        for tabla in reversed(database.Base.metadata.sorted_tables):
+            conn.execute(tabla.delete())
+    numeracion._bloques.clear()
+    numeracion._por_defecto.clear()
+    disponibilidad.cargar()
+    metricas.reiniciar()
+    yield
+
+
+@pytest.fixture
+def categoria(cliente):
+    return cliente.post("/categorias/", json={"nombre": "General"}).json()["id"]
+
+
+@pytest.fixture
+def crear_producto(cliente, categoria):
+    codigos = itertools.count(1)
+
+    def crear(**campos):
+        producto = {
+            "codigo_barras": f"775{next(codigos):010d}",
+            "nombre": "Producto",
+            "precio_compra": 10.0,
+            "precio_venta": 15.0,
+            "stock_actual": 0,
+            "stock_minimo": 2,
+            "unidad_medida": "unidad",
+            "categoria_id": categoria,
+            **campos,
+        }
+        respuesta = cliente.post("/productos/", json=producto)
+        assert respuesta.status_code == 200, respuesta.text
+        return respuesta.json()
+
+    return crear
+
+
+def documento(tipo: str, operacion: str, lineas, **campos) -> dict:
+    """Cuerpo de POST/PUT /documentos/ con (producto_id, cantidad) por línea."""
+    return {
+        "tipo": tipo,
+        "operacion": operacion,
+        "detalles": [{"producto_id": producto_id, "cantidad": cantidad} for producto_id, cantidad in lineas],
+        **campos,
+    }
+
+
+def stock(cliente, producto_id: int) -> int:
+    return cliente.get(f"/productos/{producto_id}").json()["stock_actual"]
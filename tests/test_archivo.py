@@ -0,0 +1,50 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, inspect, text
+
+from app import archivo, database, models
+
+
+def test_movimientos_nuevos_no_repiten_ids_archivados(cliente, crear_producto):
+    p = crear_producto(stock_actual=0)["id"]
+    archivados = [cliente.post("/movimientos/", json={"producto_id": p, "tipo": "entrada", "cantidad": 1}).json()["id"]
+                  for _ in range(3)]
+
+    with database.SessionLocal() as db:
+        resultado = archivo.archivar_movimientos(db, datetime.utcnow() + timedelta(days=31))
+    try:
+        assert sum(r["filas"] for r in resultado) == 3
+        # Tabla caliente vacía: el siguiente id sigue después de los archivados
+        nuevo = cliente.post("/movimientos/", json={"producto_id": p, "tipo": "entrada", "cantidad": 1}).json()["id"]
+        assert nuevo > max(archivados)
+        kardex = cliente.get(f"/productos/{p}/kardex").json()
+        ids = [linea["movimiento_id"] for linea in kardex["lineas"]]
+        assert sorted(ids) == archivados + [nuevo]
+    finally:
+        with database.engine.begin() as conn:
+            for r in resultado:
+                conn.exec_driver_sql(f'DROP TABLE "{r["tabla"]}"')
+        archivo.metadata_archivo.clear()
+
+
+def test_migracion_agrega_autoincremento_conservando_las_filas(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'anterior.db'}")
+    with engine.begin() as conn:
+        conn.exec_driver_sql(
+            "CREATE TABLE movimientos (id INTEGER NOT NULL, producto_id INTEGER NOT NULL, tipo VARCHAR NOT NULL, "
+            "cantidad INTEGER NOT NULL, fecha DATETIME, documento_id INTEGER, costo_unitario FLOAT, "
+            "costo_propio BOOLEAN, PRIMARY KEY (id))"
+        )
+        conn.exec_driver_sql("INSERT INTO movimientos (id, producto_id, tipo, cantidad) VALUES (7, 1, 'entrada', 2)")
+        tabla = models.Movimiento.__table__
+        database.agregar_autoincremento(conn, tabla)
+
+        sql = conn.execute(text("SELECT sql FROM sqlite_master WHERE name = 'movimientos'")).scalar()
+        assert "AUTOINCREMENT" in sql
+        assert conn.execute(text("SELECT id, cantidad FROM movimientos")).all() == [(7, 2)]
+        conn.exec_driver_sql("DELETE FROM movimientos")
+        conn.exec_driver_sql("INSERT INTO movimientos (producto_id, tipo, cantidad) VALUES (1, 'salida', 1)")
+        assert conn.execute(text("SELECT id FROM movimientos")).scalar() == 8
+        indices = {i["name"] for i in inspect(conn).get_indexes("movimientos")}
+        assert {i.name for i in tabla.indexes} <= indices
+    engine.dispose()
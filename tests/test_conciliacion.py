@@ -0,0 +1,38 @@
+from .conftest import stock
+
+
+def test_conteo_ajusta_con_movimientos_y_el_dashboard_cuadra(cliente, crear_producto):
+    con_libro = crear_producto(stock_actual=0)["id"]
+    cliente.post("/movimientos/", json={"producto_id": con_libro, "tipo": "entrada", "cantidad": 10})
+    sin_libro = crear_producto(stock_actual=5)["id"]   # stock inicial sin movimientos
+    intacto = crear_producto(stock_actual=0)["id"]
+
+    respuesta = cliente.post("/productos/conteo", json={"conteos": [
+        {"producto_id": con_libro, "cantidad": 7},
+        {"producto_id": sin_libro, "cantidad": 8},
+        {"producto_id": intacto, "cantidad": 0},
+    ]})
+    assert respuesta.status_code == 200
+    resultado = respuesta.json()
+    assert (resultado["contados"], resultado["ajustados"]) == (3, 2)
+    assert (resultado["unidades_entrada"], resultado["unidades_salida"]) == (3, 3)
+    assert (stock(cliente, con_libro), stock(cliente, sin_libro)) == (7, 8)
+
+    # Los ajustes pasan por el libro: la única diferencia sigue siendo el stock inicial
+    conciliacion = cliente.get("/productos/conciliacion").json()
+    assert [(d["producto_id"], d["diferencia"]) for d in conciliacion["productos"]] == [(sin_libro, 5)]
+
+    # Los contadores del dashboard, mantenidos en cada escritura, coinciden con un recálculo completo
+    reconciliacion = cliente.post("/dashboard/reconciliar").json()
+    assert reconciliacion["antes"] == reconciliacion["despues"]
+    assert reconciliacion["despues"]["unidades"] == 15
+
+
+def test_conteo_invalido_no_ajusta_nada(cliente, crear_producto):
+    p = crear_producto(stock_actual=4)["id"]
+    inexistente = cliente.post("/productos/conteo", json={"conteos": [
+        {"producto_id": p, "cantidad": 1}, {"producto_id": 999999, "cantidad": 1}]})
+    repetido = cliente.post("/productos/conteo", json={"conteos": [
+        {"producto_id": p, "cantidad": 1}, {"producto_id": p, "cantidad": 2}]})
+    assert (inexistente.status_code, repetido.status_code) == (400, 400)
+    assert stock(cliente, p) == 4
@@ -0,0 +1,122 @@
+import pytest
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from app import catalogo, database, disponibilidad, models
+from app.database import SessionLocal
+
+from .conftest import documento
+
+
+def en_base():
+    with SessionLocal() as db:
+        return {
+            producto_id: (stock, minimo, precio)
+            for producto_id, stock, minimo, precio in db.execute(select(*disponibilidad._columnas()))
+        }
+
+
+def en_tabla(cliente, ids):
+    respuesta = cliente.post("/productos/disponibilidad", json={"ids": list(ids)}).json()
+    return {
+        p["producto_id"]: (p["stock_actual"], p["stock_minimo"], p["precio_venta"]) for p in respuesta["productos"]
+    }
+
+
+def coincide(cliente, *eliminados):
+    base = en_base()
+    assert en_tabla(cliente, list(base) + list(eliminados)) == base
+
+
+@pytest.fixture
+def productos(crear_producto):
+    return [crear_producto(stock_actual=50)["id"] for _ in range(3)]
+
+
+def test_cada_escritura_actualiza_la_tabla(cliente, crear_producto, productos, categoria):
+    a, b, c = productos
+    coincide(cliente)
+
+    cliente.post("/movimientos/", json={"producto_id": a, "tipo": "salida", "cantidad": 4})
+    coincide(cliente)
+
+    venta = cliente.post("/documentos/", json=documento("Boleta", "VENTA", [(a, 1), (b, 2)])).json()
+    coincide(cliente)
+    cliente.put(f"/documentos/{venta['id']}", json=documento("Boleta", "VENTA", [(b, 5), (c, 1)]))
+    coincide(cliente)
+    cliente.delete(f"/documentos/{venta['id']}")
+    coincide(cliente)
+
+    cliente.patch(f"/productos/{a}", json={"precio_venta": 30.0, "stock_minimo": 9})
+    coincide(cliente)
+    producto_b = cliente.get(f"/productos/{b}").json()
+    cliente.put(f"/productos/{b}", json={**producto_b, "stock_actual": 7, "categoria_id": categoria})
+    coincide(cliente)
+
+    # Masiva con un filtro que el propio cambio deja de cumplir
+    otra = cliente.post("/categorias/", json={"nombre": "Otra"}).json()["id"]
+    cliente.patch("/productos/bulk", json={"filtro": {"categoria_id": categoria}, "cambios": [
+        {"campo": "categoria_id", "operacion": "set", "valor": otra},
+        {"campo": "precio_venta", "operacion": "porcentaje", "valor": 10, "redondeo": 2}]})
+    coincide(cliente)
+
+    codigo = cliente.get(f"/productos/{c}").json()["codigo_barras"]
+    csv = ("codigo_barras,nombre,precio_compra,precio_venta,stock_actual,stock_minimo,unidad_medida,categoria_id\n"
+           f"{codigo},Actualizado,1,99,3,1,unidad,{otra}\n"
+           f"9990001,Nuevo,1,5,12,1,unidad,{otra}\n")
+    carga = cliente.post("/productos/bulk", content=csv.encode(), headers={"Content-Type": "text/csv"}).json()
+    assert (carga["insertados"], carga["actualizados"]) == (1, 1)
+    coincide(cliente)
+
+    cliente.post("/productos/conteo", json={"conteos": [{"producto_id": a, "cantidad": 1},
+                                                        {"producto_id": c, "cantidad": 40}]})
+    coincide(cliente)
+
+    nuevo = crear_producto()["id"]
+    coincide(cliente)
+    cliente.delete(f"/productos/{nuevo}")
+    coincide(cliente, nuevo)
+    assert nuevo not in en_tabla(cliente, [nuevo])
+
+
+def test_escritura_fallida_no_cambia_la_tabla(cliente, productos):
+    a = productos[0]
+    antes = en_tabla(cliente, productos)
+    respuesta = cliente.post("/documentos/", json=documento("Boleta", "VENTA", [(a, 5), (999999, 1)]))
+    assert respuesta.status_code == 400
+    assert en_tabla(cliente, productos) == antes
+    coincide(cliente)
+
+
+def test_recarga_completa_equivale_a_la_incremental(cliente, productos):
+    cliente.post("/documentos/", json=documento("Boleta", "VENTA", [(productos[0], 3)]))
+    incremental = en_tabla(cliente, productos)
+    disponibilidad.cargar()
+    assert en_tabla(cliente, productos) == incremental
+
+
+def test_recarga_no_pisa_filas_mas_nuevas_con_cambios_ya_leidos(cliente, productos, monkeypatch):
+    a, b = productos[:2]
+    cliente.post("/movimientos/", json={"producto_id": a, "tipo": "salida", "cantidad": 1})
+    local = en_tabla(cliente, [a])[a]
+
+    # Otro worker (sin pasar por la sesión de este proceso) deja el stock de `a` en 20
+    with database.engine.begin() as conn:
+        catalogo.siguiente_version(Session(bind=conn), disponibilidad.CONTADOR)
+        conn.execute(update(models.Producto).where(models.Producto.id == a).values(stock_actual=20))
+
+    version_actual = catalogo.version_actual
+
+    def leer_y_confirmar_durante_la_carga(db, contador=catalogo.CONTADOR):
+        leida = version_actual(db, contador)
+        # Dos commits locales mientras se lee: uno que la lectura ya incluye y otro posterior
+        disponibilidad.tabla.aplicar({a: local}, leida - 1)
+        disponibilidad.tabla.aplicar({b: (1, 1, 1.0)}, leida + 1)
+        return leida
+
+    monkeypatch.setattr(catalogo, "version_actual", leer_y_confirmar_durante_la_carga)
+    disponibilidad.cargar()
+
+    tabla = en_tabla(cliente, [a, b])
+    assert tabla[a][0] == 20
+    assert tabla[b] == (1, 1, 1.0)
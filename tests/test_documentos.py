@@ -0,0 +1,128 @@
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app import crud, database, models, numeracion, schemas
+
+from .conftest import documento, stock
+
+
+def movimientos(cliente, producto_id):
+    return [(m["tipo"], m["cantidad"]) for m in cliente.get(f"/movimientos/producto/{producto_id}").json()]
+
+
+# =========================
+# 📌 Actualización por diferencia
+# =========================
+def test_actualizar_documento_solo_mueve_la_diferencia(cliente, crear_producto):
+    a, b, c = (crear_producto(stock_actual=100)["id"] for _ in range(3))
+    creado = cliente.post("/documentos/", json=documento("Boleta", "VENTA", [(a, 5), (b, 3)])).json()
+
+    respuesta = cliente.put(f"/documentos/{creado['id']}",
+                            json=documento("Boleta", "VENTA", [(a, 5), (b, 7), (c, 2)]))
+    assert respuesta.status_code == 200
+    assert {d["producto_id"]: d["cantidad"] for d in respuesta.json()["detalles"]} == {a: 5, b: 7, c: 2}
+    assert respuesta.json()["numero"] == creado["numero"]
+    assert (stock(cliente, a), stock(cliente, b), stock(cliente, c)) == (95, 93, 98)
+    # La línea sin cambios no genera movimientos; las demás, uno por la diferencia neta
+    assert movimientos(cliente, a) == [("salida", 5)]
+    assert sorted(movimientos(cliente, b)) == [("salida", 3), ("salida", 4)]
+    assert movimientos(cliente, c) == [("salida", 2)]
+
+
+def test_cambiar_operacion_y_eliminar_revierte_el_stock(cliente, crear_producto):
+    a, b = (crear_producto(stock_actual=100)["id"] for _ in range(2))
+    creado = cliente.post("/documentos/", json=documento("Factura", "VENTA", [(a, 5), (b, 7)])).json()
+
+    cliente.put(f"/documentos/{creado['id']}", json=documento("Factura", "COMPRA", [(a, 5)]))
+    assert (stock(cliente, a), stock(cliente, b)) == (105, 100)
+
+    assert cliente.delete(f"/documentos/{creado['id']}").status_code == 200
+    assert (stock(cliente, a), stock(cliente, b)) == (100, 100)
+
+
+# =========================
+# 📌 Series y numeración
+# =========================
+def test_serie_por_defecto_unica_por_tipo(cliente, crear_producto):
+    p = crear_producto(stock_actual=10)["id"]
+    numeros = {
+        tipo: cliente.post("/documentos/", json=documento(tipo, "VENTA", [(p, 1)]))
+        for tipo in ("Nota de crédito", "Nota de débito", "Boleta")
+    }
+    assert {r.status_code for r in numeros.values()} == {201}
+    assert numeros["Nota de crédito"].json()["numero"] == "N001-00000001"
+    assert numeros["Nota de débito"].json()["numero"] == "N002-00000001"
+    assert numeros["Boleta"].json()["numero"] == "B001-00000001"
+
+    series = {(s["tipo"], s["serie"]) for s in cliente.get("/series/").json() if s["por_defecto"]}
+    assert series == {("Nota de crédito", "N001"), ("Nota de débito", "N002"), ("Boleta", "B001")}
+
+
+def test_serie_de_otro_tipo_responde_400(cliente, crear_producto):
+    p = crear_producto(stock_actual=10)["id"]
+    cliente.post("/documentos/", json=documento("Boleta", "VENTA", [(p, 1)]))
+    respuesta = cliente.post("/documentos/", json=documento("Factura", "VENTA", [(p, 1)], serie="B001"))
+    assert respuesta.status_code == 400
+    assert stock(cliente, p) == 9
+
+
+def test_numeros_enviados_por_el_cliente_se_saltan(cliente, crear_producto):
+    p = crear_producto(stock_actual=10)["id"]
+
+    def crear(**campos):
+        return cliente.post("/documentos/", json=documento("Boleta", "VENTA", [(p, 1)], **campos))
+
+    assert crear().json()["numero"] == "B001-00000001"
+    assert crear(numero="B001-00000002").status_code == 201
+    assert crear(numero="B001-00000002").status_code == 409
+    assert crear().json()["numero"] == "B001-00000003"
+    assert stock(cliente, p) == 7
+
+
+def test_numero_enviado_no_crea_la_serie_por_defecto(cliente, crear_producto):
+    p = crear_producto(stock_actual=10)["id"]
+    respuesta = cliente.post("/documentos/", json=documento("Boleta", "VENTA", [(p, 1)], numero="EXT-1"))
+    assert respuesta.status_code == 201
+    assert cliente.get("/series/").json() == []
+
+
+def test_numeracion_usa_la_base_de_la_sesion(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'otra.db'}")
+    models.Base.metadata.create_all(bind=engine)
+    with Session(bind=engine) as db:
+        db.add(models.Categoria(nombre="Otra"))
+        db.flush()
+        db.add(models.Producto(nombre="P", precio_compra=1.0, precio_venta=2.0, stock_actual=5, stock_minimo=0,
+                               unidad_medida="unidad", categoria_id=1))
+        db.commit()
+        creado = crud.create_documento(db, schemas.DocumentoCreate(**documento("Boleta", "VENTA", [(1, 1)])))
+        assert creado.numero == "B001-00000001"
+        assert [s.serie for s in numeracion.listar(db)] == ["B001"]
+    with database.SessionLocal() as db:
+        assert numeracion.listar(db) == []
+    engine.dispose()
+
+
+def test_serie_sin_huecos_no_pierde_numeros(cliente, crear_producto):
+    p = crear_producto(stock_actual=10)["id"]
+    assert cliente.put("/series/Factura/F001", json={"sin_huecos": True}).status_code == 200
+
+    numeros = []
+    for lineas in ([(p, 1)], [(999999, 1)], [(p, 1)], [(999999, 1)], [(p, 1)]):
+        respuesta = cliente.post("/documentos/", json=documento("Factura", "VENTA", lineas))
+        if respuesta.status_code == 201:
+            numeros.append(respuesta.json()["numero"])
+        else:
+            assert respuesta.status_code == 400  # producto inexistente: rollback, el número queda libre
+    assert numeros == ["F001-00000001", "F001-00000002", "F001-00000003"]
+
+
+def test_reconfigurar_descarta_los_bloques_de_otros_workers(cliente, crear_producto):
+    p = crear_producto(stock_actual=10)["id"]
+    cliente.post("/documentos/", json=documento("Boleta", "VENTA", [(p, 1)]))
+    assert cliente.put("/series/Boleta/B001", json={"siguiente": 100}).status_code == 200
+
+    # Bloque en memoria de otro worker, reservado antes de la reconfiguración
+    numeracion._bloques[(database.engine, "Boleta", "B001")] = [2, 51, 0]
+    respuesta = cliente.post("/documentos/", json=documento("Boleta", "VENTA", [(p, 1)]))
+    assert respuesta.json()["numero"] == "B001-00000100"
@@ -0,0 +1,25 @@
+import sqlite3
+import threading
+
+from app import metricas
+
+from .conftest import RUTA_BASE, stock
+
+
+def test_escritura_reintenta_mientras_otro_proceso_tiene_el_bloqueo(cliente, crear_producto):
+    p = crear_producto(stock_actual=10)["id"]
+
+    # Otra conexión (como otro worker) toma el bloqueo de escritura y lo suelta después
+    otra = sqlite3.connect(RUTA_BASE, isolation_level=None, check_same_thread=False)
+    otra.execute("BEGIN IMMEDIATE")
+    liberar = threading.Timer(0.4, lambda: otra.execute("ROLLBACK"))
+    liberar.start()
+    try:
+        respuesta = cliente.post("/movimientos/", json={"producto_id": p, "tipo": "salida", "cantidad": 3})
+    finally:
+        liberar.join()
+        otra.close()
+
+    assert respuesta.status_code == 200
+    assert stock(cliente, p) == 7
+    assert metricas.resumen()["contadores"].get("sqlite_reintentos", 0) >= 1
@@ -0,0 +1,82 @@
+import threading
+
+from fastapi import FastAPI, Response
+from fastapi.testclient import TestClient
+
+from app import idempotencia, models
+from app.database import SessionLocal
+
+from .conftest import stock
+
+
+def test_reintento_devuelve_la_respuesta_original(cliente, crear_producto):
+    p = crear_producto(stock_actual=10)["id"]
+    cuerpo = {"producto_id": p, "tipo": "salida", "cantidad": 2}
+    headers = {"Idempotency-Key": "venta-1"}
+
+    primera = cliente.post("/movimientos/", json=cuerpo, headers=headers)
+    segunda = cliente.post("/movimientos/", json=cuerpo, headers=headers)
+
+    assert primera.status_code == segunda.status_code == 200
+    assert segunda.headers["idempotent-replay"] == "true"
+    assert segunda.json() == primera.json()
+    assert stock(cliente, p) == 8
+    # La clave queda en la base, visible para los demás workers
+    with SessionLocal() as db:
+        assert db.query(models.ClaveIdempotencia).count() == 1
+
+
+def test_misma_clave_con_otro_cuerpo_responde_422(cliente, crear_producto):
+    p = crear_producto(stock_actual=10)["id"]
+    headers = {"Idempotency-Key": "venta-2"}
+    cliente.post("/movimientos/", json={"producto_id": p, "tipo": "salida", "cantidad": 1}, headers=headers)
+    respuesta = cliente.post("/movimientos/", json={"producto_id": p, "tipo": "salida", "cantidad": 5}, headers=headers)
+    assert respuesta.status_code == 422
+    assert stock(cliente, p) == 9
+
+
+def test_reintentos_concurrentes_escriben_una_sola_vez(cliente, crear_producto):
+    p = crear_producto(stock_actual=10)["id"]
+    respuestas = []
+
+    def enviar():
+        respuestas.append(cliente.post("/movimientos/", json={"producto_id": p, "tipo": "salida", "cantidad": 1},
+                                       headers={"Idempotency-Key": "venta-3"}))
+
+    hilos = [threading.Thread(target=enviar) for _ in range(6)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+
+    assert [r.status_code for r in respuestas] == [200] * 6
+    assert sum(r.headers.get("idempotent-replay") == "true" for r in respuestas) == 5
+    assert stock(cliente, p) == 9
+
+
+def test_reproduccion_solo_lee_y_conserva_los_headers(monkeypatch):
+    app = FastAPI()
+    llamadas = []
+
+    @app.post("/documentos/", status_code=201)
+    def crear(response: Response):
+        llamadas.append(1)
+        response.headers["Location"] = f"/documentos/{len(llamadas)}"
+        response.headers["ETag"] = f'"{len(llamadas)}"'
+        return {"id": len(llamadas)}
+
+    app.add_middleware(idempotencia.IdempotenciaMiddleware)
+    reclamos = []
+    reclamar = idempotencia.reclamar
+    monkeypatch.setattr(idempotencia, "reclamar", lambda *a: reclamos.append(1) or reclamar(*a))
+
+    with TestClient(app) as cliente_local:
+        primera = cliente_local.post("/documentos/", json={}, headers={"Idempotency-Key": "doc-1"})
+        segunda = cliente_local.post("/documentos/", json={}, headers={"Idempotency-Key": "doc-1"})
+
+    assert len(llamadas) == 1
+    assert len(reclamos) == 1  # el reintento no toma el bloqueo de escritura
+    assert segunda.status_code == 201
+    assert segunda.headers["idempotent-replay"] == "true"
+    assert (segunda.headers["location"], segunda.headers["etag"]) == ("/documentos/1", '"1"')
+    assert segunda.json() == primera.json()
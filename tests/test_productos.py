@@ -0,0 +1,27 @@
+CABECERA = "codigo_barras,nombre,precio_compra,precio_venta,stock_actual,stock_minimo,unidad_medida,categoria_id\n"
+
+
+def cargar(cliente, filas: str) -> dict:
+    return cliente.post("/productos/bulk", content=(CABECERA + filas).encode(),
+                        headers={"Content-Type": "text/csv"}).json()
+
+
+def test_carga_masiva_cuenta_solo_las_filas_escritas(cliente, categoria):
+    primera = cargar(cliente, f"111,Arroz,1,2,5,1,unidad,{categoria}\n222,Azúcar,1,2,5,1,unidad,{categoria}\n")
+    assert (primera["insertados"], primera["actualizados"], primera["sin_cambios"]) == (2, 0, 0)
+
+    # 111 igual, 222 con otro precio, 333 nuevo
+    segunda = cargar(cliente, f"111,Arroz,1,2,5,1,unidad,{categoria}\n222,Azúcar,1,3,5,1,unidad,{categoria}\n"
+                              f"333,Sal,1,2,5,1,unidad,{categoria}\n")
+    assert (segunda["insertados"], segunda["actualizados"], segunda["sin_cambios"]) == (1, 1, 1)
+    assert segunda["rechazados"] == 0
+
+
+def test_codigo_repetido_en_el_lote_se_rechaza_con_su_linea(cliente, categoria):
+    resumen = cargar(cliente, f"111,Primero,1,2,5,1,unidad,{categoria}\n"
+                              f"222,Otro,1,2,5,1,unidad,{categoria}\n"
+                              f"111,Repetido,1,9,5,1,unidad,{categoria}\n")
+    assert (resumen["insertados"], resumen["rechazados"]) == (2, 1)
+    assert resumen["errores"] == [{"linea": 4, "error": "codigo_barras 111 repetido (línea 2)"}]
+    productos = {p["codigo_barras"]: p["nombre"] for p in cliente.get("/productos/").json()}
+    assert productos["111"] == "Primero"
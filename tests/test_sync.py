@@ -0,0 +1,62 @@
+def delta(cliente, since=0, **parametros):
+    return cliente.get("/sync/catalogo", params={"since": since, **parametros}).json()
+
+
+def sincronizar(cliente, since, limite):
+    """Recorre todas las páginas como una terminal: devuelve (version, productos por id, páginas)."""
+    productos, paginas, cursor = {}, 0, None
+    while True:
+        pagina = delta(cliente, since, limite=limite, **({"cursor": cursor} if cursor else {}))
+        paginas += 1
+        for producto in pagina["productos"]:
+            productos[producto["id"]] = producto
+        for producto_id in pagina["bajas"]["productos"]:
+            productos.pop(producto_id, None)
+        if not pagina["hay_mas"]:
+            return pagina["version"], productos, paginas
+        cursor = pagina["siguiente"]
+
+
+def test_delta_incluye_cambios_y_bajas_pero_no_el_stock(cliente, crear_producto):
+    a, b = crear_producto()["id"], crear_producto()["id"]
+    inicial = delta(cliente)
+    assert {p["id"] for p in inicial["productos"]} == {a, b}
+    assert "stock_actual" not in inicial["productos"][0]
+    version = inicial["version"]
+
+    cliente.post("/movimientos/", json={"producto_id": a, "tipo": "entrada", "cantidad": 5})
+    sin_cambios = delta(cliente, version)
+    assert (sin_cambios["version"], sin_cambios["productos"]) == (version, [])
+
+    cliente.patch(f"/productos/{a}", json={"precio_venta": 19.9})
+    cliente.delete(f"/productos/{b}")
+    cambios = delta(cliente, version)
+    assert [(p["id"], p["precio_venta"]) for p in cambios["productos"]] == [(a, 19.9)]
+    assert cambios["bajas"] == {"categorias": [], "productos": [b]}
+    assert cambios["version"] > version
+
+
+def test_paginas_equivalen_al_delta_completo(cliente, crear_producto):
+    ids = [crear_producto()["id"] for _ in range(7)]
+    cliente.delete(f"/productos/{ids[2]}")
+    cliente.patch("/productos/bulk", json={"filtro": {"ids": ids}, "cambios": [
+        {"campo": "precio_venta", "operacion": "set", "valor": 12.5}]})
+
+    version, completo, _ = sincronizar(cliente, 0, 50000)
+    version_paginada, paginado, paginas = sincronizar(cliente, 0, 2)
+    assert paginas > 1
+    assert (version_paginada, paginado) == (version, completo)
+    assert set(completo) == set(ids) - {ids[2]}
+
+
+def test_cursor_invalido_responde_400(cliente):
+    assert cliente.get("/sync/catalogo", params={"cursor": "abc"}).status_code == 400
+
+
+def test_gzip_respeta_q_cero(cliente, crear_producto):
+    for _ in range(20):
+        crear_producto()
+    assert cliente.get("/sync/catalogo", headers={"Accept-Encoding": "gzip"}).headers["content-encoding"] == "gzip"
+    for valor in ("gzip;q=0", "identity", "gzip;q=0, *"):
+        respuesta = cliente.get("/sync/catalogo", headers={"Accept-Encoding": valor})
+        assert "content-encoding" not in respuesta.headers
@@ -0,0 +1,70 @@
+import pytest
+from sqlalchemy import update
+
+from app import models
+from app.database import engine
+
+from .conftest import documento
+
+
+def costo(cliente, producto_id):
+    return cliente.get(f"/valorizacion/productos/{producto_id}").json()
+
+
+def test_promedio_ponderado_incremental_coincide_con_reconstruir(cliente, crear_producto):
+    p = crear_producto(precio_compra=10.0)["id"]
+    primera = cliente.post("/documentos/", json=documento("Factura", "COMPRA", [(p, 10)])).json()
+    cliente.patch(f"/productos/{p}", json={"precio_compra": 20.0})
+    segunda = cliente.post("/documentos/", json=documento("Factura", "COMPRA", [(p, 10)])).json()
+    assert costo(cliente, p)["costo_promedio"] == pytest.approx(15.0)
+
+    venta = cliente.post("/documentos/", json=documento("Boleta", "VENTA", [(p, 5)])).json()
+    cliente.patch(f"/productos/{p}", json={"precio_compra": 40.0})
+    # La línea existente conserva su precio (20); la compra editada y la eliminada
+    # ya no coinciden con el detalle actual de los documentos
+    cliente.put(f"/documentos/{segunda['id']}", json=documento("Factura", "COMPRA", [(p, 15)]))
+    cliente.delete(f"/documentos/{venta['id']}")
+    cliente.delete(f"/documentos/{primera['id']}")
+
+    incremental = costo(cliente, p)
+    assert incremental["cantidad"] == 15
+    assert incremental["costo_promedio"] == pytest.approx(16.25)
+
+    assert cliente.post("/valorizacion/reconstruir").status_code == 200
+    reconstruido = costo(cliente, p)
+    assert reconstruido["costo_promedio"] == pytest.approx(incremental["costo_promedio"])
+    assert reconstruido["valor"] == pytest.approx(incremental["valor"])
+
+
+def test_venta_cambiada_a_compra_revierte_al_costo_promedio(cliente, crear_producto):
+    p = crear_producto(precio_compra=10.0)["id"]
+    cliente.post("/documentos/", json=documento("Factura", "COMPRA", [(p, 10)]))
+    venta = cliente.post("/documentos/", json=documento("Boleta", "VENTA", [(p, 5)])).json()
+    cliente.patch(f"/productos/{p}", json={"precio_compra": 30.0})
+
+    cliente.put(f"/documentos/{venta['id']}", json=documento("Boleta", "COMPRA", [(p, 5)]))
+    movimientos = [(m["tipo"], m["cantidad"], m["costo_unitario"])
+                   for m in cliente.get(f"/movimientos/producto/{p}").json() if m["documento_id"] == venta["id"]]
+    assert sorted(movimientos) == [("entrada", 5, 10.0), ("entrada", 5, 30.0), ("salida", 5, 10.0)]
+
+    # Las 5 unidades devueltas vuelven a 10 y solo las 5 compradas entran a 30
+    incremental = costo(cliente, p)
+    assert incremental["cantidad"] == 15
+    assert incremental["costo_promedio"] == pytest.approx(250 / 15)
+
+    assert cliente.post("/valorizacion/reconstruir").status_code == 200
+    assert costo(cliente, p)["costo_promedio"] == pytest.approx(incremental["costo_promedio"])
+
+
+def test_reconstruir_publica_en_el_feed_los_costos_que_corrige(cliente, crear_producto):
+    p = crear_producto(precio_compra=10.0)["id"]
+    cliente.post("/documentos/", json=documento("Factura", "COMPRA", [(p, 10)]))
+    venta = cliente.post("/movimientos/", json={"producto_id": p, "tipo": "salida", "cantidad": 4}).json()
+    with engine.begin() as conn:  # costo desactualizado, escrito fuera del ORM
+        conn.execute(update(models.Movimiento).where(models.Movimiento.id == venta["id"]).values(costo_unitario=99.0))
+    ultimo = cliente.get("/cambios/", params={"limite": 1000}).json()["ultimo"]
+
+    assert cliente.post("/valorizacion/reconstruir").status_code == 200
+    nuevos = cliente.get("/cambios/", params={"desde": ultimo}).json()["cambios"]
+    assert [(c["entidad"], c["entidad_id"], c["operacion"]) for c in nuevos] == [("movimiento", venta["id"], "update")]
+    assert nuevos[0]["datos"]["costo_unitario"] == 10.0